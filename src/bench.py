@@ -0,0 +1,186 @@
+"""Offline parse benchmarks over the pages in `fixtures/`.
+
+The branch, city, state and sitemap fixtures are synthetic: hand-written pages carrying the
+markup each extractor targets, padded to a realistic size with filler nav links and numbered
+sitemap urls. Only `pnc/browse.html` is a page saved from the live site. The timings compare
+extraction paths against each other, they are not the parse cost of the banks' real pages.
+
+Every case runs one extraction path of a ticker against a fixture page, with no network or
+browser, and reports records/sec and the peak memory traced while it runs. Results are written
+as JSON (`downloads/benchmark.json` by default) so runs can be compared between releases.
+Usage: `python src/bench.py [output_path] [min_seconds]`.
+"""
+
+# standard library
+import datetime
+import io
+import json
+import logging
+import pathlib
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+# python package index
+import lxml.html
+# local modules
+import jpm
+import path_helper
+import pnc
+import rfc
+import sitemap
+import wfc
+
+
+class FixturePage(object):
+
+    status_code = 200
+
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        return None
+
+
+class FixturePool(object):
+    """Stands in for a sessions.SessionPool, answering every request with the same saved page."""
+
+    def __init__(self, text):
+        self.page = FixturePage(text)
+
+    def get(self, url, **kwargs):
+        return self.page
+
+
+class FixtureSpider(object):
+    """Stands in for a spiders.SeleniumSpider on a saved page, evaluating `extract` with lxml."""
+
+    def __init__(self, html_text):
+        self.driver = self
+        self.current_url = "fixture"
+        self.html_doc = lxml.html.fromstring(html_text)
+
+    def navigate(self, url):
+        self.current_url = url
+
+    def wait_until_visible(self, xpath):
+        return None
+
+    def wait_until_clickable(self, xpath):
+        return None
+
+    def extract(self, fields):
+        return {name: [str(value) for value in self.html_doc.xpath(xpath)] for name, xpath in fields.items()}
+
+
+def read_fixture(project, name):
+    with open(project.root / "fixtures" / name, "r") as f:
+        return f.read()
+
+
+def count(record):
+    """Counts a single parsed record, 0 when the parser skipped the page or found nothing."""
+    return 1 if record else 0
+
+
+def build_cases(project):
+    """Returns a dict of case name -> callable that runs the path once and returns its record count."""
+    pages = {ticker: read_fixture(project, f"{ticker}/branch.html") for ticker in ("jpm", "rfc", "wfc", "pnc")}
+    hours = {}
+    for module in (jpm, rfc, wfc, pnc):
+        ticker = module.__name__
+        hours[ticker] = module.spec.select(module.spec.parse(pages[ticker]), names=["hours"])["hours"]
+    pnc_branch = FixtureSpider(pages["pnc"])
+    pnc_state = FixtureSpider(read_fixture(project, "pnc/state.html"))
+    sitemaps = {ticker: read_fixture(project, f"{ticker}/sitemap.xml").encode() for ticker in ("jpm", "rfc")}
+
+    return {
+        "jpm.get_branch_record": lambda: count(jpm.get_branch_record("fixture", FixturePool(pages["jpm"]))),
+        "rfc.get_branch_record": lambda: count(rfc.get_branch_record("fixture", FixturePool(pages["rfc"]))),
+        "wfc.parse_branch_record": lambda: count(wfc.parse_branch_record("fixture", pages["wfc"])),
+        "jpm.transform_time_fields": lambda: count(jpm.transform_time_fields(hours["jpm"])),
+        "rfc.transform_time_fields": lambda: count(rfc.transform_time_fields(hours["rfc"])),
+        "wfc.transform_time_fields": lambda: count(wfc.transform_time_fields(hours["wfc"])),
+        "pnc.transform_time_fields": lambda: count(pnc.transform_time_fields(hours["pnc"])),
+        "pnc.extract_branch_record": lambda: count(pnc.extract_branch_record(pnc_branch)),
+        "pnc.get_state_city_urls": lambda: len(pnc.get_state_city_urls(pnc_state, "fixture/ohio")),
+        "jpm.filter_urls": lambda: sum(
+            1 for _, entry in sitemap.iter_entries(io.BytesIO(sitemaps["jpm"])) for _ in jpm.filter_urls([entry.loc])
+        ),
+        "sitemap.iter_entries": lambda: sum(1 for _ in sitemap.iter_entries(io.BytesIO(sitemaps["rfc"]))),
+    }
+
+
+def run_case(case, min_seconds=1.0, memory_calls=20):
+    """Times `case` for at least `min_seconds`, then traces the peak memory of `memory_calls` calls."""
+    calls = 0
+    records = 0
+    start = time.perf_counter()
+    while True:
+        records += case()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            break
+
+    tracemalloc.start()
+    for _ in range(memory_calls):
+        case()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "calls": calls,
+        "records": records,
+        "seconds": round(elapsed, 4),
+        "records_per_sec": round(records / elapsed, 1),
+        "peak_bytes": peak,
+    }
+
+
+def git_commit(project):
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project.root, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return result.stdout.strip()
+
+
+def main(output_path=None, min_seconds=1.0):
+    project = path_helper.ProjectPath.from_src(__file__)
+    output_path = pathlib.Path(output_path) if output_path else project.root / "downloads/benchmark.json"
+    results = {}
+    for name, case in build_cases(project).items():
+        # the parsers log skipped pages and unexpected layouts, keep that out of the terminal
+        logging.disable(logging.CRITICAL)
+        try:
+            results[name] = run_case(case, min_seconds=min_seconds)
+        finally:
+            logging.disable(logging.NOTSET)
+        print(
+            f"`{name}`: {results[name]['records_per_sec']:.0f} records/sec, "
+            f"peak {results[name]['peak_bytes'] / 1024:.0f} KiB"
+        )
+
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(project),
+        "python": platform.python_version(),
+        "min_seconds": min_seconds,
+        "results": results,
+    }
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote benchmark results to `{output_path}`")
+
+    return report
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(args[0] if args else None, float(args[1]) if len(args) > 1 else 1.0)
@@ -0,0 +1,84 @@
+import json
+import pathlib
+import tempfile
+
+
+def bench_test():
+    import bench
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = pathlib.Path(tmp_dir) / "benchmark.json"
+        bench.main(output_path, min_seconds=0.01)
+        with open(output_path, "r") as f:
+            report = json.load(f)
+
+    assert "pnc.extract_branch_record" in report["results"]
+    # every fixture still parses into records, the single-record paths on every call
+    for name, result in report["results"].items():
+        assert result["records"] > 0, name
+        assert result["records_per_sec"] > 0 and result["peak_bytes"] > 0, name
+    for name in ("jpm.get_branch_record", "rfc.get_branch_record", "wfc.parse_branch_record", "pnc.extract_branch_record"):
+        assert report["results"][name]["records"] == report["results"][name]["calls"], name
+
+    return None
+
+
+def count_test():
+    import bench
+    import wfc
+
+    # a page the parser skips is not counted as a record
+    assert bench.count(wfc.parse_branch_record("fixture", "<html><body></body></html>")) == 0
+    assert bench.count(("Mather", None, "1 Mather Business Ctr")) == 1
+
+    return None
+
+
+def fixture_values_test():
+    import collections
+    import io
+    import bench
+    import jpm
+    import path_helper
+    import pnc
+    import rfc
+    import sitemap
+    import wfc
+
+    project = path_helper.ProjectPath.from_src(bench.__file__)
+    pages = {ticker: bench.read_fixture(project, f"{ticker}/branch.html") for ticker in ("jpm", "rfc", "wfc", "pnc")}
+
+    # the fixtures are synthetic, so check the extractors pull the intended values out of them, not just something
+    assert jpm.get_branch_record("fixture", bench.FixturePool(pages["jpm"])) == (
+        "Mather Business Center", None, "1 Mather Business Ctr, Grand Canyon, AZ, 86023",
+        "9 am-5 pm", "9 am-5 pm", "9 am-5 pm", "9 am-5 pm", "9 am-6 pm", "9 am-12 pm", "closed", None
+    )
+    assert rfc.get_branch_record("fixture", bench.FixturePool(pages["rfc"])) == (
+        "Grand Canyon Branch", "Branch + ATM", "1 Mather Business Ctr, Grand Canyon, AZ 86023",
+        "9 a.m.-5 p.m.", "9 a.m.-5 p.m.", "9 a.m.-5 p.m.", "9 a.m.-5 p.m.", "9 a.m.-5 p.m.", "9 a.m.-12 p.m.",
+        "Closed", None
+    )
+    assert wfc.parse_branch_record("fixture", pages["wfc"]) == (
+        "Highland Springs", "Bank", "81 S Airport Dr, Highland Springs, VA, 23075",
+        "09:00 AM-05:00 PM", "09:00 AM-05:00 PM", "09:00 AM-05:00 PM", "09:00 AM-05:00 PM", "09:00 AM-05:00 PM",
+        "09:00 AM-12:00 PM", "closed", 0
+    )
+    # pnc lists the current day first, so only the week as a whole is fixed
+    name, branch_type, addr, *week, tmp_closed = pnc.extract_branch_record(bench.FixtureSpider(pages["pnc"]))
+    assert (name, branch_type, addr) == ("Akron Main Street", None, "1 Main St Akron OH 44308")
+    assert collections.Counter(week) == {"9:00 AM - 5:00 PM": 4, "9:00 AM - 6:00 PM": 1, "9:00 AM - 12:00 PM": 1, "Closed": 1}
+
+    city_urls = pnc.get_state_city_urls(bench.FixtureSpider(bench.read_fixture(project, "pnc/state.html")), "fixture/ohio")
+    assert len(city_urls) == 8 and city_urls[:2] == ["fixture/ohio/akron", "fixture/ohio/bay-village"]
+    entries = [entry for _, entry in sitemap.iter_entries(io.BytesIO(bench.read_fixture(project, "jpm/sitemap.xml").encode()))]
+    branch_urls = [url for entry in entries for url in jpm.filter_urls([entry.loc])]
+    assert len(entries) == 202 and len(branch_urls) == 200
+    assert branch_urls[0] == "https://locator.chase.com/az/grand-canyon/0-branch"
+
+    return None
+
+
+if __name__ == "__main__":
+    bench_test()
+    count_test()
+    fixture_values_test()
@@ -0,0 +1,322 @@
+"""On-disk HTTP response cache with conditional revalidation.
+
+Every cached response is revalidated with `If-None-Match` / `If-Modified-Since`; a 304 is
+served from disk as a hit. Bodies are stored zlib-compressed, one file per url, and the
+least recently used entries are evicted once the cache grows past `max_bytes` or an entry
+has gone unused for `max_age` seconds. Streamed responses (sitemaps) stay streamed through the
+cache: a miss is compressed to disk as the caller reads it, and a hit is inflated a chunk at a time.
+"""
+
+# standard library
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import zlib
+# python package index
+import requests
+import urllib3
+
+
+class InflatingReader(io.RawIOBase):
+    """Decompresses a cache entry's body from its open file a buffer at a time."""
+
+    def __init__(self, f, chunk_size=64 * 1024):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decompressor = zlib.decompressobj()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.decompressor.eof:
+            data = self.decompressor.unconsumed_tail or self.f.read(self.chunk_size)
+            if not data:
+                break
+            out = self.decompressor.decompress(data, len(buffer))
+            if out:
+                buffer[:len(out)] = out
+                return len(out)
+
+        return 0
+
+    def close(self):
+        self.f.close()
+        super().close()
+
+        return None
+
+
+class StoringReader(io.RawIOBase):
+    """Hands a response body to the caller while compressing it to `body_path`.
+
+    `on_complete(body_path, size)` is called once the body has been read to the end; a body
+    closed before that is thrown away.
+    """
+
+    def __init__(self, raw, body_path, on_complete):
+        self.raw = raw
+        self.body_path = body_path
+        self.on_complete = on_complete
+        self.compressor = zlib.compressobj()
+        self.size = 0
+        self.f = open(body_path, "wb")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer), decode_content=True)
+        if not data:
+            self._finish()
+            return 0
+        self.f.write(self.compressor.compress(data))
+        self.size += len(data)
+        buffer[:len(data)] = data
+
+        return len(data)
+
+    def _finish(self):
+        if self.f.closed:
+            return None
+        self.f.write(self.compressor.flush())
+        self.f.close()
+        self.on_complete(self.body_path, self.size)
+
+        return None
+
+    def close(self):
+        if not self.f.closed:
+            self.f.close()
+            self.body_path.unlink()
+        self.raw.close()
+        super().close()
+
+        return None
+
+
+class HttpCache(object):
+    """Response cache shared by every session in a sessions.SessionPool.
+
+    Args:
+        directory: pathlib.Path holding the cache entries
+        max_bytes: int upper bound on the compressed size of the cache
+        max_age: float seconds an entry may go unused before it is evicted
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 ** 2, max_age=30 * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._size = sum(path.stat().st_size for path in self.directory.iterdir())
+        self.prune()
+
+    @classmethod
+    def from_project(cls, project, **kwargs):
+        return cls(project.root / "downloads/http_cache", **kwargs)
+
+    def _path(self, url):
+        return self.directory / hashlib.sha1(url.encode()).hexdigest()
+
+    def _open(self, url):
+        """Returns the entry's metadata and its file, positioned at the compressed body."""
+        path = self._path(url)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None, None
+        try:
+            meta = json.loads(f.readline())
+        except ValueError:
+            f.close()
+            return None, None
+        if meta["url"] != url:
+            f.close()
+            return None, None
+        # touching the file marks it as recently used for lru eviction
+        os.utime(path)
+
+        return meta, f
+
+    def _meta(self, url, response, size):
+        return {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_type": response.headers.get("Content-Type"),
+            "encoding": response.encoding,
+            "size": size,
+            "stored_at": time.time(),
+        }
+
+    def _tmp_path(self, url, suffix="tmp"):
+        return self._path(url).with_suffix(f".{uuid.uuid4().hex}.{suffix}")
+
+    def _commit(self, url, tmp_path):
+        path = self._path(url)
+        num_bytes = tmp_path.stat().st_size
+        with self._lock:
+            try:
+                self._size -= path.stat().st_size
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+            self._size += num_bytes
+        if self._size > self.max_bytes:
+            self.prune()
+
+        return None
+
+    def _store(self, url, response, body):
+        meta = self._meta(url, response, len(body))
+        tmp_path = self._tmp_path(url)
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(meta).encode() + b"\n" + zlib.compress(body))
+        self._commit(url, tmp_path)
+
+        return meta
+
+    def _store_stream(self, url, response, body_path, size):
+        """Commits a body compressed to `body_path` while it streamed, see StoringReader."""
+        meta = self._meta(url, response, size)
+        tmp_path = self._tmp_path(url)
+        try:
+            with open(tmp_path, "wb") as f, open(body_path, "rb") as body:
+                f.write(json.dumps(meta).encode() + b"\n")
+                shutil.copyfileobj(body, f)
+        finally:
+            body_path.unlink()
+        self._commit(url, tmp_path)
+
+        return meta
+
+    def _response(self, url, meta, body):
+        """Builds a 200 response around `body`, a binary file-like object read as the caller streams."""
+        headers = {"Content-Type": meta["content_type"] or "text/html"}
+        response = requests.Response()
+        response.raw = urllib3.response.HTTPResponse(
+            body=body, headers=headers, status=200, preload_content=False
+        )
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = url
+        response.headers = requests.structures.CaseInsensitiveDict(headers)
+        response.encoding = meta["encoding"]
+
+        return response
+
+    def get(self, session, url, headers=None, stream=False, **kwargs):
+        """Issues a conditional GET through `session`, serving a 304 from disk.
+
+        Streamed responses stay streamed: a hit is inflated from the cache file as the caller
+        reads it, and a miss is compressed into the cache as it goes by, so a large sitemap is
+        never held in memory.
+        """
+        meta, f = self._open(url)
+        headers = dict(headers or {})
+        if meta is not None:
+            if meta["etag"]:
+                headers["If-None-Match"] = meta["etag"]
+            if meta["last_modified"]:
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            response = session.get(url, headers=headers, stream=stream, **kwargs)
+        except BaseException:
+            if f is not None:
+                f.close()
+            raise
+        if response.status_code == 304 and meta is not None:
+            response.close()
+            if stream:
+                body = InflatingReader(f)
+                num_bytes = meta.get("size") or 0
+            else:
+                with f:
+                    body = io.BytesIO(zlib.decompress(f.read()))
+                num_bytes = len(body.getbuffer())
+            with self._lock:
+                self.hits += 1
+                self.bytes_saved += num_bytes
+            return self._response(url, meta, body)
+        if f is not None:
+            f.close()
+
+        with self._lock:
+            self.misses += 1
+        validated = response.headers.get("ETag") or response.headers.get("Last-Modified")
+        if response.status_code != 200 or not validated:
+            return response
+
+        if stream:
+            # the body only reaches the cache once the caller has read all of it
+            body = StoringReader(response.raw, self._tmp_path(url, "body.tmp"),
+                                 lambda body_path, size: self._store_stream(url, response, body_path, size))
+            response.raw = urllib3.response.HTTPResponse(
+                body=body, headers={}, status=200, preload_content=False
+            )
+            return response
+        self._store(url, response, response.content)
+
+        return response
+
+    def prune(self):
+        """Evicts entries unused for `max_age`, then the least recently used until under `max_bytes`."""
+        with self._lock:
+            entries = []
+            for path in self.directory.iterdir():
+                if path.suffix == ".tmp":
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            entries.sort()
+            now = time.time()
+            for mtime, size, path in entries:
+                if now - mtime <= self.max_age and self._size <= self.max_bytes:
+                    continue
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    continue
+                self._size -= size
+                self.evictions += 1
+
+        return None
+
+    @property
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes_saved": self.bytes_saved,
+            "evictions": self.evictions,
+            "size_bytes": self._size,
+        }
+
+    def report(self, label="cache"):
+        print(
+            f"`{label}`: {self.hits} hits, {self.misses} misses, "
+            f"{self.bytes_saved} bytes saved, {self.evictions} evictions"
+        )
+
+        return None
+
+    def write_stats(self, path):
+        with open(path, "w") as f:
+            json.dump(self.stats, f, indent=4)
+
+        return None
@@ -0,0 +1,142 @@
+import http.server
+import pathlib
+import tempfile
+import tracemalloc
+
+
+class EtagHandler(http.server.BaseHTTPRequestHandler):
+
+    full_responses = 0
+
+    def do_GET(self):
+        etag = f'"{self.path}-v1"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return None
+        type(self).full_responses += 1
+        body = (f"<html><body>{self.path}</body></html>" + " " * 4096).encode()
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        return None
+
+    def log_message(self, *args):
+        pass
+
+
+class BigSitemapHandler(http.server.BaseHTTPRequestHandler):
+
+    body = b"<urlset>" + b"".join(
+        f"<url><loc>https://locator.chase.com/az/phoenix/{i}</loc></url>".encode() for i in range(80000)
+    ) + b"</urlset>"
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            return None
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Type", "application/xml")
+        self.end_headers()
+        view = memoryview(type(self).body)
+        for i in range(0, len(view), 64 * 1024):
+            self.wfile.write(view[i:i + 64 * 1024])
+
+        return None
+
+    def log_message(self, *args):
+        pass
+
+
+def revalidate_test():
+    import cache
+    import fetch_test
+    import sessions
+
+    server = fetch_test.serve(EtagHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        http_cache = cache.HttpCache(pathlib.Path(tmp_dir))
+        pool = sessions.SessionPool(headers={}, size=1, prime=False, cache=http_cache)
+        try:
+            first = pool.get(f"{base_url}/branch/1")
+            second = pool.get(f"{base_url}/branch/1")
+            streamed = pool.get(f"{base_url}/branch/1", stream=True)
+            streamed_text = b"".join(streamed.iter_content(1024)).decode()
+        finally:
+            pool.close()
+            server.shutdown()
+
+        assert EtagHandler.full_responses == 1
+        assert first.text == second.text == streamed_text
+        assert second.text.startswith("<html><body>/branch/1</body></html>")
+        assert http_cache.hits == 2 and http_cache.misses == 1
+        assert http_cache.bytes_saved == 2 * len(first.content)
+        # compressed on disk
+        assert http_cache.stats["size_bytes"] < len(first.content)
+
+    return None
+
+
+def stream_test():
+    import cache
+    import fetch_test
+    import sessions
+    import sitemap
+
+    server = fetch_test.serve(BigSitemapHandler)
+    url = f"http://127.0.0.1:{server.server_address[1]}/sitemap.xml"
+    peaks = []
+    counts = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        http_cache = cache.HttpCache(pathlib.Path(tmp_dir))
+        pool = sessions.SessionPool(headers={}, size=1, prime=False, cache=http_cache)
+        try:
+            # a miss is stored as it streams by, then a 304 is inflated from disk as it is read
+            for _ in range(2):
+                tracemalloc.start()
+                counts.append(sum(1 for _ in sitemap.iter_sitemap(url, pool)))
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+        finally:
+            pool.close()
+            server.shutdown()
+
+        assert counts == [80000, 80000]
+        assert http_cache.misses == 1 and http_cache.hits == 1
+        assert http_cache.bytes_saved == len(BigSitemapHandler.body)
+        assert not list(pathlib.Path(tmp_dir).glob("*.tmp"))
+    # a 5 MiB sitemap never sits in memory whole
+    assert len(BigSitemapHandler.body) > 4 * 1024 ** 2
+    assert max(peaks) < 1024 ** 2, peaks
+
+    return None
+
+
+def evict_test():
+    import cache
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = pathlib.Path(tmp_dir)
+        for i in range(5):
+            (directory / f"entry{i}").write_bytes(b"x" * 100)
+        http_cache = cache.HttpCache(directory, max_bytes=250)
+
+        assert http_cache.evictions == 3
+        assert len(list(directory.iterdir())) == 2
+
+    return None
+
+
+if __name__ == "__main__":
+    revalidate_test()
+    stream_test()
+    evict_test()
@@ -0,0 +1,66 @@
+import pathlib
+import tempfile
+
+
+def canonicalize_test():
+    import canon
+
+    canonical = "https://locator.chase.com/az/grand-canyon/1-mather-business-center"
+    for url in [
+        "https://locator.chase.com./az/grand-canyon/1-mather-business-center",
+        "HTTPS://Locator.Chase.com:443/az/grand-canyon/1-mather-business-center/",
+        "https://locator.chase.com/az//grand-canyon/1-mather-business-center#hours",
+        "https://locator.chase.com/az/grand-canyon/1-mather-business-center?utm_source=maps&gclid=x",
+        " https://locator.chase.com/az/grand-canyon/1-mather-business-center\n",
+    ]:
+        assert canon.canonicalize(url) == canonical, url
+
+    assert canon.canonicalize("https://www.regions.com/Locator/Branch?b=2&a=1") == "https://www.regions.com/Locator/Branch?a=1&b=2"
+    assert canon.canonicalize("http://127.0.0.1:8080/a%2fb") == "http://127.0.0.1:8080/a%2Fb"
+    assert canon.canonicalize("https://apps.pnc.com") == "https://apps.pnc.com/"
+    # wells fargo pages live at `.../`, both spellings land there
+    wfc_url = "https://www.wellsfargo.com/locator/bank/81__S__AIRPORT__DR_HIGHLAND__SPRINGS_VA_23075/"
+    assert canon.canonicalize(wfc_url.rstrip("/")) == canon.canonicalize(wfc_url) == wfc_url
+
+    return None
+
+
+def seen_index_test():
+    import canon
+    import sitemap
+
+    urls = [f"https://locator.chase.com/az/phoenix/{i}" for i in range(1000)]
+    spellings = [url.replace(".com/", ".com./") + "/" for url in urls[::10]]
+    seen = canon.SeenIndex()
+    queued = list(seen.filter(urls + spellings))
+    assert queued == urls
+    assert seen.unique == 1000 and seen.duplicates == 100 and len(seen.digests) == 1000
+    entries = [sitemap.SitemapEntry(urls[0] + "/", "2021-07-01"), sitemap.SitemapEntry(urls[0] + "0000", None)]
+    assert list(seen.filter_entries(entries)) == [sitemap.SitemapEntry(urls[0] + "0000", None)]
+    seen.report("jpm")
+    seen.close()
+
+    return None
+
+
+def pnc_saved_city_urls_test():
+    import json
+    import path_helper
+    import pnc
+
+    city_urls = ["https://apps.pnc.com/locator/browse/ohio/akron", "https://apps.pnc.com/locator/browse/alabama/mobile"]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        project = path_helper.ProjectPath(pathlib.Path(tmp_dir))
+        (project.root / "downloads").mkdir()
+        with open(project.root / "downloads/pnc_city_urls.json", "w") as f:
+            json.dump({"urls": city_urls + ["HTTPS://apps.pnc.com/locator/browse/ohio/akron/"]}, f)
+        # a saved sitemap goes through the seen-index too, sorted so every run crawls in the same order
+        assert pnc.get_city_urls(project, factory=None) == sorted(city_urls)
+
+    return None
+
+
+if __name__ == "__main__":
+    canonicalize_test()
+    seen_index_test()
+    pnc_saved_city_urls_test()
@@ -0,0 +1,195 @@
+"""Columnar Parquet output partitioned by ticker and state.
+
+Records are written to a hive-partitioned dataset under `downloads/branches.parquet`
+(`ticker=<ticker>/state=<state>/part-*.parquet`) with the repetitive `mon`..`sun` hours
+strings dictionary-encoded. `read` pushes ticker and state filters down to the partition
+directories, so a single-state query never opens the other files.
+
+Requires the optional `pyarrow` package.
+"""
+
+# standard library
+import re
+import shutil
+import threading
+# python package index
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+    ds = None
+# local modules
+import metrics
+import record
+
+
+week = record.Record.week
+
+# addresses end with the state and zip, e.g. '..., Grand Canyon, AZ, 86023' or '... AZ 86023-1234'
+state_regex = re.compile(r"\b([A-Z]{2})[\s,]+\d{5}(?:-\d{4})?\W*$")
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("Columnar output needs `pyarrow`. Install it with `pip install pyarrow`.")
+
+    return None
+
+
+def extract_state(addr):
+    if not addr:
+        return None
+    match = state_regex.search(addr)
+    if match:
+        return match.group(1)
+
+    return None
+
+
+def schema(columns):
+    require_pyarrow()
+    fields = [pa.field("ticker", pa.string()), pa.field("state", pa.string())]
+    for col in columns:
+        if col in week:
+            fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+        elif col == "tmp_closed":
+            fields.append(pa.field(col, pa.int8()))
+        else:
+            fields.append(pa.field(col, pa.string()))
+
+    return pa.schema(fields)
+
+
+def to_table(records, ticker, columns):
+    """Builds an arrow table from a record.RecordBuffer (or record tuples in `columns` order), adding ticker and state."""
+    require_pyarrow()
+    if not isinstance(records, record.RecordBuffer):
+        buffer = record.RecordBuffer(columns)
+        buffer.extend(records)
+        records = buffer
+    data = dict(records.data)
+    addr_col = data.get("addr", [None] * len(records))
+    data["ticker"] = [ticker] * len(addr_col)
+    data["state"] = [extract_state(addr) for addr in addr_col]
+
+    return pa.Table.from_pydict(data, schema=schema(columns))
+
+
+def partitioning():
+    return ds.partitioning(pa.schema([("ticker", pa.string()), ("state", pa.string())]), flavor="hive")
+
+
+class ColumnarWriter(object):
+    """Batched Parquet writer with the same interface as sink.RecordWriter.
+
+    Batches are written to `<root>/.partial` and the ticker's partition is swapped into the
+    dataset on `close`, replacing the previous export for that ticker only.
+
+    Args:
+        root: pathlib.Path of the dataset directory
+        ticker: str ticker the records belong to
+        columns: list of str column names, the `Record.columns` of the ticker
+        batch_size: int number of records per written fragment
+    """
+
+    def __init__(self, root, ticker, columns, batch_size=10000):
+        require_pyarrow()
+        self.root = root
+        self.ticker = ticker
+        self.columns = columns
+        self.batch_size = batch_size
+        self.rows = 0
+        self.batches = 0
+        self.partial_root = root / ".partial" / ticker
+        self._buffer = record.RecordBuffer(columns)
+        self._lock = threading.Lock()
+        shutil.rmtree(self.partial_root, ignore_errors=True)
+        self.partial_root.mkdir(parents=True)
+
+    @classmethod
+    def for_ticker(cls, project, ticker, columns, **kwargs):
+        return cls(project.root / "downloads/branches.parquet", ticker, columns, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+        return False
+
+    def write(self, row):
+        with self._lock:
+            self._buffer.append(row)
+            self.rows += 1
+            due = len(self._buffer) >= self.batch_size
+        if due:
+            self.flush()
+
+        return None
+
+    def write_many(self, records):
+        for row in records:
+            self.write(row)
+
+        return None
+
+    def flush(self):
+        with self._lock, metrics.stage("write"):
+            if not self._buffer:
+                return None
+            table = to_table(self._buffer, self.ticker, self.columns)
+            self._buffer.clear()
+            ds.write_dataset(
+                table,
+                self.partial_root,
+                format="parquet",
+                partitioning=partitioning(),
+                basename_template=f"part-{self.batches}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+            )
+            self.batches += 1
+
+        return None
+
+    def close(self):
+        self.flush()
+        target = self.root / f"ticker={self.ticker}"
+        shutil.rmtree(target, ignore_errors=True)
+        staged = self.partial_root / f"ticker={self.ticker}"
+        if staged.exists():
+            staged.rename(target)
+        shutil.rmtree(self.partial_root, ignore_errors=True)
+        print(f"Exported {self.rows} records to `{target}`")
+
+        return None
+
+
+def load(records, project, ticker, columns):
+    with ColumnarWriter.for_ticker(project, ticker, columns) as writer:
+        writer.write_many(records)
+
+    return None
+
+
+def read(project, tickers=None, states=None, columns=None):
+    """Reads the columnar dataset into a DataFrame, pruning partitions by ticker and state.
+
+    Args:
+        project: path_helper.ProjectPath
+        tickers: optional iterable of str tickers to keep
+        states: optional iterable of two-letter state codes to keep
+        columns: optional list of str columns to read, all of them by default
+    """
+    require_pyarrow()
+    dataset = ds.dataset(project.root / "downloads/branches.parquet", format="parquet", partitioning=partitioning())
+    expression = None
+    for name, values in (("ticker", tickers), ("state", states)):
+        if values is None:
+            continue
+        condition = ds.field(name).isin(list(values))
+        expression = condition if expression is None else expression & condition
+
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
@@ -0,0 +1,42 @@
+import pathlib
+import tempfile
+
+
+def columnar_roundtrip_test():
+    import columnar
+    import jpm
+    import path_helper
+
+    records = [
+        ("Mather", None, "1 Mather Business Ctr, Grand Canyon, AZ, 86023") + ("9 am-5 pm",) * 5 + ("closed", "closed", None),
+        ("Tusayan", None, "2 Main St, Tusayan, AZ 86023") + ("9 am-5 pm",) * 5 + ("9 am-12 pm", "closed", None),
+        ("Austin", None, "3 Congress Ave, Austin, TX, 78701") + ("9 am-6 pm",) * 5 + ("closed", "closed", 1),
+        ("Nowhere", None, None) + (None,) * 7 + (None,),
+    ]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        project = path_helper.ProjectPath(pathlib.Path(tmp_dir))
+        (project.root / "downloads").mkdir()
+        with columnar.ColumnarWriter.for_ticker(project, "jpm", jpm.Record.columns, batch_size=2) as writer:
+            writer.write_many(records)
+
+        root = project.root / "downloads/branches.parquet"
+        assert (root / "ticker=jpm/state=AZ").is_dir() and (root / "ticker=jpm/state=TX").is_dir()
+
+        df = columnar.read(project, states=["AZ"])
+        assert sorted(df["name"]) == ["Mather", "Tusayan"]
+        assert set(df["ticker"]) == {"jpm"}
+        assert str(df["mon"].dtype) == "category"
+
+        everything = columnar.read(project, tickers=["jpm"], columns=["name", "state", "tmp_closed"])
+        assert len(everything) == 4
+        assert everything.set_index("name").loc["Austin", "tmp_closed"] == 1
+
+        # a second export replaces the ticker's partition rather than appending to it
+        columnar.load(records[:1], project, "jpm", jpm.Record.columns)
+        assert len(columnar.read(project)) == 1
+
+    return None
+
+
+if __name__ == "__main__":
+    columnar_roundtrip_test()
@@ -0,0 +1,203 @@
+"""Crawl of one http ticker, the single code path behind `python src/<ticker>.py`, `main.py` and the orchestrator.
+
+Sitemap urls are canonicalized and queued once through a seen-index, then fetched, parsed and
+written by the staged pipeline of `stages`. Pages are parsed on the pipeline's threads, or in a
+pool of `processes` worker processes when one is asked for, which `main.py` and the orchestrator
+do to spread the lxml parse over the cpus. Urls that fail are tried again once the crawl is over.
+
+Command line words: `incremental` only fetches branches whose sitemap lastmod moved, `recover`
+replays the checkpoint journal of a crashed full run and skips the urls it holds, `parquet` also
+writes the columnar dataset, `sequential` fetches one url at a time, and `fetch=<n>`/`parse=<n>`
+tune the workers of a stage.
+"""
+
+# standard library
+import concurrent.futures
+import contextlib
+import json
+import logging
+import sys
+import time
+# python package index
+import requests
+# local modules
+import cache
+import canon
+import columnar
+import fetch
+import journal
+import metrics
+import path_helper
+import ratelimit
+from record import Record
+import retry
+import sessions
+import sink
+import stages
+import state
+
+
+logger = logging.getLogger(__name__)
+
+
+def run(label, urls, headers, parse, add_record, pool, retry_queue, args=(), get_branch_record=None, processes=None,
+        pipeline_path=None):
+    """Crawls `urls` into `add_record(url, record)` and tries the failed ones again once the crawl is over.
+
+    Args:
+        label: str name of the crawl in reports
+        urls: iterable of branch urls, consumed lazily
+        headers: dict of request headers
+        parse: module-level callable taking (url, html_text) and returning a record tuple, or None to skip the page
+        add_record: callable taking (url, record), only ever called from one thread
+        pool: sessions.SessionPool every request goes through
+        retry_queue: retry.RetryQueue failed pages are put on, urls that still fail are left on it
+        args: list of str command line words, `sequential` and the stage workers are read from it
+        get_branch_record: callable taking (url, pool) and returning a record, used by `sequential` runs
+        processes: optional int number of worker processes the pages are parsed in
+        pipeline_path: optional pathlib.Path the pipeline's stage counters are written to
+    """
+    if "sequential" in args and get_branch_record is not None:
+        num_pages = 0
+
+        def run_urls(urls):
+            nonlocal num_pages
+            for url in urls:
+                num_pages += 1
+                logger.debug("`%s`: Requesting...", url)
+                try:
+                    record = get_branch_record(url, pool)
+                except requests.RequestException as e:
+                    retry_queue.failed(url, error=e)
+                    continue
+                if record is not None:
+                    add_record(url, record)
+
+            return None
+
+        start = time.perf_counter()
+        run_urls(urls)
+        elapsed = time.perf_counter() - start
+        print(f"`sequential`: {num_pages} pages in {elapsed:.2f}s: {num_pages / elapsed:.2f} pages/sec")
+        retry_queue.drain(run_urls)
+
+        return None
+
+    workers = stages.workers_from_args(args)
+    if processes:
+        # one parse thread per process, each waits on the page it handed over
+        workers["parse"] = processes
+    executor = concurrent.futures.ProcessPoolExecutor(processes) if processes else contextlib.nullcontext()
+    with executor:
+        fetcher = fetch.AsyncFetcher(headers, pool=pool)
+        crawl = stages.branch_pipeline(fetcher, parse, add_record, retry_queue, workers=workers,
+                                       executor=executor if processes else None)
+        fetcher.stats.start()
+        crawl.run(urls)
+        fetcher.stats.stop()
+        fetcher.stats.report(label)
+        crawl.report(label)
+        if pipeline_path is not None:
+            crawl.write(pipeline_path)
+        retry_queue.drain(crawl.run)
+
+    return None
+
+
+def main(ticker, parse, get_branch_record, get_urls, get_entries=None, args=None, request_slots=None, processes=None):
+    """Crawls every branch of an http ticker into `downloads/<ticker>.csv`.
+
+    Args:
+        ticker: str ticker the outputs are named after
+        parse: module-level callable taking (url, html_text) and returning a record tuple, or None
+        get_branch_record: callable taking (url, pool) and returning a record, for `sequential` runs
+        get_urls: callable taking (headers, project, pool) and returning the branch urls
+        get_entries: optional callable taking (headers, project, pool) and returning sitemap.SitemapEntry
+            objects, `incremental` runs need it
+        args: list of str command line words, defaults to `sys.argv`
+        request_slots: optional semaphore shared with crawls running in other processes, see `orchestrator`
+        processes: optional int number of worker processes the pages are parsed in
+    """
+    args = [arg.lower() for arg in (sys.argv[1:] if args is None else args)]
+    metrics.configure_logging(args)
+    metrics.reset(ticker)
+    project = path_helper.ProjectPath.from_src(__file__)
+    with open(project.root / "cfg/headers.json", "r") as f:
+        headers = json.load(f)
+
+    http_cache = cache.HttpCache.from_project(project)
+    # every request waits on the host's adaptive rate, which backs off on 429/503/timeouts
+    rate_limiter = ratelimit.RateLimiter()
+    # transient failures are retried with backoff, a host that keeps failing is paused by its circuit breaker
+    retry_policy = retry.RetryPolicy()
+    pool = sessions.SessionPool(headers, size=16, cache=http_cache, rate_limiter=rate_limiter, retry_policy=retry_policy,
+                                request_slots=request_slots)
+    # every url is canonicalized and queued once, however many spellings of it the sitemap lists
+    seen = canon.SeenIndex()
+    checkpoint = None
+    done = {}
+    if "incremental" in args and get_entries is not None:
+        # only fetch branches whose sitemap lastmod moved, or that are new or stale. The state store
+        # keeps every record as it is written, so an interrupted incremental run resumes by itself
+        crawl_state = state.CrawlState.from_project(project, ticker)
+        branch_urls = crawl_state.select(seen.filter_entries(metrics.timed("sitemap", get_entries(headers, project, pool))))
+    else:
+        if "incremental" in args:
+            print(f"`{ticker}`: WARNING: The sitemap has no lastmod, crawling every branch...")
+        crawl_state = None
+        # every finished url is appended to the journal, a recovery run replays it and skips those urls
+        checkpoint = journal.Journal.from_project(project, ticker)
+        if "recover" in args:
+            done = checkpoint.replay()
+        else:
+            checkpoint.reset()
+        branch_urls = (
+            url for url in seen.filter(metrics.timed("sitemap", get_urls(headers, project, pool))) if url not in done
+        )
+
+    # full runs stream records straight to the csv, incremental runs rebuild it from the state store
+    writer = sink.RecordWriter.for_ticker(project, ticker, Record.columns)
+    if "parquet" in args:
+        writer = sink.Tee(writer, columnar.ColumnarWriter.for_ticker(project, ticker, Record.columns))
+    for url_records in done.values():
+        writer.write_many(url_records)
+
+    def add_record(url, record):
+        pool.count_record()
+        metrics.count("records")
+        if crawl_state is not None:
+            crawl_state.update(url, record)
+        else:
+            writer.write(record)
+            checkpoint.append(url, [record])
+
+        return None
+
+    # urls that still fail are tried again once the crawl is over instead of being dropped
+    retry_queue = retry.RetryQueue(retry_policy)
+    run(ticker, branch_urls, headers, parse, add_record, pool, retry_queue, args=args,
+        get_branch_record=get_branch_record, processes=processes,
+        pipeline_path=project.root / f"downloads/{ticker}_pipeline.json")
+    retry_queue.report(ticker)
+    retry_queue.write(project.root / f"downloads/{ticker}_failed_urls.json")
+    pool.report(ticker)
+    rate_limiter.report(ticker)
+    retry_policy.report(ticker)
+    seen.report(ticker)
+    seen.close()
+    pool.close()
+    http_cache.report(ticker)
+    http_cache.write_stats(project.root / f"downloads/{ticker}_cache_stats.json")
+
+    if crawl_state is not None:
+        # merge the fresh records with every unchanged one kept from earlier runs
+        writer.write_many(crawl_state.records())
+        crawl_state.report(ticker)
+        crawl_state.close()
+    writer.close()
+    if checkpoint is not None:
+        checkpoint.close()
+        checkpoint.compact()
+    metrics.finish(project, ticker)
+
+    return None
@@ -0,0 +1,67 @@
+import http.server
+
+
+JPM_BRANCH_HTML = """<html><body>
+<h1 id="location-name">Mather Business Center</h1>
+<address id="address"><span>1 Mather Business Ctr</span>, <span>Grand Canyon</span>, <span>AZ</span> <span>86023</span></address>
+<table><tbody>
+<tr><td>Mon</td><td>9 AM</td><td>-</td><td>5 PM</td></tr>
+<tr><td>Tue</td><td>9 AM</td><td>-</td><td>5 PM</td></tr>
+<tr><td>Wed</td><td>9 AM</td><td>-</td><td>5 PM</td></tr>
+<tr><td>Thu</td><td>9 AM</td><td>-</td><td>5 PM</td></tr>
+<tr><td>Fri</td><td>9 AM</td><td>-</td><td>6 PM</td></tr>
+<tr><td>Sat</td><td>9 AM</td><td>-</td><td>12 PM</td></tr>
+<tr><td>Sun</td><td>Closed</td></tr>
+</tbody></table>
+</body></html>"""
+
+
+class BranchHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        body = JPM_BRANCH_HTML.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run_test():
+    import fetch_test
+    import crawl
+    import jpm
+    import retry
+    import sessions
+
+    server = fetch_test.serve(BranchHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base_url}/az/grand-canyon/{i}-mather-business-center" for i in range(10)]
+    results = {}
+    try:
+        # pages parsed in worker processes, on the pipeline's threads and one url at a time
+        for name, kwargs in [("processes", {"processes": 2}), ("threads", {}), ("sequential", {"args": ["sequential"]})]:
+            records = []
+            pool = sessions.SessionPool({}, size=4, prime=False)
+            crawl.run("jpm", iter(urls), {}, jpm.parse_branch_record, lambda url, record: records.append(record), pool,
+                      retry.RetryQueue(), get_branch_record=jpm.get_branch_record, **kwargs)
+            pool.close()
+            results[name] = records
+    finally:
+        server.shutdown()
+
+    assert all(len(records) == 10 for records in results.values())
+    assert results["processes"] == results["threads"] == results["sequential"]
+    name, branch_type, addr, mon, tue, wed, thu, fri, sat, sun, tmp_closed = results["processes"][0]
+    assert name == "Mather Business Center"
+    assert addr == "1 Mather Business Ctr, Grand Canyon, AZ, 86023"
+    assert (mon, fri, sat, sun) == ("9 am-5 pm", "9 am-6 pm", "9 am-12 pm", "closed")
+
+    return None
+
+
+if __name__ == "__main__":
+    run_test()
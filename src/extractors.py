@@ -0,0 +1,96 @@
+"""Declarative branch page extractors.
+
+Each bank module declares a `Spec`: the xpath selecting every field of its branch page and
+the post-processing that turns the selected text into record columns. Selectors are compiled
+into `lxml.etree.XPath` objects and regexes into patterns once, when the bank module is imported,
+instead of on every page. Text results come back as plain strings (`smart_strings=False`),
+so no back-reference to the parsed tree is kept for every text node.
+"""
+
+# standard library
+import re
+# python package index
+import lxml.etree
+import lxml.html
+# local modules
+import metrics
+
+
+class Spec(object):
+    """Compiled selectors and post-processing for one bank's branch page.
+
+    Args:
+        fields: dict of name -> (xpath, post). `post(values)` gets the list of xpath results and
+            returns the value of the `name` column, a dict of column -> value, or None to leave
+            the record untouched
+        checks: optional dict of name -> xpath whose presence is tested with `matches`
+        patterns: optional dict of name -> regex, compiled into `regexes` for the post functions
+    """
+
+    def __init__(self, fields, checks=None, patterns=None):
+        self.fields = fields
+        # the raw xpath strings, for evaluation in a browser (see spiders.SeleniumSpider.extract)
+        self.selectors = {name: xpath for name, (xpath, _) in fields.items()}
+        self.xpaths = {name: lxml.etree.XPath(xpath, smart_strings=False) for name, xpath in self.selectors.items()}
+        self.checks = {name: lxml.etree.XPath(xpath) for name, xpath in (checks or {}).items()}
+        self.regexes = {name: re.compile(pattern) for name, pattern in (patterns or {}).items()}
+
+    def parse(self, html_text):
+        with metrics.stage("parse"):
+            return lxml.html.fromstring(html_text)
+
+    def matches(self, html_doc, name):
+        return bool(self.checks[name](html_doc))
+
+    def select(self, html_doc, names=None):
+        """Returns a dict of name -> xpath results for the `names` fields, all of them by default."""
+        names = self.fields if names is None else names
+        with metrics.stage("parse"):
+            return {name: self.xpaths[name](html_doc) for name in names}
+
+    def transform(self, values, record):
+        """Runs the post-processing of every field in `values` into `record` (a record.Record)."""
+        with metrics.stage("transform"):
+            for name, selected in values.items():
+                value = self.fields[name][1](selected)
+                if isinstance(value, dict):
+                    record.update(value)
+                elif value is not None:
+                    setattr(record, name, value)
+
+        return record
+
+    def extract(self, html_doc, record, names=None):
+        return self.transform(self.select(html_doc, names=names), record)
+
+
+def first(values):
+    if values:
+        return values[0]
+
+    return None
+
+
+def joined(sep, min_len=None, strip=True):
+    """Returns a post function joining the parts (stripped unless told otherwise) longer than `min_len`."""
+    def post(values):
+        if not values:
+            return None
+        parts = [val.strip() if strip else val for val in values if min_len is None or len(val.strip()) > min_len]
+
+        return sep.join(parts)
+
+    return post
+
+
+def fill_week(week, hours):
+    """Fills the days missing from `hours` with the previous day's hours, the week starts on mon."""
+    mem = None
+    for day in week:
+        buffer = hours.get(day)
+        if buffer is not None:
+            mem = buffer
+        else:
+            hours[day] = mem
+
+    return hours
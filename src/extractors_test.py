@@ -0,0 +1,42 @@
+def spec_test():
+    import crawl_test
+    import extractors
+    import jpm
+
+    spec = extractors.Spec(
+        fields={
+            "name": ("//*[@id='location-name']//text()", extractors.first),
+            "addr": ("//*[@id='address']//text()", extractors.joined(", ", min_len=1)),
+            "type": ("//*[@id='type']//text()", extractors.first),
+        },
+        checks={"hours": "//tbody"},
+        patterns={"zip": r"\d{5}$"},
+    )
+    html_doc = spec.parse(crawl_test.JPM_BRANCH_HTML)
+    record = spec.extract(html_doc, jpm.Record())
+
+    assert record.name == "Mather Business Center"
+    assert record.addr == "1 Mather Business Ctr, Grand Canyon, AZ, 86023"
+    # missing fields leave the record untouched
+    assert record.type is None
+    # results are plain strings, not lxml smart strings
+    assert type(spec.select(html_doc, names=["name"])["name"][0]) is str
+    assert spec.matches(html_doc, "hours")
+    assert spec.regexes["zip"].search(record.addr)
+
+    return None
+
+
+def fill_week_test():
+    import extractors
+
+    hours = extractors.fill_week(["mon", "tue", "wed"], {"mon": "9-5", "wed": "closed"})
+
+    assert hours == {"mon": "9-5", "tue": "9-5", "wed": "closed"}
+
+    return None
+
+
+if __name__ == "__main__":
+    spec_test()
+    fill_week_test()
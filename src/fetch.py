@@ -0,0 +1,177 @@
+"""Asyncio fetch engine with a global and a per-host concurrency limit.
+
+Requests are issued on a thread pool through `requests`, so each page comes back as the
+same response text the per-bank parsers already work on.
+"""
+
+# standard library
+import asyncio
+import collections
+import concurrent.futures
+import threading
+import time
+import urllib.parse
+# python package index
+import requests
+# local modules
+import sessions
+
+
+class Page(object):
+
+    def __init__(self, url, status_code, text, content=b"", error=None):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.content = content
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None and self.status_code is not None and self.status_code < 400
+
+
+class FetchStats(object):
+
+    def __init__(self):
+        self.pages = 0
+        self.errors = 0
+        self.bytes = 0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.started = time.perf_counter()
+
+        return None
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+        return None
+
+    def add(self, page):
+        with self._lock:
+            self.pages += 1
+            self.bytes += len(page.content)
+            if not page.ok:
+                self.errors += 1
+
+        return None
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        end = self.finished if self.finished is not None else time.perf_counter()
+
+        return end - self.started
+
+    @property
+    def pages_per_sec(self):
+        if not self.elapsed:
+            return 0.0
+
+        return self.pages / self.elapsed
+
+    def report(self, label="fetch"):
+        print(
+            f"`{label}`: {self.pages} pages ({self.errors} errors, {self.bytes} bytes) "
+            f"in {self.elapsed:.2f}s: {self.pages_per_sec:.2f} pages/sec"
+        )
+
+        return None
+
+
+class AsyncFetcher(object):
+    """Fetches many urls concurrently.
+
+    At most `max_concurrency` requests are in flight at once and at most `per_host` of them
+    go to any one host. Urls are pulled from the input iterable lazily, so a generator can
+    feed the fetcher while it is still producing.
+
+    Args:
+        headers: dict of request headers sent with every request
+        max_concurrency: int global limit on in-flight requests
+        per_host: int limit on in-flight requests to a single host
+        timeout: float seconds before a request is abandoned
+        pool: optional sessions.SessionPool, one sized to `max_concurrency` is built if omitted
+    """
+
+    def __init__(self, headers, max_concurrency=16, per_host=4, timeout=30, pool=None):
+        self.headers = headers
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.pool = pool or sessions.SessionPool(headers, size=max_concurrency)
+        self.stats = FetchStats()
+        # per-host limits for callers that bring their own threads, see `get`
+        self._host_slots = collections.defaultdict(lambda: threading.BoundedSemaphore(self.per_host))
+        self._host_slots_lock = threading.Lock()
+
+    def _get(self, url):
+        try:
+            response = self.pool.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            return Page(url, None, "", error=e)
+
+        return Page(url, response.status_code, response.text, response.content)
+
+    async def _fetch(self, loop, executor, host_limits, url):
+        host = urllib.parse.urlsplit(url).netloc
+        async with host_limits[host]:
+            page = await loop.run_in_executor(executor, self._get, url)
+        self.stats.add(page)
+
+        return page
+
+    def get(self, url):
+        """Fetches one url on the calling thread, returning a Page that carries any request error.
+
+        Blocks while `per_host` requests to the url's host are already in flight from other
+        threads, and counts the page in `stats` like `fetch` does.
+        """
+        host = urllib.parse.urlsplit(url).netloc
+        with self._host_slots_lock:
+            host_slots = self._host_slots[host]
+        with host_slots:
+            page = self._get(url)
+        self.stats.add(page)
+
+        return page
+
+    async def _run(self, urls, on_page):
+        loop = asyncio.get_event_loop()
+        host_limits = collections.defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        pending = set()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for url in urls:
+                if len(pending) >= self.max_concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        on_page(task.result())
+                pending.add(loop.create_task(self._fetch(loop, executor, host_limits, url)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    on_page(task.result())
+
+        return None
+
+    def fetch(self, urls, on_page):
+        """Fetches every url and calls `on_page(page)` as each one completes."""
+        self.stats.start()
+        try:
+            asyncio.run(self._run(urls, on_page))
+        finally:
+            self.stats.stop()
+
+        return None
+
+    def fetch_all(self, urls):
+        """Fetches every url and returns the list of pages in completion order."""
+        pages = []
+        self.fetch(urls, pages.append)
+
+        return pages
@@ -0,0 +1,75 @@
+import http.server
+import threading
+import time
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        time.sleep(0.05)
+        with cls.lock:
+            cls.active -= 1
+
+        body = f"<html><body><h1 id='location-name'>{self.path}</h1></body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(handler):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def fetch_all_test():
+    import fetch
+
+    server = serve(StubHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = (f"{base_url}/branch/{i}" for i in range(40))
+    try:
+        fetcher = fetch.AsyncFetcher(headers={}, max_concurrency=8, per_host=3)
+        pages = fetcher.fetch_all(urls)
+    finally:
+        server.shutdown()
+
+    assert len(pages) == 40
+    assert all(page.ok for page in pages)
+    assert sorted(page.text for page in pages)[0].startswith("<html>")
+    assert StubHandler.peak <= 3, StubHandler.peak
+    assert fetcher.stats.pages == 40 and fetcher.stats.pages_per_sec > 0
+    fetcher.stats.report("stub")
+
+    return None
+
+
+def fetch_error_test():
+    import fetch
+
+    fetcher = fetch.AsyncFetcher(headers={}, timeout=1)
+    pages = fetcher.fetch_all(["http://127.0.0.1:9/unreachable"])
+
+    assert len(pages) == 1 and not pages[0].ok
+    assert fetcher.stats.errors == 1
+
+    return None
+
+
+if __name__ == "__main__":
+    fetch_all_test()
+    fetch_error_test()
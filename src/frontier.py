@@ -0,0 +1,303 @@
+"""Sharded crawl frontier with lease-based work claiming.
+
+A seeding run hashes every url of a ticker into one of `num_shards` shards. Workers, on one
+machine or several, then claim one shard at a time under a lease, extend the lease while they
+crawl it, mark it complete once its records are written and release it when they fail, so
+another worker picks it up. A lease that runs out (the worker died) makes its shard claimable
+again. `Frontier` is the interface the workers use; `SqliteFrontier` implements it in one
+sqlite file, which serves workers sharing a box or a filesystem with working locks.
+"""
+
+# standard library
+import contextlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+
+logger = logging.getLogger(__name__)
+
+
+def shard_of(url, num_shards):
+    """Returns the shard of `url`, stable across processes and machines."""
+    return zlib.crc32(url.encode()) % num_shards
+
+
+def default_worker():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseLost(Exception):
+    """Raised when a lease expired and its shard went to another worker."""
+
+
+class Lease(object):
+
+    def __init__(self, shard, worker, token, expires_at):
+        self.shard = shard
+        self.worker = worker
+        self.token = token
+        self.expires_at = expires_at
+
+    def __repr__(self):
+        return f"Lease(shard={self.shard}, worker={self.worker!r}, expires_at={self.expires_at:.0f})"
+
+
+class Frontier(object):
+    """Interface of a crawl frontier backend, plus the worker loop built on it.
+
+    Backends implement `add`, `claim`, `extend`, `check`, `release`, `complete`, `urls`, `shards` and
+    `progress`.
+    """
+
+    def add(self, urls):
+        """Adds urls to their shards and returns how many were new."""
+        raise NotImplementedError
+
+    def claim(self, worker, lease_seconds):
+        """Leases a pending (or expired) shard to `worker` and returns its `Lease`, or None when none is left."""
+        raise NotImplementedError
+
+    def extend(self, lease, lease_seconds):
+        """Pushes the expiry of `lease` out to `lease_seconds` from now, raising `LeaseLost` if it is gone."""
+        raise NotImplementedError
+
+    def check(self, lease):
+        """Raises `LeaseLost` unless `lease` still holds its shard, e.g. before promoting the shard's output."""
+        raise NotImplementedError
+
+    def release(self, lease):
+        """Puts the shard of `lease` back for another worker."""
+        raise NotImplementedError
+
+    def complete(self, lease):
+        """Marks the shard of `lease` done, raising `LeaseLost` if it is gone."""
+        raise NotImplementedError
+
+    def urls(self, lease):
+        """Returns the urls of the shard of `lease`."""
+        raise NotImplementedError
+
+    def shards(self, status):
+        """Returns the sorted list of int shards with `status` ("pending", "leased" or "done")."""
+        raise NotImplementedError
+
+    def progress(self):
+        """Returns a dict of shard status -> number of shards."""
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def heartbeat(self, lease, lease_seconds):
+        """Extends `lease` from a background thread every third of `lease_seconds` while the block runs."""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(lease_seconds / 3):
+                try:
+                    self.extend(lease, lease_seconds)
+                except LeaseLost:
+                    logger.warning("`shard %d`: Lease lost while crawling!", lease.shard)
+                    return
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield lease
+        finally:
+            stop.set()
+            thread.join()
+
+    def work(self, crawl_shard, worker=None, lease_seconds=600):
+        """Claims shards until none are left and calls `crawl_shard(lease, urls)` on each one.
+
+        A shard whose crawl raises is released for another worker before the error propagates.
+
+        Returns:
+            list of int shards this worker completed
+        """
+        worker = worker or default_worker()
+        completed = []
+        while True:
+            lease = self.claim(worker, lease_seconds)
+            if lease is None:
+                break
+            print(f"`{worker}`: Claimed shard {lease.shard}...")
+            try:
+                with self.heartbeat(lease, lease_seconds):
+                    crawl_shard(lease, self.urls(lease))
+            except BaseException:
+                self.release(lease)
+                print(f"`{worker}`: Released shard {lease.shard} after a failure")
+                raise
+            try:
+                self.complete(lease)
+            except LeaseLost:
+                # the lease ran out mid-crawl and the shard went to another worker, whose output stands
+                print(f"`{worker}`: ALERT: Lost the lease on shard {lease.shard} before completing it")
+                continue
+            completed.append(lease.shard)
+        print(f"`{worker}`: No shards left, completed {len(completed)}: {completed}")
+
+        return completed
+
+
+class SqliteFrontier(Frontier):
+    """Frontier kept in one sqlite database.
+
+    Claims run in an immediate transaction, so concurrent workers never lease the same shard.
+
+    Args:
+        path: pathlib.Path of the sqlite database
+        num_shards: int number of shards the urls are spread over
+        clock: callable returning epoch seconds, shared by every worker, swappable in tests
+    """
+
+    def __init__(self, path, num_shards=16, clock=time.time):
+        self.path = path
+        self.num_shards = num_shards
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, shard INTEGER)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS urls_shard ON urls (shard)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS shards ("
+            "shard INTEGER PRIMARY KEY, status TEXT, worker TEXT, token TEXT, expires_at REAL, claims INTEGER)"
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO shards VALUES (?, 'pending', NULL, NULL, NULL, 0)",
+            ((shard,) for shard in range(num_shards))
+        )
+
+    @classmethod
+    def from_project(cls, project, ticker, **kwargs):
+        return cls(project.root / f"downloads/{ticker}_frontier.sqlite", **kwargs)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def clear(self):
+        """Drops every url and resets every shard, for a fresh seeding run."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM urls")
+            conn.execute("UPDATE shards SET status = 'pending', worker = NULL, token = NULL, expires_at = NULL, claims = 0")
+
+        return None
+
+    def add(self, urls):
+        with self._transaction() as conn:
+            before = conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+            conn.executemany(
+                "INSERT OR IGNORE INTO urls VALUES (?, ?)", ((url, shard_of(url, self.num_shards)) for url in urls)
+            )
+            after = conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+        return after - before
+
+    def claim(self, worker, lease_seconds):
+        now = self.clock()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT shard FROM shards WHERE (status = 'pending' OR (status = 'leased' AND expires_at < ?)) "
+                "AND shard IN (SELECT DISTINCT shard FROM urls) ORDER BY claims, shard LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            lease = Lease(row[0], worker, uuid.uuid4().hex, now + lease_seconds)
+            conn.execute(
+                "UPDATE shards SET status = 'leased', worker = ?, token = ?, expires_at = ?, claims = claims + 1 "
+                "WHERE shard = ?",
+                (lease.worker, lease.token, lease.expires_at, lease.shard)
+            )
+
+        return lease
+
+    def _update_leased(self, lease, sql, params):
+        with self._transaction() as conn:
+            cursor = conn.execute(sql + " WHERE shard = ? AND token = ? AND status = 'leased'",
+                                  params + (lease.shard, lease.token))
+            if cursor.rowcount == 0:
+                raise LeaseLost(f"`shard {lease.shard}`: Lease of `{lease.worker}` is no longer held")
+
+        return None
+
+    def extend(self, lease, lease_seconds):
+        expires_at = self.clock() + lease_seconds
+        self._update_leased(lease, "UPDATE shards SET expires_at = ?", (expires_at,))
+        lease.expires_at = expires_at
+
+        return None
+
+    def check(self, lease):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM shards WHERE shard = ? AND token = ? AND status = 'leased'", (lease.shard, lease.token)
+            ).fetchone()
+        if row is None:
+            raise LeaseLost(f"`shard {lease.shard}`: Lease of `{lease.worker}` is no longer held")
+
+        return None
+
+    def release(self, lease):
+        try:
+            self._update_leased(
+                lease, "UPDATE shards SET status = 'pending', worker = NULL, token = NULL, expires_at = NULL", ()
+            )
+        except LeaseLost:
+            # somebody else holds it already, nothing to give back
+            pass
+
+        return None
+
+    def complete(self, lease):
+        self._update_leased(lease, "UPDATE shards SET status = 'done', expires_at = NULL", ())
+
+        return None
+
+    def urls(self, lease):
+        with self._lock:
+            rows = self.conn.execute("SELECT url FROM urls WHERE shard = ? ORDER BY url", (lease.shard,)).fetchall()
+
+        return [url for url, in rows]
+
+    def shards(self, status):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT shard FROM shards WHERE status = ? AND shard IN (SELECT DISTINCT shard FROM urls) ORDER BY shard",
+                (status,)
+            ).fetchall()
+
+        return [shard for shard, in rows]
+
+    def progress(self):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) FROM shards WHERE shard IN (SELECT DISTINCT shard FROM urls) GROUP BY status"
+            ).fetchall()
+
+        return dict(rows)
+
+    def report(self, label="frontier"):
+        print(f"`{label}`: shards by status {self.progress()} in `{self.path}`")
+
+        return None
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+        return None
@@ -0,0 +1,160 @@
+import pathlib
+import tempfile
+import threading
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def lease_test():
+    import frontier
+
+    urls = [f"https://locator.chase.com/az/phoenix/{i}" for i in range(40)]
+    clock = FakeClock()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        crawl_frontier = frontier.SqliteFrontier(pathlib.Path(tmp_dir) / "jpm_frontier.sqlite", num_shards=4, clock=clock)
+        assert crawl_frontier.add(urls) == 40 and crawl_frontier.add(urls[:5]) == 0
+
+        first = crawl_frontier.claim("box-1", lease_seconds=60)
+        second = crawl_frontier.claim("box-2", lease_seconds=60)
+        assert first.shard != second.shard
+        assert all(frontier.shard_of(url, 4) == first.shard for url in crawl_frontier.urls(first))
+
+        # box-1 keeps its lease alive, box-2 goes quiet and its shard is claimed again once the lease runs out
+        clock.now += 50
+        crawl_frontier.extend(first, lease_seconds=60)
+        clock.now += 20
+        # untouched shards are handed out before expired ones
+        third = crawl_frontier.claim("box-3", lease_seconds=60)
+        fourth = crawl_frontier.claim("box-3", lease_seconds=60)
+        assert {first.shard, second.shard, third.shard, fourth.shard} == {0, 1, 2, 3}
+        fifth = crawl_frontier.claim("box-3", lease_seconds=60)
+        assert fifth.shard == second.shard
+        crawl_frontier.check(fifth)
+        try:
+            crawl_frontier.check(second)
+        except frontier.LeaseLost:
+            pass
+        else:
+            raise AssertionError("an expired lease still passed the check")
+        try:
+            crawl_frontier.complete(second)
+        except frontier.LeaseLost:
+            pass
+        else:
+            raise AssertionError("an expired lease completed its shard")
+
+        crawl_frontier.release(fourth)
+        sixth = crawl_frontier.claim("box-1", lease_seconds=60)
+        assert sixth.shard == fourth.shard
+        for lease in (first, third, fifth):
+            crawl_frontier.complete(lease)
+        assert crawl_frontier.shards("leased") == [sixth.shard]
+        crawl_frontier.complete(sixth)
+        assert crawl_frontier.shards("done") == [0, 1, 2, 3]
+        assert crawl_frontier.claim("box-1", lease_seconds=60) is None
+        assert crawl_frontier.progress() == {"done": 4}
+        crawl_frontier.close()
+
+    return None
+
+
+def workers_test():
+    import frontier
+
+    urls = [f"https://locator.chase.com/az/phoenix/{i}" for i in range(200)]
+    crawled = []
+    failures = []
+    lock = threading.Lock()
+
+    def crawl_shard(lease, shard_urls):
+        with lock:
+            # the first crawl of shard 3 dies halfway, its shard goes back for another try
+            if lease.shard == 3 and not failures:
+                failures.append(lease.worker)
+                raise RuntimeError("worker crashed")
+            crawled.extend(shard_urls)
+
+        return None
+
+    def worker(path, name):
+        crawl_frontier = frontier.SqliteFrontier(path, num_shards=8)
+        try:
+            crawl_frontier.work(crawl_shard, worker=name, lease_seconds=30)
+        except RuntimeError:
+            # a fresh process takes over for the crashed one
+            crawl_frontier.work(crawl_shard, worker=f"{name}-restarted", lease_seconds=30)
+        finally:
+            crawl_frontier.close()
+
+        return None
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = pathlib.Path(tmp_dir) / "rfc_frontier.sqlite"
+        seeder = frontier.SqliteFrontier(path, num_shards=8)
+        seeder.add(urls)
+        workers = [threading.Thread(target=worker, args=(path, f"box-{i}")) for i in range(3)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        progress = seeder.progress()
+        seeder.close()
+
+    assert sorted(crawled) == sorted(urls) and len(failures) == 1
+    assert progress == {"done": 8}
+
+    return None
+
+
+def shard_output_test():
+    import path_helper
+    import record
+    import sink
+
+    def write_shard(shard, token=None):
+        with sink.RecordWriter.for_shard(project, "wfc", shard, record.Record.columns, token=token) as writer:
+            for i in range(3):
+                writer.write((f"Branch {shard}-{i}", "Branch", "1 Main St") + ("9 am-5 pm",) * 7 + (0,))
+
+        return writer
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        project = path_helper.ProjectPath(pathlib.Path(tmp_dir))
+        (project.root / "downloads").mkdir()
+        # the last run had eight shards, a new seed wipes them
+        for shard in range(8):
+            write_shard(shard)
+        (project.root / "downloads/wfc_shard_007_failed_urls.json").write_text("{}")
+        assert sink.clear_shards(project, "wfc") == 9
+        assert not list(project.root.glob("downloads/wfc_shard_*"))
+
+        for shard in (2, 0, 1):
+            write_shard(shard, token=f"lease{shard}")
+        # a worker that lost shard 1 wrote next to the new owner, not over it, and throws its rows away
+        stale = sink.RecordWriter.for_shard(project, "wfc", 1, record.Record.columns, token="expired")
+        stale.write(("Stale", "Branch", "1 Main St") + ("9 am-5 pm",) * 7 + (0,))
+        stale.discard()
+        # only the shards the frontier marks done are merged
+        assert sink.merge_shards(project, "wfc", record.Record.columns, [2, 0]) == 6
+        with open(project.root / "downloads/wfc.csv", "r") as f:
+            lines = f.read().splitlines()
+        with open(project.root / "downloads/wfc_shard_001.csv", "r") as f:
+            shard_lines = f.read().splitlines()
+
+    assert lines[1].startswith("0,Branch 0-0,") and lines[6].startswith("5,Branch 2-2,")
+    assert len(shard_lines) == 4 and "Stale" not in "".join(shard_lines)
+
+    return None
+
+
+if __name__ == "__main__":
+    lease_test()
+    workers_test()
+    shard_output_test()
@@ -0,0 +1,97 @@
+"""Normalization of the free-text `mon`..`sun` hours into open/close minutes.
+
+Every bank formats its hours differently, e.g. '9 am-5 pm' (jpm), '9 a.m.-5 p.m.' (rfc) and
+'09:00 AM-05:00 PM' (wfc). `normalize` turns each day column into `<day>_open` and `<day>_close`
+minutes after midnight plus a `<day>_closed` flag. All of the days of all of the records are
+matched in one vectorized `str.extract` pass over the distinct values instead of a python loop
+per value.
+"""
+
+# standard library
+import sys
+# python package index
+import numpy as np
+import pandas as pd
+# local modules
+import path_helper
+from record import Record
+
+
+# applied after lowercasing and dropping whitespace and dots: '9am-5pm', '09:00am-05:00pm'
+hours_regex = r"^(?P<open_h>\d{1,2})(?::(?P<open_m>\d{2}))?(?P<open_ampm>am|pm)[-–](?P<close_h>\d{1,2})(?::(?P<close_m>\d{2}))?(?P<close_ampm>am|pm)$"
+closed_values = ["closed"]
+all_day_values = ["open24hours", "24hours"]
+
+
+def to_minutes(hour, minute, ampm):
+    """Vectorized 12-hour clock -> minutes after midnight, `12am` being 0 and `12pm` 720."""
+    minutes = hour.astype(float) % 12 * 60 + minute.fillna("0").astype(float)
+
+    return minutes + np.where(ampm == "pm", 720, 0)
+
+
+def normalize(df, columns=Record.week):
+    """Adds `<day>_open`, `<day>_close` and `<day>_closed` columns for every day in `columns`.
+
+    Args:
+        df: DataFrame with free-text hours columns, e.g. a ticker csv or `columnar.read` result
+        columns: list of str day columns to normalize
+
+    Returns:
+        (DataFrame, int) the frame with the normalized columns added, and the number of
+        non-empty hours values that could not be parsed (left as missing open/close/closed)
+    """
+    # flatten every day of every record into one array, then parse each distinct string once;
+    # hours repeat heavily across branches, so there are only a few hundred of them nationally
+    codes, uniques = pd.factorize(df[columns].to_numpy().ravel())
+    clean = pd.Series(uniques, dtype=object).astype(str).str.lower().str.replace(r"[\s.]", "", regex=True)
+    parts = clean.str.extract(hours_regex)
+
+    closed = clean.isin(closed_values).to_numpy()
+    all_day = clean.isin(all_day_values).to_numpy()
+    parsed = parts["open_h"].notna().to_numpy()
+    opens = np.full(len(clean) + 1, np.nan)  # the extra trailing slot is for missing values (code -1)
+    closes = np.full(len(clean) + 1, np.nan)
+    flags = np.full(len(clean) + 1, np.nan)
+    opens[:-1][parsed] = to_minutes(parts.loc[parsed, "open_h"], parts.loc[parsed, "open_m"], parts.loc[parsed, "open_ampm"])
+    closes[:-1][parsed] = to_minutes(parts.loc[parsed, "close_h"], parts.loc[parsed, "close_m"], parts.loc[parsed, "close_ampm"])
+    # a branch closing at '12 am' closes at the end of the day, not the start
+    closes[:-1][parsed & (closes[:-1] == 0)] = 24 * 60
+    opens[:-1][all_day] = 0
+    closes[:-1][all_day] = 24 * 60
+    flags[:-1][parsed | all_day] = 0
+    flags[:-1][closed] = 1
+    unparsed = int(np.isin(codes, np.flatnonzero(~(parsed | all_day | closed))).sum())
+    opens, closes, flags = opens[codes], closes[codes], flags[codes]
+
+    # back to one column per day, aligned with the original rows
+    shape = (len(df), len(columns))
+    opens, closes, flags = opens.reshape(shape), closes.reshape(shape), flags.reshape(shape)
+    out = df.copy()
+    for i, day in enumerate(columns):
+        out[f"{day}_open"] = pd.array(opens[:, i], dtype="Float64").astype("Int16")
+        out[f"{day}_close"] = pd.array(closes[:, i], dtype="Float64").astype("Int16")
+        out[f"{day}_closed"] = pd.array(flags[:, i], dtype="Float64").astype("boolean")
+
+    return out, unparsed
+
+
+def normalize_ticker(project, ticker):
+    """Normalizes `downloads/<ticker>.csv` into `downloads/<ticker>_hours.csv`."""
+    path = project.root / f"downloads/{ticker}.csv"
+    try:
+        df = pd.read_csv(path, index_col=0, dtype={day: str for day in Record.week})
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Could not find `{path}`. Run the `{ticker}` crawl first.")
+    df, unparsed = normalize(df)
+    out_path = project.root / f"downloads/{ticker}_hours.csv"
+    df.to_csv(out_path)
+    print(f"`{ticker}`: Normalized {len(df)} records to `{out_path}`, {unparsed} unparseable hours values")
+
+    return unparsed
+
+
+if __name__ == "__main__":
+    project = path_helper.ProjectPath.from_src(__file__)
+    for ticker in sys.argv[1:]:
+        normalize_ticker(project, ticker.lower())
@@ -0,0 +1,28 @@
+def normalize_test():
+    import pandas as pd
+    import hours
+
+    df = pd.DataFrame({
+        "mon": ["9 am-5 pm", "9 a.m.-5 p.m.", "09:00 AM-05:00 PM", None],
+        "sat": ["9 am-12 pm", "Closed", "Open 24 Hours", "by appointment"],
+        "sun": ["closed", "closed", "10:30 AM-12:00 AM", None],
+    })
+    out, unparsed = hours.normalize(df, columns=["mon", "sat", "sun"])
+
+    # jpm, rfc and wfc formats all land on the same minutes
+    assert out["mon_open"].tolist()[:3] == [540] * 3
+    assert out["mon_close"].tolist()[:3] == [1020] * 3
+    assert out["sat_close"][0] == 720
+    assert out["sat_closed"].tolist()[:3] == [False, True, False]
+    assert (out["sat_open"][2], out["sat_close"][2]) == (0, 1440)
+    assert (out["sun_open"][2], out["sun_close"][2]) == (630, 1440)
+    # missing values stay missing, unparseable ones are counted
+    assert out["mon_open"].isna()[3] and out["sun_closed"].isna()[3]
+    assert unparsed == 1
+    assert list(out.columns[:3]) == ["mon", "sat", "sun"]
+
+    return None
+
+
+if __name__ == "__main__":
+    normalize_test()
@@ -0,0 +1,104 @@
+"""Append-only checkpoint journal for resumable crawls.
+
+Each completed unit of work (a branch url, or a pnc city url) is appended as one JSON line
+holding the url and the records it produced. Writes are fsynced in batches, a resume replays
+the file in one linear pass, and a clean run compacts it down to one line per url.
+"""
+
+# standard library
+import json
+import os
+import time
+
+
+class Journal(object):
+    """Checkpoint journal for one ticker.
+
+    Args:
+        path: pathlib.Path of the journal file
+        fsync_every: int number of appends between fsyncs
+        fsync_seconds: float maximum seconds an append may sit unsynced
+    """
+
+    def __init__(self, path, fsync_every=25, fsync_seconds=5.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_seconds = fsync_seconds
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    @classmethod
+    def from_project(cls, project, ticker, **kwargs):
+        return cls(project.root / f"downloads/{ticker}_journal.jsonl", **kwargs)
+
+    def replay(self):
+        """Returns a dict of url -> records for every completed url, read in one pass."""
+        done = {}
+        try:
+            f = open(self.path, "r")
+        except FileNotFoundError:
+            return done
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a crash can leave the final line half written
+                    print(f"`{self.path}`: WARNING: Skipping truncated journal line...")
+                    continue
+                done[entry["url"]] = [tuple(record) for record in entry["records"]]
+        print(f"`{self.path}`: Replayed {len(done)} completed urls")
+
+        return done
+
+    def reset(self):
+        """Discards the journal so a fresh (non-resumed) run starts empty."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+        return None
+
+    def append(self, url, records):
+        if self._file is None:
+            self._file = open(self.path, "a")
+        self._file.write(json.dumps({"url": url, "records": records}) + "\n")
+        self._pending += 1
+        if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_seconds:
+            self.sync()
+
+        return None
+
+    def sync(self):
+        if self._file is not None and self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+        return None
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+        return None
+
+    def compact(self):
+        """Rewrites the journal with one line per url, keeping the latest records for each."""
+        self.close()
+        done = self.replay()
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            for url, records in done.items():
+                f.write(json.dumps({"url": url, "records": records}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+        return None
@@ -0,0 +1,37 @@
+import pathlib
+import tempfile
+
+
+def replay_test():
+    import journal
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = pathlib.Path(tmp_dir) / "pnc_journal.jsonl"
+        checkpoint = journal.Journal(path, fsync_every=2)
+        checkpoint.append("https://apps.pnc.com/locator/browse/ohio/akron", [("Akron", None, "1 Main St")])
+        checkpoint.append("https://apps.pnc.com/locator/browse/ohio/kent", [])
+        checkpoint.append("https://apps.pnc.com/locator/browse/ohio/akron", [("Akron", None, "2 Main St")])
+        checkpoint.close()
+        # simulate a crash halfway through writing a line
+        with open(path, "a") as f:
+            f.write('{"url": "https://apps.pnc.com/locator/browse/ohio/ce')
+
+        done = journal.Journal(path).replay()
+        assert done == {
+            "https://apps.pnc.com/locator/browse/ohio/akron": [("Akron", None, "2 Main St")],
+            "https://apps.pnc.com/locator/browse/ohio/kent": [],
+        }
+
+        checkpoint = journal.Journal(path)
+        checkpoint.compact()
+        assert len(path.read_text().splitlines()) == 2
+        assert checkpoint.replay() == done
+
+        checkpoint.reset()
+        assert not path.exists() and checkpoint.replay() == {}
+
+    return None
+
+
+if __name__ == "__main__":
+    replay_test()
@@ -3,28 +3,20 @@
 Author: Adam Turner <turner.adch@gmail.com>
 """
 
-# python package index
+# standard library
 import json
-import lxml.html
-import pandas as pd
-import requests
+import logging
 # local modules
-import path_helper
+import canon
+import crawl
+import extractors
+from record import Record
+import sessions
+import sink
+import sitemap
 
 
-class Record(object):
-
-    week = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
-    columns = ["name", "type", "addr"]
-    columns.extend(week)
-    columns.append("tmp_closed")
-
-    def __init__(self):
-        self.data = dict.fromkeys(Record.columns)
-
-    @property
-    def pd_fmt(self):
-        return tuple(self.data[col] for col in self.data)
+logger = logging.getLogger(__name__)
 
 
 def filter_urls(urls):
@@ -41,103 +33,90 @@ def filter_urls(urls):
     for url in urls:
         parts = url.split("/")
         if len(parts) == 6 and len(parts[3]) == 2:
-            print(f"Branch URL: `{url}`")
+            logger.debug("Branch URL: `%s`", url)
             yield url
         else:
-            print(f"Non-Branch URL: `{url}`.")
+            logger.debug("Non-Branch URL: `%s`.", url)
             continue
 
 
-def get_branch_urls(headers, project):
+def get_branch_entries(headers, project, pool=None):
+    """Lazily yields the sitemap entries (url and lastmod) of branch pages."""
     with open(project.root / "cfg/sitemaps.json", "r") as f:
         sitemap_url = json.load(f)["jpm"]
 
-    response = requests.get(sitemap_url, headers=headers)
-    html_doc = lxml.html.fromstring(response.content)
-    doc_urls = html_doc.xpath("//loc//text()")
+    pool = pool or sessions.SessionPool(headers, size=1, prime=False)
+    for entry in sitemap.iter_sitemap(sitemap_url, pool):
+        # sitemap hosts come through as `locator.chase.com.`, split the canonical url instead
+        entry = entry._replace(loc=canon.canonicalize(entry.loc))
+        for _ in filter_urls([entry.loc]):
+            yield entry
 
-    return list(filter_urls(doc_urls))
 
+def get_branch_urls(headers, project, pool=None):
+    """Lazily yields branch urls while the sitemap is still streaming in."""
+    return (entry.loc for entry in get_branch_entries(headers, project, pool=pool))
 
-def transform_time_fields(record, lobby_hours):
-    print("Transforming time fields...")
+
+def transform_time_fields(lobby_hours):
+    logger.debug("Transforming time fields...")
     clean_hrs = [val.strip() for val in lobby_hours if val.strip()]
     # Expect a list of the form: ['Mon', '9 AM', '-', '5 PM', 'Tue', ..., 'Sun', 'Closed']
+    hours = {}
     for i, val in enumerate(clean_hrs):
         val_lc = val.lower()
-        if val_lc in record.data:
+        if val_lc in Record.week:
             branch_hours = ""
             # start at the next part in the array and iterate until you hit another day
             for time_part in clean_hrs[i+1:]:
                 time_lc = time_part.lower()
-                if time_lc in record.data:  # this means we will have hit the next `day` part
+                if time_lc in Record.week:  # this means we will have hit the next `day` part
                     break
                 else:
                     branch_hours += time_lc
-            record.data[val_lc] = branch_hours
+            hours[val_lc] = branch_hours
         else:
             continue
 
-    return record
+    return hours
 
 
-def get_branch_record(branch_url, headers):
-    record = Record()
+spec = extractors.Spec({
+    "name": ("//*[@id='location-name']//text()", extractors.first),
+    # JPM doesn't have readily available `branch type` data (think `ATM + Branch` vs `Branch`)
+    # if you want to construct your own field based on existing page data, add it here.
+    "addr": ("//*[@id='address']//text()", extractors.joined(", ", min_len=1)),
+    "hours": ("(//tbody)[1]//text()", lambda lobby_hours: transform_time_fields(lobby_hours) if lobby_hours else None),
+})
 
-    response = requests.get(branch_url, headers=headers)
-    branch_html = lxml.html.fromstring(response.text)
 
-    branch_name = branch_html.xpath("//*[@id='location-name']//text()")
-    if branch_name:
-        record.data["name"] = branch_name[0]
+def parse_branch_record(branch_url, html_text):
+    record = spec.extract(spec.parse(html_text), Record())
 
-    # JPM doesn't have readily available `branch type` data (think `ATM + Branch` vs `Branch`)
-    # if you want to construct your own field based on existing page data, do it here.
+    logger.debug("Record: %s", record.row)
 
-    branch_addr = branch_html.xpath("//*[@id='address']//text()")
-    if branch_addr:
-        clean_addr = [val.strip() for val in branch_addr if len(val.strip()) > 1]
-        record.data["addr"] = ", ".join(clean_addr)
+    return record.row
 
-    lobby_hours = branch_html.xpath("(//tbody)[1]//text()")
-    if lobby_hours:
-        record = transform_time_fields(record, lobby_hours)
 
-    print(record.pd_fmt)
+def get_branch_record(branch_url, pool):
+    response = pool.get(branch_url)
+    # an error page would parse into a blank record, raise so the caller can queue the url instead
+    response.raise_for_status()
 
-    return record.pd_fmt
+    return parse_branch_record(branch_url, response.text)
 
 
 def load(records, project):
-    df = pd.DataFrame.from_records(records)
-    df.columns = Record.columns
-    csv_name = "jpm.csv"
-    csv_path = str(project.root / f"downloads/{csv_name}")
-    df.to_csv(csv_path)
-    print(f"Exporting to `{csv_path}`")
-    try:
-        df.to_csv(csv_path)
-    except FileNotFoundError:
-        print(f"WARNING: DUMPING CSV TO LOCAL PATH: `{csv_name}`!")
-        df.to_csv(csv_name)
-        raise FileNotFoundError(f"Could not export to `{csv_path}`. Did you forget to run `setup.sh`?")
+    with sink.RecordWriter.for_ticker(project, "jpm", Record.columns) as writer:
+        writer.write_many(records)
 
     return None
 
 
-def main():
-    project = path_helper.ProjectPath.from_src(__file__)
-    with open(project.root / "cfg/headers.json", "r") as f:
-        headers = json.load(f)
-
-    branch_urls = get_branch_urls(headers, project)
-
-    records = []
-    for url in branch_urls:
-        print("Processing:", url)
-        records.append(get_branch_record(url, headers))
-
-    load(records, project)
+def main(args=None, request_slots=None, processes=None):
+    """Crawls every JPM branch, see `crawl.main` for the arguments and command line words."""
+    crawl.main("jpm", parse_branch_record, get_branch_record, get_branch_urls, get_entries=get_branch_entries,
+               args=args, request_slots=request_slots, processes=processes)
 
     return None
 
@@ -1,29 +1,188 @@
 """Multiprocess entrypoint.
 
+Crawls every ticker in turn through its own `main`, the http tickers with their pages parsed in a
+process pool sized to the cpus (see `crawl`). Usage: `python src/main.py [ticker ...] [recover] [incremental]
+[parquet] [verbose|quiet]`, plus any word a ticker's own `main` takes.
+
+Crawls split across workers go through the ticker's frontier: `python src/main.py seed <ticker ...> [num_shards]`
+spreads the urls over shards, any number of `python src/main.py worker <ticker ...>` processes (on any box that
+sees `downloads/`) claim and crawl shards into `downloads/<ticker>_shard_<n>.csv`, and
+`python src/main.py merge <ticker ...>` joins the shards into `downloads/<ticker>.csv`.
+
 Author: Adam Turner <turner.adch@gmail.com>
 """
 
 # standard library
-import multiprocessing as mp
+import functools
+import json
+import logging
 import os
 import sys
 # local modules
-import jpm
+import cache
+import canon
+import crawl
+import frontier
+import metrics
+import path_helper
+import pnc
+import ratelimit
+from record import Record
+import retry
+import sessions
+import sink
 import switch
 
 
-def pipeline(ticker, url):
-    if ticker == "jpm":
-        jpm.get_branch_data(url)
+logger = logging.getLogger(__name__)
+
+
+def main(tickers, args=(), request_slots=None, processes=None):
+    """Crawls every ticker in turn.
 
+    Args:
+        tickers: list of str tickers
+        args: list of str command line words passed to every ticker's `main`, e.g. `recover` or `parquet`
+        request_slots: optional semaphore shared with crawls running in other processes,
+            see `orchestrator`
+        processes: int number of parse processes of each http ticker, defaults to the cpu count
+    """
+    for ticker in tickers:
+        module = switch.module(ticker)
+        if ticker in switch.http_tickers:
+            module.main(args=list(args), request_slots=request_slots, processes=processes or os.cpu_count())
+        else:
+            # pnc is driven through a browser and runs its own crawl
+            module.main(args=list(args))
 
     return None
 
 
+def seed(tickers, num_shards=16):
+    """Replaces the frontier of every ticker with its current urls, spread over `num_shards` shards."""
+    project = path_helper.ProjectPath.from_src(__file__)
+    with open(project.root / "cfg/headers.json", "r") as f:
+        headers = json.load(f)
 
-if __name__ == "__main__":
-    ticker = sys.argv[1]
-    urls = switch.main(ticker)
+    for ticker in tickers:
+        metrics.reset(ticker)
+        crawl_frontier = frontier.SqliteFrontier.from_project(project, ticker, num_shards=num_shards)
+        crawl_frontier.clear()
+        # shard outputs of the last run would be merged into this one's
+        num_files = sink.clear_shards(project, ticker)
+        if num_files:
+            print(f"`{ticker}`: Deleted {num_files} shard files of the last run")
+        seen = canon.SeenIndex()
+        num_urls = crawl_frontier.add(seen.filter(metrics.timed("sitemap", switch.main(ticker, headers, project))))
+        seen.report(ticker)
+        print(f"`{ticker}`: Seeded {num_urls} urls over {num_shards} shards")
+        crawl_frontier.report(ticker)
+        crawl_frontier.close()
+
+    return None
+
+
+def crawl_shard(project, headers, ticker, lease, urls, http_cache=None, rate_limiter=None, retry_policy=None,
+                crawl_frontier=None, processes=None):
+    """Crawls the urls of one frontier shard into `downloads/<ticker>_shard_<n>.csv`.
+
+    Urls that still fail after the retry queue is drained are written next to it, to
+    `downloads/<ticker>_shard_<n>_failed_urls.json`. Rows go to a partial file named after the
+    lease, and when `crawl_frontier` is given the output is only promoted while the lease is
+    still held; a worker whose lease ran out throws its rows away and leaves the shard to the
+    worker that claimed it next. Pages of http tickers are parsed in `processes` worker processes.
+    """
+    writer = sink.RecordWriter.for_shard(project, ticker, lease.shard, Record.columns, token=lease.token)
+    retry_queue = retry.RetryQueue(retry_policy)
+    if ticker in switch.http_tickers:
+        pool = sessions.SessionPool(headers, size=16, cache=http_cache, rate_limiter=rate_limiter, retry_policy=retry_policy)
+
+        def add_record(url, record):
+            writer.write(record)
+            pool.count_record()
+            metrics.count("records")
+
+            return None
+
+        label = f"{ticker} shard {lease.shard}"
+        crawl.run(label, urls, headers, switch.module(ticker).parse_branch_record, add_record, pool, retry_queue,
+                  processes=processes)
+        pool.report(label)
+        pool.close()
+    else:
+        factory = functools.partial(pnc.build_spider, project, headers, rate_limiter=rate_limiter)
+        failed = pnc.crawl_cities(factory, urls, lambda city_url, city_records: writer.write_many(city_records),
+                                  retry_policy=retry_policy)
+        for city_url, reason in failed.items():
+            retry_queue.add(city_url, reason)
+    if crawl_frontier is not None:
+        try:
+            crawl_frontier.check(lease)
+        except frontier.LeaseLost:
+            writer.discard()
+            print(f"`{ticker} shard {lease.shard}`: ALERT: Lost the lease, discarded {writer.rows} records")
+            return None
+    writer.close()
+    retry_queue.report(f"{ticker} shard {lease.shard}")
+    retry_queue.write(project.root / f"downloads/{ticker}_shard_{lease.shard:03d}_failed_urls.json")
 
-    with mp.Pool(os.cpu_count()) as pool:
-        pool.starmap(pipeline, zip([ticker for i in range(len(urls))], urls))
+    return None
+
+
+def work(tickers, worker=None):
+    """Claims and crawls shards of every ticker's frontier until none are left."""
+    project = path_helper.ProjectPath.from_src(__file__)
+    with open(project.root / "cfg/headers.json", "r") as f:
+        headers = json.load(f)
+
+    for ticker in tickers:
+        metrics.reset(ticker)
+        crawl_frontier = frontier.SqliteFrontier.from_project(project, ticker)
+        http_cache = cache.HttpCache.from_project(project)
+        # pacing and circuit breakers carry over from shard to shard within this worker
+        rate_limiter = ratelimit.RateLimiter(rate=2.0, max_rate=8.0) if ticker == "pnc" else ratelimit.RateLimiter()
+        retry_policy = retry.RetryPolicy()
+        task = functools.partial(crawl_shard, project, headers, ticker, http_cache=http_cache,
+                                 rate_limiter=rate_limiter, retry_policy=retry_policy, crawl_frontier=crawl_frontier,
+                                 processes=os.cpu_count())
+        crawl_frontier.work(task, worker=worker)
+        crawl_frontier.report(ticker)
+        crawl_frontier.close()
+        rate_limiter.report(ticker)
+        retry_policy.report(ticker)
+        http_cache.report(ticker)
+        metrics.current.report()
+
+    return None
+
+
+def merge(tickers):
+    """Joins the done shards of every ticker into `downloads/<ticker>.csv`, skipping tickers with shards still to crawl."""
+    project = path_helper.ProjectPath.from_src(__file__)
+    for ticker in tickers:
+        crawl_frontier = frontier.SqliteFrontier.from_project(project, ticker)
+        progress = crawl_frontier.progress()
+        shards = crawl_frontier.shards("done")
+        crawl_frontier.close()
+        if progress.get("pending") or progress.get("leased"):
+            print(f"ALERT: `{ticker}`: Not merging, shards by status {progress}. Run `worker {ticker}` until all are done")
+            continue
+        sink.merge_shards(project, ticker, Record.columns, shards)
+
+    return None
+
+
+if __name__ == "__main__":
+    args = [arg.lower() for arg in sys.argv[1:]]
+    metrics.configure_logging(args)
+    # every other word goes to the tickers' own `main`
+    tickers = [arg for arg in args if arg in switch.http_tickers or arg == "pnc"]
+    if "seed" in args:
+        num_shards = [int(arg) for arg in args if arg.isdigit()]
+        seed(tickers or list(switch.http_tickers), num_shards=num_shards[0] if num_shards else 16)
+    elif "worker" in args:
+        work(tickers or list(switch.http_tickers))
+    elif "merge" in args:
+        merge(tickers or list(switch.http_tickers))
+    else:
+        main(tickers or list(switch.http_tickers), args=args)
@@ -1,10 +0,0 @@
-def pipeline_test():
-    import main
-
-    main.pipeline(ticker="url", url="https://locator.chase.com./az/grand-canyon/1-mather-business-center")
-
-    return None
-
-
-if __name__ == "__main__":
-    pipeline_test()
@@ -0,0 +1,190 @@
+"""Run metrics and levelled logging shared by every ticker.
+
+Per-url progress goes to `logging` at DEBUG level instead of `print`, so a normal run only pays
+for the lines it shows. Time spent in each stage (sitemap, fetch, parse, transform, write),
+bytes downloaded, status codes, errors and other counters are collected in one `Metrics`
+object per run, summarized at the end and written to `downloads/<ticker>_metrics.json`.
+Pass `verbose` to any entrypoint to see the per-url lines again, or `quiet` for warnings only.
+"""
+
+# standard library
+import collections
+import contextlib
+import json
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+stages = ["sitemap", "fetch", "parse", "transform", "write"]
+
+
+class Metrics(object):
+    """Thread-safe stage timers and counters for one run.
+
+    Stage seconds are summed across threads, so concurrent stages can add up to more than the
+    wall-clock time of the run.
+
+    Args:
+        label: str name of the run, usually the ticker
+    """
+
+    def __init__(self, label="run"):
+        self.label = label
+        self.started = time.perf_counter()
+        self.stage_seconds = collections.defaultdict(float)
+        self.stage_calls = collections.Counter()
+        self.status_codes = collections.Counter()
+        self.errors = collections.Counter()
+        self.counters = collections.Counter()
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds, calls=1):
+        with self._lock:
+            self.stage_seconds[name] += seconds
+            self.stage_calls[name] += calls
+
+        return None
+
+    def timed(self, name, iterable):
+        """Yields from `iterable`, timing every step under stage `name` (e.g. a streaming sitemap)."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count_response(self, status_code, num_bytes=0):
+        with self._lock:
+            self.status_codes[status_code] += 1
+            self.bytes += num_bytes
+
+        return None
+
+    def count_error(self, kind, n=1):
+        with self._lock:
+            self.errors[kind] += n
+
+        return None
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+        return None
+
+    def merge(self, summary):
+        """Adds the `stages` and `counters` of another run's `summary`, e.g. from a worker process."""
+        for name, stage in summary["stages"].items():
+            self.add_time(name, stage["seconds"], calls=stage["calls"])
+        for name, n in summary["counters"].items():
+            self.count(name, n)
+
+        return None
+
+    def summary(self):
+        with self._lock:
+            names = [name for name in stages if name in self.stage_calls]
+            names.extend(sorted(name for name in self.stage_calls if name not in stages))
+            return {
+                "label": self.label,
+                "elapsed": round(time.perf_counter() - self.started, 3),
+                "stages": {
+                    name: {"seconds": round(self.stage_seconds[name], 3), "calls": self.stage_calls[name]}
+                    for name in names
+                },
+                "bytes": self.bytes,
+                "status_codes": {str(code): n for code, n in sorted(self.status_codes.items(), key=str)},
+                "errors": dict(self.errors),
+                "counters": dict(self.counters),
+            }
+
+    def report(self):
+        summary = self.summary()
+        logger.info(
+            "`%s`: finished in %.2fs, %d bytes downloaded, status codes %s, errors %s",
+            self.label, summary["elapsed"], summary["bytes"], summary["status_codes"], summary["errors"] or "none"
+        )
+        for name, stage in summary["stages"].items():
+            logger.info("`%s`: %-9s %9.2fs over %d calls", self.label, name, stage["seconds"], stage["calls"])
+        for name, n in summary["counters"].items():
+            logger.info("`%s`: %s: %d", self.label, name, n)
+
+        return None
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+        return None
+
+
+# the metrics of the run in progress, swapped out by `reset` at the start of each ticker
+current = Metrics()
+
+
+def reset(label):
+    global current
+    current = Metrics(label)
+
+    return current
+
+
+def stage(name):
+    return current.stage(name)
+
+
+def add_time(name, seconds, calls=1):
+    return current.add_time(name, seconds, calls=calls)
+
+
+def timed(name, iterable):
+    return current.timed(name, iterable)
+
+
+def count_response(status_code, num_bytes=0):
+    return current.count_response(status_code, num_bytes)
+
+
+def count_error(kind, n=1):
+    return current.count_error(kind, n)
+
+
+def count(name, n=1):
+    return current.count(name, n)
+
+
+def finish(project, ticker):
+    """Logs the summary of the current run and writes it to `downloads/<ticker>_metrics.json`."""
+    current.report()
+    path = project.root / f"downloads/{ticker}_metrics.json"
+    current.write(path)
+    logger.info("`%s`: Wrote metrics to `%s`", ticker, path)
+
+    return None
+
+
+def configure_logging(args=()):
+    """Sets the log level from the command line words: `verbose` for DEBUG, `quiet` for WARNING."""
+    level = logging.INFO
+    if "verbose" in args:
+        level = logging.DEBUG
+    elif "quiet" in args:
+        level = logging.WARNING
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    return None
@@ -0,0 +1,71 @@
+import json
+import pathlib
+import tempfile
+
+
+def metrics_test():
+    import metrics
+
+    run = metrics.Metrics("jpm")
+    with run.stage("parse"):
+        pass
+    assert list(run.timed("sitemap", ["a", "b"])) == ["a", "b"]
+    run.count_response(200, 100)
+    run.count_response(404, 10)
+    run.count_error("ConnectionError")
+    run.count("records", 2)
+    worker = metrics.Metrics("jpm")
+    worker.add_time("parse", 1.5, calls=3)
+    worker.count("records")
+    run.merge(worker.summary())
+
+    summary = run.summary()
+    assert list(summary["stages"]) == ["sitemap", "parse"]
+    # one step per item plus the final StopIteration
+    assert summary["stages"]["sitemap"]["calls"] == 3
+    assert summary["stages"]["parse"]["calls"] == 4 and summary["stages"]["parse"]["seconds"] >= 1.5
+    assert summary["bytes"] == 110 and summary["status_codes"] == {"200": 1, "404": 1}
+    assert summary["errors"] == {"ConnectionError": 1} and summary["counters"] == {"records": 3}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = pathlib.Path(tmp_dir) / "jpm_metrics.json"
+        run.write(path)
+        with open(path, "r") as f:
+            assert json.load(f)["counters"] == {"records": 3}
+
+    return None
+
+
+def pipeline_metrics_test():
+    import crawl
+    import crawl_test
+    import fetch_test
+    import jpm
+    import metrics
+    import retry
+    import sessions
+
+    run = metrics.reset("jpm")
+    server = fetch_test.serve(crawl_test.BranchHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base_url}/az/grand-canyon/{i}-mather-business-center" for i in range(6)]
+    pool = sessions.SessionPool({}, size=4, prime=False)
+    try:
+        crawl.run("jpm", urls, {}, jpm.parse_branch_record, lambda url, record: metrics.count("records"), pool,
+                  retry.RetryQueue(), processes=2)
+    finally:
+        server.shutdown()
+        pool.close()
+
+    summary = run.summary()
+    assert summary["status_codes"] == {"200": 6}
+    assert summary["bytes"] >= 6 * len(crawl_test.JPM_BRANCH_HTML)
+    assert summary["counters"]["records"] == 6
+    # parse and transform ran in the worker processes and were merged back
+    assert summary["stages"]["parse"]["calls"] >= 6 and summary["stages"]["transform"]["calls"] == 6
+
+    return None
+
+
+if __name__ == "__main__":
+    metrics_test()
+    pipeline_metrics_test()
@@ -0,0 +1,141 @@
+"""Runs every ticker at once under one request and cpu budget.
+
+Each ticker crawls in its own process, so its metrics, logging and per-host limits (rate
+limiter, retry policy, the fetcher's `per_host` cap) stay its own. The global budget is split
+up front. PNC gets `browsers` Firefox instances, shared between its state and city crawls,
+which are its share of both the concurrent requests and the cpus. The http tickers share the
+remaining request slots through one semaphore, so a fast ticker picks up the slots a finished
+one left, and split the remaining cpus between their parse pools. PNC is started first, so the
+slow browser crawl overlaps with the http tickers instead of running after them. Run summaries
+go to `downloads/orchestrator.json`.
+Usage: `python src/orchestrator.py [ticker[:option,...] ...] [max_requests] [recover] [parquet] [verbose|quiet]`,
+e.g. `python src/orchestrator.py pnc:lean,direct jpm rfc wfc 48` passes `lean` and `direct` to pnc only.
+"""
+
+# standard library
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+import time
+# local modules
+import main
+import metrics
+import path_helper
+import pnc
+import switch
+
+
+all_tickers = ["pnc", "jpm", "rfc", "wfc"]
+# words passed to every ticker
+shared_flags = ("recover", "parquet", "verbose", "quiet")
+
+
+def parse_args(args):
+    """Splits the command line words into tickers, the options of each ticker, shared flags and `max_requests`.
+
+    Raises:
+        ValueError: on a word that is neither a flag, a number nor a known ticker
+    """
+    parsed = {"tickers": [], "options": {}, "flags": [], "max_requests": None}
+    for arg in args:
+        if arg in shared_flags:
+            parsed["flags"].append(arg)
+        elif arg.isdigit():
+            parsed["max_requests"] = int(arg)
+        else:
+            ticker, _, options = arg.partition(":")
+            switch.module(ticker)
+            parsed["tickers"].append(ticker)
+            parsed["options"][ticker] = [option for option in options.split(",") if option]
+
+    return parsed
+
+
+def plan(tickers, max_requests=32, cpus=None, browsers=4):
+    """Splits the request and cpu budget between `tickers`.
+
+    Returns:
+        dict with the pnc `browsers`, the `request_slots` the http tickers share and the
+        parse `workers` of each http ticker
+    """
+    cpus = cpus or os.cpu_count() or 1
+    http = [ticker for ticker in tickers if ticker in switch.http_tickers]
+    num_browsers = 0
+    if "pnc" in tickers:
+        # leave the http tickers a cpu each where there are enough, and at least one shared request slot
+        num_browsers = min(max(min(browsers, cpus - len(http)), 1), max_requests - (1 if http else 0))
+        if num_browsers < 1:
+            raise ValueError(f"A budget of {max_requests} requests cannot run pnc alongside {http}")
+    elif http and max_requests < 1:
+        raise ValueError(f"A budget of {max_requests} requests cannot run {http}")
+
+    # browsers and request slots together never go over `max_requests`
+    return {
+        "browsers": num_browsers,
+        "request_slots": max_requests - num_browsers if http else 0,
+        "workers": max((cpus - num_browsers) // len(http), 1) if http else 0,
+    }
+
+
+def run_ticker(ticker, args, request_slots=None, workers=None, browsers=None):
+    """Process entrypoint of one ticker's crawl."""
+    metrics.configure_logging(args)
+    if ticker == "pnc":
+        pnc.main(args=args, num_browsers=browsers)
+    else:
+        main.main([ticker], args=args, request_slots=request_slots, processes=workers)
+
+    return None
+
+
+def run(tickers, max_requests=32, cpus=None, browsers=4, args=(), options=None, target=run_ticker):
+    """Crawls every ticker concurrently, each in its own process, and returns a summary per ticker.
+
+    Args:
+        args: list of str words passed to every ticker
+        options: optional dict of ticker -> list of str words passed to that ticker only
+    """
+    options = options or {}
+    budget = plan(tickers, max_requests=max_requests, cpus=cpus, browsers=browsers)
+    print(f"`orchestrator`: Budget {budget} for {tickers}")
+    request_slots = multiprocessing.BoundedSemaphore(budget["request_slots"]) if budget["request_slots"] else None
+
+    processes = {}
+    started = {}
+    # the browser crawl is the long pole, get it going before the http tickers
+    for ticker in sorted(tickers, key=lambda ticker: ticker != "pnc"):
+        if ticker == "pnc":
+            kwargs = {"browsers": budget["browsers"]}
+        else:
+            kwargs = {"request_slots": request_slots, "workers": budget["workers"]}
+        ticker_args = list(args) + options.get(ticker, [])
+        process = multiprocessing.Process(target=target, args=(ticker, ticker_args), kwargs=kwargs, name=ticker)
+        process.start()
+        processes[process.sentinel] = (ticker, process)
+        started[ticker] = time.perf_counter()
+
+    results = {}
+    while processes:
+        for sentinel in multiprocessing.connection.wait(list(processes)):
+            ticker, process = processes.pop(sentinel)
+            process.join()
+            elapsed = time.perf_counter() - started[ticker]
+            results[ticker] = {"exitcode": process.exitcode, "seconds": round(elapsed, 3)}
+            status = "finished" if process.exitcode == 0 else f"FAILED with exit code {process.exitcode}"
+            print(f"`{ticker}`: {status} after {elapsed:.2f}s")
+
+    return {"budget": budget, "tickers": results}
+
+
+if __name__ == "__main__":
+    args = [arg.lower() for arg in sys.argv[1:]]
+    metrics.configure_logging(args)
+    parsed = parse_args(args)
+    summary = run(parsed["tickers"] or all_tickers, max_requests=parsed["max_requests"] or 32, args=parsed["flags"],
+                  options=parsed["options"])
+    project = path_helper.ProjectPath.from_src(__file__)
+    with open(project.root / "downloads/orchestrator.json", "w") as f:
+        json.dump(summary, f, indent=2)
+    sys.exit(0 if all(result["exitcode"] == 0 for result in summary["tickers"].values()) else 1)
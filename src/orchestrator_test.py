@@ -0,0 +1,157 @@
+import http.server
+import json
+import pathlib
+import tempfile
+import threading
+import time
+
+
+class SlowHandler(http.server.BaseHTTPRequestHandler):
+    """Holds every request for a moment and records how many were in flight at once."""
+
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.peak = max(cls.peak, cls.in_flight)
+        time.sleep(0.05)
+        with cls.lock:
+            cls.in_flight -= 1
+        body = b"<html></html>"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def fake_ticker(ticker, args, request_slots=None, workers=None, browsers=None):
+    # stands in for a crawl: pnc is slow, the http tickers each take one request slot for a while
+    started = time.time()
+    if ticker == "pnc":
+        time.sleep(0.6)
+    else:
+        with request_slots:
+            time.sleep(0.2)
+    with open(args[0], "a") as f:
+        f.write(json.dumps({"ticker": ticker, "started": started, "finished": time.time(),
+                            "workers": workers, "browsers": browsers, "args": args[1:]}) + "\n")
+    if ticker == "wfc":
+        raise SystemExit(3)
+
+    return None
+
+
+def plan_test():
+    import orchestrator
+
+    assert orchestrator.plan(["pnc", "jpm", "rfc", "wfc"], max_requests=32, cpus=16, browsers=4) == {
+        "browsers": 4, "request_slots": 28, "workers": 4
+    }
+    assert orchestrator.plan(["jpm", "rfc"], max_requests=32, cpus=8) == {"browsers": 0, "request_slots": 32, "workers": 4}
+    # a small box still leaves every http ticker a cpu
+    assert orchestrator.plan(["pnc", "jpm", "rfc", "wfc"], max_requests=32, cpus=4, browsers=4) == {
+        "browsers": 1, "request_slots": 31, "workers": 1
+    }
+    assert orchestrator.plan(["pnc"], cpus=8)["request_slots"] == 0
+    # browsers and request slots never add up to more than the budget
+    for max_requests in range(2, 10):
+        budget = orchestrator.plan(["pnc", "jpm", "rfc", "wfc"], max_requests=max_requests, cpus=16, browsers=4)
+        assert budget["browsers"] >= 1 and budget["request_slots"] >= 1
+        assert budget["browsers"] + budget["request_slots"] == max_requests
+    try:
+        orchestrator.plan(["pnc", "jpm"], max_requests=1, cpus=16)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a budget of one request was split between pnc and jpm")
+
+    return None
+
+
+def parse_args_test():
+    import orchestrator
+
+    assert orchestrator.parse_args(["pnc:lean,direct", "jpm", "48", "recover", "quiet"]) == {
+        "tickers": ["pnc", "jpm"], "options": {"pnc": ["lean", "direct"], "jpm": []}, "flags": ["recover", "quiet"],
+        "max_requests": 48,
+    }
+    # a pnc option on its own is not taken for a ticker
+    try:
+        orchestrator.parse_args(["pnc", "lean"])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("`lean` was taken for a ticker")
+
+    return None
+
+
+def run_test():
+    import orchestrator
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_path = pathlib.Path(tmp_dir) / "runs.jsonl"
+        summary = orchestrator.run(["jpm", "pnc", "rfc", "wfc"], max_requests=6, cpus=8, browsers=2,
+                                   args=[str(log_path)], options={"pnc": ["lean"]}, target=fake_ticker)
+        with open(log_path, "r") as f:
+            runs = {run["ticker"]: run for run in map(json.loads, f)}
+
+    assert summary["budget"] == {"browsers": 2, "request_slots": 4, "workers": 2}
+    assert {ticker: result["exitcode"] for ticker, result in summary["tickers"].items()} == {
+        "pnc": 0, "jpm": 0, "rfc": 0, "wfc": 3
+    }
+    assert runs["pnc"]["browsers"] == 2 and runs["jpm"]["workers"] == 2
+    assert runs["pnc"]["args"] == ["lean"] and runs["jpm"]["args"] == []
+    # the http tickers ran while pnc was still crawling, not after it
+    assert all(runs[ticker]["finished"] < runs["pnc"]["finished"] for ticker in ("jpm", "rfc", "wfc"))
+
+    return None
+
+
+def request_slots_test():
+    import fetch
+    import fetch_test
+    import sessions
+
+    server = fetch_test.serve(SlowHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    # two tickers with eight workers each, sharing three slots
+    request_slots = threading.BoundedSemaphore(3)
+    fetchers = [
+        fetch.AsyncFetcher({}, max_concurrency=8, per_host=8,
+                           pool=sessions.SessionPool({}, size=8, prime=False, request_slots=request_slots))
+        for _ in range(2)
+    ]
+    pages = []
+    try:
+        threads = [
+            threading.Thread(target=lambda fetcher=fetcher: pages.extend(
+                fetcher.fetch_all(f"{base_url}/branch/{i}" for i in range(12))
+            ))
+            for fetcher in fetchers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.shutdown()
+
+    assert len(pages) == 24 and all(page.ok for page in pages)
+    assert SlowHandler.peak <= 3
+
+    return None
+
+
+if __name__ == "__main__":
+    plan_test()
+    parse_args_test()
+    run_test()
+    request_slots_test()
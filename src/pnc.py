@@ -4,263 +4,449 @@ Author: Adam Turner <turner.adch@gmail.com>
 """
 
 # standard library
-import copy
 import datetime
+import functools
 import json
-import random
+import logging
+import queue
 import re
 import sys
-import time
+import threading
 # python package index
 import lxml.html
-import pandas as pd
-from selenium.common.exceptions import TimeoutException
 # local modules
+import canon
+import columnar
+import extractors
+import journal
+import metrics
 import path_helper
+import ratelimit
+from record import Record
+import retry
+import sink
 import spiders
 
 
-class Record(object):
+logger = logging.getLogger(__name__)
 
-    week = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
-    columns = ["name", "type", "addr"]
-    columns.extend(week)
-    columns.append("tmp_closed")
 
-    def __init__(self):
-        self.data = dict.fromkeys(Record.columns)
-
-    @property
-    def tuple_fmt(self):
-        return tuple(self.data[col] for col in self.data)
-
-
-def extract_branch_record(bot):
-    print("Waiting until branch URL anchor is visible...")
-    bot.wait_until_visible("(//service-hour)[1]")
-    print("Getting record from branch URL:", bot.driver.current_url)
-    branch_html = lxml.html.fromstring(bot.driver.page_source)
-    time_data = branch_html.xpath("(//service-hour)[1]//*[@class='ng-scope']//text()")
+def transform_time_fields(time_data, today=None):
     clean_times = [time for time in time_data if time.strip()]
-    assert len(clean_times) == 7  # 7 days in a week
+    if len(clean_times) != 7:  # 7 days in a week
+        logger.warning("Expected 7 days of hours, leaving hours blank: %s", clean_times)
+        metrics.count("unparseable_hours")
+        return None
     # pnc rotates these time fields such that the top day is always the current day
     # so we need to figure out what day it is, then clean up accordingly
     # Example: today = 'Tuesday' => clean_times = [tue, wed, thu, fri, sat, sun, mon]
-    record = Record()
-    match_key = ""
-    today = datetime.datetime.now().strftime("%A")  # Expect: 'Friday'
-    for i, day in enumerate(record.week):
-        match = re.search(pattern=f"(?i)^{day}", string=today)
-        if match:
-            shift_key = i
-            break
-    if not shift_key:
-        raise ValueError("No match key!")
-    else:
-        mon_index = 7 - shift_key
-        shifted_times = clean_times[mon_index:]
-        shifted_times.extend(clean_times[:mon_index])
+    today = today or datetime.date.today()
+    mon_index = (7 - today.weekday()) % 7
+    shifted_times = clean_times[mon_index:] + clean_times[:mon_index]
+
+    return dict(zip(Record.week, shifted_times))
 
-    for day, time in zip(record.week, shifted_times):
-        record.data[day] = time
-    
-    branch_name = branch_html.xpath("//h1[@class='bold ng-binding']//text()")
-    if branch_name:
-        record.data["name"] = branch_name[0]
 
+# evaluated in the browser with one script (spiders.SeleniumSpider.extract) instead of via page_source
+spec = extractors.Spec({
+    "hours": ("(//service-hour)[1]//*[@class='ng-scope']//text()", transform_time_fields),
+    "name": ("//h1[@class='bold ng-binding']//text()", extractors.first),
     # no `branch type` data for pnc
+    "addr": ("//*[@itemprop='address']//text()", extractors.joined(" ", min_len=1, strip=False)),
+})
+
+
+def transform_branch_record(values):
+    """Builds a record tuple from the `spec.selectors` values of a branch page."""
+    record = spec.transform(values, Record())
+
+    logger.debug("Record: %s", record.row)
 
-    branch_addr = branch_html.xpath("//*[@itemprop='address']//text()")
-    if branch_addr:
-        clean_addr = [val for val in branch_addr if len(val.strip()) > 1]
-        record.data["addr"] = " ".join(clean_addr)
+    return record.row
 
-    print("Record:", record.tuple_fmt)
 
-    return record.tuple_fmt
+def extract_branch_record(bot):
+    logger.debug("Waiting until branch URL anchor is visible...")
+    bot.wait_until_visible("(//service-hour)[1]")
+    logger.debug("Getting record from branch URL: %s", bot.driver.current_url)
+
+    return transform_branch_record(bot.extract(spec.selectors))
 
 
-def get_city_records(bot, city_url):
-    print(f"`{city_url}`: Navigating...")
-    bot.driver.get(city_url)
+def get_branch_links(hrefs, num_branches):
+    """Returns the direct urls behind the first `num_branches` branch links.
+
+    Returns None when the links only route through angular click handlers (`javascript:` hrefs).
+    """
+    hrefs = hrefs[:num_branches]
+    if len(hrefs) == num_branches and all(href and href.startswith("http") for href in hrefs):
+        return hrefs
+
+    return None
+
+
+def get_city_records(bot, city_url, direct=False, routes=None):
+    """Extracts every branch record in a city.
+
+    Args:
+        bot: spiders.SeleniumSpider
+        city_url: str pnc city-level url
+        direct: bool navigate straight to each branch url instead of clicking the branch and
+            going back to the city page, which re-renders the whole angular app every time
+        routes: optional dict of city url -> branch urls, learned from earlier click-through
+            visits and used by `direct` when the page links carry no usable href
+    """
+    logger.debug("`%s`: Navigating...", city_url)
+    bot.navigate(city_url)
     anchor_xpath = "//*[@data-ng-bind='browseBranchCtrl.locationCount']"  # branch location counter
     bot.wait_until_visible(anchor_xpath)
 
-    city_html_doc = lxml.html.fromstring(bot.driver.page_source)
-    num_branches = int(city_html_doc.xpath(anchor_xpath + "//text()")[0])
-    # now that we have the number of cities, we know how to slice the following array to dedup
     branch_xpath = "//a[@class='ng-binding']"
+    city_fields = bot.extract({"count": anchor_xpath + "//text()", "links": branch_xpath + "/@href"})
+    num_branches = int(city_fields["count"][0])
+    # now that we have the number of cities, we know how to slice the following array to dedup
+
+    if direct:
+        branch_urls = (routes or {}).get(city_url)
+        if branch_urls is None or len(branch_urls) != num_branches:
+            branch_urls = get_branch_links(city_fields["links"], num_branches)
+        if branch_urls is not None:
+            logger.debug("Found %d branches in this city! Visiting them directly...", num_branches)
+            city_records = []
+            for branch_url in branch_urls:
+                bot.navigate(branch_url)
+                city_records.append(extract_branch_record(bot))
+            return city_records
+
     branch_matches = bot.driver.find_elements_by_xpath(branch_xpath)
     branch_elements = branch_matches[:num_branches]
 
-    try:
-        assert len(branch_elements) == num_branches
-    except AssertionError:
-        print("ASSERTION ERROR: Branch elements length mismatch!")
-        breakpoint()
-        print("UNKNOWN BELOW")
+    if len(branch_elements) != num_branches:
+        logger.warning("`%s`: Expected %d branches, found %d! Crawling the ones found...",
+                       city_url, num_branches, len(branch_elements))
+        metrics.count("branch_count_mismatch")
+        num_branches = len(branch_elements)
 
-    print(f"Found {num_branches} branches in this city!")
+    logger.debug("Found %d branches in this city!", num_branches)
 
     city_records = []
+    branch_urls = []
     for i in range(num_branches):
         branch_num = i + 1
-        print(f"Constructing branch record {branch_num}/{num_branches}...")
+        logger.debug("Constructing branch record %d/%d...", branch_num, num_branches)
         branch_num_xpath = f"({branch_xpath})[{branch_num}]"
-        print(f"Current city URL: {bot.driver.current_url}")
-        print("Executing click script...")
+        logger.debug("Current city URL: %s", bot.driver.current_url)
+        logger.debug("Executing click script...")
         bot.execute_click_script(branch_num_xpath)
         city_records.append(extract_branch_record(bot))
+        branch_urls.append(bot.driver.current_url)
         # go back to the last city url page with all of the branches listed
-        print("Going back...")
-        bot.driver.back()
+        logger.debug("Going back...")
+        bot.back()
         continue
 
+    if routes is not None:
+        # remember where each click landed so the next run can go straight there
+        routes[city_url] = branch_urls
+
     return city_records
 
 
-def build_sitemap(project, bot):
+state_data_xpath = "//*[@data-ng-bind='obj.stateName']"
+city_data_xpath = "//*[@class='states cities']//*[@class='ng-binding']"
+# city link text is of the form: 'Bayou La Batre (1)'
+city_regex = re.compile(r"^(.*)\s\(")
+
+
+def parse_browse_states(html_text):
+    """Returns the sorted, deduplicated state names listed on a `browse` page snapshot."""
+    browse_html_doc = lxml.html.fromstring(html_text)
+
+    return sorted(set(browse_html_doc.xpath(state_data_xpath + "//text()")))  # dedup? why pnc...
+
+
+def get_browse_states(project, bot=None, snapshot=None):
+    """Returns the state names from the live `browse` page, or from a saved copy of it.
+
+    Args:
+        project: path_helper.ProjectPath
+        bot: spiders.SeleniumSpider used when no snapshot is given
+        snapshot: optional pathlib.Path of a saved `browse` page, e.g. `fixtures/pnc/browse.html`
+    """
+    if snapshot is not None:
+        print(f"Extracting state data from `{snapshot}` snapshot...")
+        with open(snapshot, "rb") as f:
+            return parse_browse_states(f.read())
+
     print("Requesting PNC locator app `browse` page...")
+    bot.navigate(get_browse_url(project))
+    print("Extracting state data from `browse` page...")
+    bot.wait_until_clickable(state_data_xpath)
+
+    return sorted(set(bot.extract({"states": state_data_xpath + "//text()"})["states"]))
+
+
+def get_browse_url(project):
     with open(project.root / "cfg/sitemaps.json") as f:
         sitemaps = json.load(f)
 
-    print("Extracting state data from `browse` page...")
-    browse_url = sitemaps["pnc"]
-    bot.driver.get(browse_url)
-    state_data_xpath = "//*[@data-ng-bind='obj.stateName']"
-    bot.wait_until_clickable(state_data_xpath)
-    browse_html_doc = lxml.html.fromstring(bot.driver.page_source)
-    print("Constructing state-level URLs...")
-    branch_states = set(browse_html_doc.xpath(state_data_xpath + "//text()"))  # dedup? why pnc...
-    branch_state_urls = [browse_url + "/" + state.lower().replace(" ", "-") for state in branch_states]
+    return sitemaps["pnc"]
 
-    print("Collecting city-level URLs for each state...")
-    city_urls = []
-    for state_url in branch_state_urls:
-        print(f"`{state_url}`: Requesting state-level URL...")
-        # from here, we want to isolate all of the cities in each state
-        # this data is of the form: 'Bayou La Batre (1)'
-        # the state name is all text outside of \(\) and the number of branches is contained inside.
-        bot.driver.get(state_url)
-
-        print(f"`{state_url}`: Extracting city name data...")
-        city_data_xpath = "//*[@class='states cities']//*[@class='ng-binding']"
-        bot.wait_until_clickable(city_data_xpath)
-        state_html_doc = lxml.html.fromstring(bot.driver.page_source)
-        city_names = state_html_doc.xpath(city_data_xpath + "//text()")
-        city_regex = re.compile(r"^(.*)\s\(")
-        clean_names = [city_regex.match(city).group(1).lower().replace(" ", "-").replace("\'", "") for city in city_names]
-
-        print(f"`{state_url}`: Extending city-level URLs...")
-        city_urls.extend([state_url + "/" + city for city in clean_names])
-        continue
 
-    pnc_city_urls = {"urls": city_urls}
-    with open(project.root / "downloads/pnc_city_urls.json", "w") as f:
-        json.dump(pnc_city_urls, f)
+def get_state_city_urls(bot, state_url):
+    """Returns the city-level urls listed on a state page."""
+    logger.debug("`%s`: Requesting state-level URL...", state_url)
+    # from here, we want to isolate all of the cities in each state
+    # the city name is all text outside of \(\) and the number of branches is contained inside.
+    bot.navigate(state_url)
 
-    return city_urls
+    logger.debug("`%s`: Extracting city name data...", state_url)
+    bot.wait_until_clickable(city_data_xpath)
+    city_names = bot.extract({"cities": city_data_xpath + "//text()"})["cities"]
+    clean_names = [city_regex.match(city).group(1).lower().replace(" ", "-").replace("\'", "") for city in city_names]
 
+    return [state_url + "/" + city for city in clean_names]
 
-def get_city_urls(bot, project, recover=False):
-    if recover:
-        json_path = "downloads/pnc_city_urls_recover.json"
+
+def build_sitemap(project, states, pool, browser_slots=None):
+    """Crawls the state pages in parallel and yields each city url as soon as it is found.
+
+    The complete list is saved to `downloads/pnc_city_urls.json` once every state page has been
+    read, so a partial sitemap is never cached for later runs.
+
+    Args:
+        project: path_helper.ProjectPath
+        states: iterable of str state names from the `browse` page
+        pool: spiders.SpiderPool that visits the state pages
+        browser_slots: optional threading.Semaphore shared with the city crawl, `pool.size` slots
+            are taken for the state browsers until every state page is done
+    """
+    browse_url = get_browse_url(project)
+    print("Collecting city-level URLs for each state...")
+    state_urls = [browse_url + "/" + state.lower().replace(" ", "-") for state in states]
+    found = queue.Queue()
+    if browser_slots is not None:
+        # taken before the first city url goes out, so the city browsers only get what is left
+        for _ in range(pool.size):
+            browser_slots.acquire()
+
+    def crawl():
+        try:
+            pool.run(state_urls, get_state_city_urls, lambda state_url, city_urls: found.put(city_urls))
+        finally:
+            if browser_slots is not None:
+                for _ in range(pool.size):
+                    browser_slots.release()
+            found.put(None)
+
+        return None
+
+    crawler = threading.Thread(target=crawl, daemon=True)
+    crawler.start()
+    city_urls = []
+    # cities repeat across state pages, each canonical city url is queued once
+    seen = canon.SeenIndex()
+    while True:
+        state_city_urls = found.get()
+        if state_city_urls is None:
+            break
+        for city_url in seen.filter(state_city_urls):
+            city_urls.append(city_url)
+            yield city_url
+    crawler.join()
+    pool.report("pnc sitemap")
+    seen.report("pnc sitemap")
+    seen.close()
+
+    if pool.failed:
+        print(f"ALERT: {len(pool.failed)} state pages failed, not saving the city sitemap: {pool.failed}")
     else:
-        json_path = "downloads/pnc_city_urls.json"
+        with open(project.root / "downloads/pnc_city_urls.json", "w") as f:
+            json.dump({"urls": sorted(city_urls)}, f)
+
 
+def get_city_urls(project, factory, num_browsers=2, snapshot=None, retry_policy=None, browser_slots=None):
+    """Returns the saved city urls, or a generator that discovers them while the crawl runs.
+
+    Args:
+        project: path_helper.ProjectPath
+        factory: callable returning a new spiders.SeleniumSpider
+        num_browsers: int number of browsers crawling state pages when there is no saved sitemap
+        snapshot: optional pathlib.Path of a saved `browse` page to seed the states from
+        retry_policy: optional retry.RetryPolicy the state crawl retries timeouts with
+        browser_slots: optional threading.Semaphore the state browsers take their share of, see `build_sitemap`
+    """
     try:
-        with open(project.root / json_path, "r") as f:
+        with open(project.root / "downloads/pnc_city_urls.json", "r") as f:
             pnc_city_urls = json.load(f)
     except FileNotFoundError:
-        city_urls = build_sitemap(project, bot)
+        pass
     else:
-        city_urls = pnc_city_urls["urls"]
+        # sorted, so every run crawls the cities in the same order
+        seen = canon.SeenIndex()
+        city_urls = sorted(seen.filter(pnc_city_urls["urls"]))
+        seen.report("pnc sitemap")
+        seen.close()
+        return city_urls
+
+    if snapshot is None:
+        bot = factory()
+        try:
+            states = get_browse_states(project, bot=bot)
+        finally:
+            bot.driver.quit()
+    else:
+        states = get_browse_states(project, snapshot=snapshot)
 
-    return set(city_urls)
+    pool = spiders.SpiderPool(factory, size=num_browsers, retry_policy=retry_policy)
 
+    return build_sitemap(project, states, pool, browser_slots=browser_slots)
 
-def load(records, project):
-    df = pd.DataFrame.from_records(records)
-    df.columns = Record.columns
-    csv_name = "pnc.csv"
-    csv_path = str(project.root / f"downloads/{csv_name}")
-    df.to_csv(csv_path)
-    print(f"Exporting to `{csv_path}`")
+
+def get_branch_routes(project):
+    """Returns the city url -> branch urls map learned by earlier runs."""
     try:
-        df.to_csv(csv_path)
+        with open(project.root / "downloads/pnc_branch_urls.json", "r") as f:
+            return json.load(f)
     except FileNotFoundError:
-        print(f"WARNING: DUMPING CSV TO LOCAL PATH: `{csv_name}`!")
-        df.to_csv(csv_name)
-        raise FileNotFoundError(f"Could not export to `{csv_path}`. Did you forget to run `setup.sh`?")
+        return {}
 
-    return None
 
+def crawl_cities(factory, city_urls, on_city, num_browsers=4, retry_policy=None, direct=False, routes=None,
+                 browser_slots=None):
+    """Crawls the branches of every city with a pool of spiders, then retries the cities that failed.
 
-def main():
-    for arg in sys.argv:
-        if arg.lower() == "recover":
-            print("Starting in recovery mode...")
-            recover = True
-        else:
-            recover = False
+    Args:
+        factory: callable returning a new spiders.SeleniumSpider
+        city_urls: iterable of str city urls, consumed lazily
+        on_city: callable (city_url, city_records) called as each city finishes, serialized
+        num_browsers: int number of browsers
+        retry_policy: optional retry.RetryPolicy
+        direct: bool, see `get_city_records`
+        routes: optional dict, see `get_city_records`
+        browser_slots: optional threading.Semaphore shared with the state crawl, see `spiders.SpiderPool`
 
-    project = path_helper.ProjectPath.from_src(__file__)
-    with open(project.root / "cfg/headers.json", "r") as f:
-        headers = json.load(f)
+    Returns:
+        dict of str city urls that still failed after the retry queue was drained, to the reason they last failed
+    """
+    city_task = functools.partial(get_city_records, direct=direct, routes=routes)
+    pool = spiders.SpiderPool(factory, size=num_browsers, retry_policy=retry_policy, browser_slots=browser_slots)
+    # cities that failed are crawled again once every other city is done
+    retry_queue = retry.RetryQueue(retry_policy)
 
-    bot = spiders.SeleniumSpider.construct(
+    def run(urls):
+        pool.run(urls, city_task, on_city)
+        for city_url, reason in pool.failed.items():
+            retry_queue.add(city_url, reason)
+        pool.failed.clear()
+
+        return None
+
+    run(city_urls)
+    retry_queue.drain(run)
+    pool.report("pnc")
+
+    return retry_queue.reasons
+
+
+def load(records, project):
+    with sink.RecordWriter.for_ticker(project, "pnc", Record.columns) as writer:
+        writer.write_many(records)
+
+    return None
+
+
+def build_spider(project, headers, lean=False, rate_limiter=None):
+    blocked_hosts = []
+    if lean:
+        with open(project.root / "cfg/blocked_hosts.json", "r") as f:
+            blocked_hosts = json.load(f)["hosts"]
+
+    return spiders.SeleniumSpider.construct(
         user_agent=headers["user-agent"],
         gecko_path=str(project.root / "geckodriver-v0.29.0-linux64/geckodriver"),
-        headless=True
+        headless=True,
+        lean=lean,
+        blocked_hosts=blocked_hosts,
+        rate_limiter=rate_limiter
     )
 
-    city_urls = get_city_urls(bot, project, recover=recover)
 
-    records = []
-    for city_url in city_urls:
-        try:
-            city_records = get_city_records(bot, city_url)
-        except TimeoutException:
-            print("SERVER TIMEOUT: Exiting browsing context...")
-            bot.driver.quit()
-            random_sleep = random.randint(10, 15)
-            print(f"Sleeping for {random_sleep} seconds...")
-            time.sleep(random_sleep)
-            print("Constructing a new bot...")
-            bot = spiders.SeleniumSpider.construct(
-                user_agent=headers["user-agent"],
-                gecko_path=str(project.root / "geckodriver-v0.29.0-linux64/geckodriver"),
-                headless=True
-            )
-            print("Trying again...")
-            city_records = get_city_records(bot, city_url)
-
-        if recover:
-            print("Recovery: Exporting city records to CSV...")
-            if city_records:  # sometimes the sitemap is old and a city has no branches
-                df = pd.DataFrame.from_records(city_records)
-                df.columns = Record.columns
-                csv_dirname = "downloads/pnc"
-                csv_dir = project.root / csv_dirname
-                csv_path = f"{csv_dirname}/{city_url.split('/')[-1]}_records.csv"
-                try:
-                    csv_dir.mkdir(parents=True)
-                except FileExistsError:
-                    pass
-                df.to_csv(project.root / csv_path, sep=",", header=False, index=False)
-
-            print("Recovery: Removing city url from recovery JSON...")
-            buffer = copy.deepcopy(city_urls)
-            buffer.remove(city_url)
-            city_urls_recover = {"urls": [x for x in buffer]}
-            del buffer
-            with open(project.root / "downloads/pnc_city_urls_recover.json", "w") as f:
-                json.dump(city_urls_recover, f)
-
-        records.extend(city_records)
-
-
-    load(records, project)
+def main(args=None, num_browsers=4):
+    args = [arg.lower() for arg in (sys.argv[1:] if args is None else args)]
+    recover = "recover" in args
+    # `lean` skips images, media, fonts and analytics hosts and returns from navigation at DOMContentLoaded
+    lean = "lean" in args
+    # `direct` visits branch urls straight from the city page instead of click-then-back per branch
+    direct = "direct" in args
+    metrics.configure_logging(args)
+    metrics.reset("pnc")
+
+    project = path_helper.ProjectPath.from_src(__file__)
+    with open(project.root / "cfg/headers.json", "r") as f:
+        headers = json.load(f)
+
+    # `snapshot` seeds the states from the saved `fixtures/pnc/browse.html` instead of loading the live page
+    snapshot = project.root / "fixtures/pnc/browse.html" if "snapshot" in args else None
+
+    # every spider navigation waits on one shared adaptive rate per host, cut whenever a page load times out
+    rate_limiter = ratelimit.RateLimiter(rate=2.0, max_rate=8.0)
+    factory = functools.partial(build_spider, project, headers, lean=lean, rate_limiter=rate_limiter)
+    # a timed out page is retried with jittered backoff, and repeated timeouts pause the host for every spider
+    retry_policy = retry.RetryPolicy(base=5.0, cap=60.0, threshold=8, reset_timeout=60.0)
+    # without a saved sitemap, city urls stream in from the state crawl while branches are crawled. Both
+    # crawls share `num_browsers` browsers: the state pages take half until they are done, the cities the rest
+    browser_slots = threading.Semaphore(num_browsers)
+    city_urls = metrics.timed("sitemap", get_city_urls(
+        project, factory, num_browsers=max(num_browsers // 2, 1), snapshot=snapshot, retry_policy=retry_policy,
+        browser_slots=browser_slots
+    ))
+
+    # every finished city is appended to the journal, a recovery run replays it and skips those cities
+    checkpoint = journal.Journal.from_project(project, "pnc")
+    if recover:
+        print("Starting in recovery mode...")
+        done = checkpoint.replay()
+    else:
+        checkpoint.reset()
+        done = {}
+
+    writer = sink.RecordWriter.for_ticker(project, "pnc", Record.columns)
+    if "parquet" in args:
+        writer = sink.Tee(writer, columnar.ColumnarWriter.for_ticker(project, "pnc", Record.columns))
+    for city_records in done.values():
+        writer.write_many(city_records)
+
+    def on_city(city_url, city_records):
+        checkpoint.append(city_url, city_records)
+        writer.write_many(city_records)
+        metrics.count("records", len(city_records))
+        metrics.count("cities")
+
+        return None
+
+    routes = get_branch_routes(project) if direct else None
+    failed = crawl_cities(
+        factory, (city_url for city_url in city_urls if city_url not in done), on_city,
+        num_browsers=num_browsers, retry_policy=retry_policy, direct=direct, routes=routes,
+        browser_slots=browser_slots
+    )
+    rate_limiter.report("pnc")
+    retry_policy.report("pnc")
+    if routes is not None:
+        with open(project.root / "downloads/pnc_branch_urls.json", "w") as f:
+            json.dump(routes, f)
+    if failed:
+        metrics.count_error("failed_cities", len(failed))
+        print(f"ALERT: {len(failed)} cities failed, run again with `recover` to retry them: {list(failed)}")
+    with open(project.root / "downloads/pnc_failed_urls.json", "w") as f:
+        json.dump(failed, f, indent=2)
+
+    checkpoint.close()
+    writer.close()
+    if not failed:
+        checkpoint.compact()
+    metrics.finish(project, "pnc")
 
     return None
 
@@ -1,8 +1,5 @@
-# standard library
-import os
-# python package index
-import pandas as pd
 # local modules
+import journal
 import path_helper
 import pnc
 
@@ -10,22 +7,17 @@ import pnc
 
 def main():
     project = path_helper.ProjectPath.from_src(__file__)
-    recovery_dir = project.root / "downloads/pnc"
-    fnames = [name for name in os.listdir(recovery_dir) if os.path.isfile(str(recovery_dir / name))]
+    checkpoint = journal.Journal.from_project(project, "pnc")
 
-    print("Building DataFrames...")
-    frames = []
-    for fname in fnames:
-        csv_path = str(recovery_dir / fname)
-        frames.append(pd.read_csv(csv_path, sep=",", names=pnc.Record.columns))
+    print("Replaying PNC checkpoint journal...")
+    done = checkpoint.replay()
+    records = [record for city_records in done.values() for record in city_records]
 
-    df = pd.concat(frames)
-    export_path = project.root / "downloads/pnc.csv"
     print("Exporting final PNC CSV...")
-    df.to_csv(export_path)
+    pnc.load(records, project)
 
     return None
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,146 @@
+import json
+import pathlib
+import tempfile
+import threading
+import time
+
+
+class FakeSitemapSpider(object):
+    """Stands in for a SeleniumSpider on pnc state pages, listing two cities per state."""
+
+    def __init__(self):
+        self.driver = self
+        self.url = None
+
+    def navigate(self, url):
+        self.url = url
+
+    def wait_until_clickable(self, xpath):
+        return None
+
+    def extract(self, fields):
+        return {"cities": ["Bayou La Batre (1)", "Coeur d'Alene (2)"]}
+
+    def quit(self):
+        return None
+
+
+class CountingSpider(FakeSitemapSpider):
+    """Counts how many spiders have a browser open at once."""
+
+    lock = threading.Lock()
+    open = 0
+    peak = 0
+
+    def __init__(self):
+        super().__init__()
+        cls = CountingSpider
+        with cls.lock:
+            cls.open += 1
+            cls.peak = max(cls.peak, cls.open)
+
+    def extract(self, fields):
+        time.sleep(0.02)
+        return super().extract(fields)
+
+    def quit(self):
+        with CountingSpider.lock:
+            CountingSpider.open -= 1
+
+
+def parse_browse_states_test():
+    import pnc
+
+    with open(pathlib.Path(__file__).parent.parent / "fixtures/pnc/browse.html", "rb") as f:
+        states = pnc.parse_browse_states(f.read())
+
+    assert "Alabama" in states and "District of Columbia" in states
+    assert states == sorted(set(states))
+
+    return None
+
+
+def transform_time_fields_test():
+    import datetime
+    import pnc
+
+    # the branch page lists the current day first
+    week = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+    for offset, today in enumerate([datetime.date(2021, 3, 8 + i) for i in range(7)]):
+        time_data = week[offset:] + week[:offset]
+        assert pnc.transform_time_fields(time_data, today=today) == dict(zip(week, week))
+    # a page with a day missing leaves the hours blank instead of stopping the crawl
+    assert pnc.transform_time_fields(week[:6]) is None
+
+    return None
+
+
+def build_sitemap_test():
+    import path_helper
+    import pnc
+    import spiders
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        project = path_helper.ProjectPath(pathlib.Path(tmp_dir))
+        (project.root / "cfg").mkdir()
+        (project.root / "downloads").mkdir()
+        with open(project.root / "cfg/sitemaps.json", "w") as f:
+            json.dump({"pnc": "https://apps.pnc.com/locator/browse"}, f)
+
+        pool = spiders.SpiderPool(FakeSitemapSpider, size=2)
+        city_urls = pnc.build_sitemap(project, ["Alabama", "District of Columbia"], pool)
+        first = next(city_urls)
+        # the sitemap is only saved once every state page is done
+        assert not (project.root / "downloads/pnc_city_urls.json").exists()
+        rest = list(city_urls)
+
+        assert first.startswith("https://apps.pnc.com/locator/browse/")
+        assert sorted([first] + rest) == [
+            "https://apps.pnc.com/locator/browse/alabama/bayou-la-batre",
+            "https://apps.pnc.com/locator/browse/alabama/coeur-dalene",
+            "https://apps.pnc.com/locator/browse/district-of-columbia/bayou-la-batre",
+            "https://apps.pnc.com/locator/browse/district-of-columbia/coeur-dalene",
+        ]
+        saved = pnc.get_city_urls(project, FakeSitemapSpider)
+        assert saved == sorted([first] + rest)
+
+    return None
+
+
+def shared_browsers_test():
+    import path_helper
+    import pnc
+    import spiders
+
+    states = [f"State {i}" for i in range(12)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        project = path_helper.ProjectPath(pathlib.Path(tmp_dir))
+        (project.root / "cfg").mkdir()
+        (project.root / "downloads").mkdir()
+        with open(project.root / "cfg/sitemaps.json", "w") as f:
+            json.dump({"pnc": "https://apps.pnc.com/locator/browse"}, f)
+
+        # the way `main` wires it: two state browsers and four city browsers on one allowance of four
+        browser_slots = threading.Semaphore(4)
+        state_pool = spiders.SpiderPool(CountingSpider, size=2)
+        city_urls = pnc.build_sitemap(project, states, state_pool, browser_slots=browser_slots)
+        city_pool = spiders.SpiderPool(CountingSpider, size=4, browser_slots=browser_slots)
+        crawled = []
+
+        def city_task(bot, city_url):
+            time.sleep(0.02)
+            return city_url
+
+        city_pool.run(city_urls, city_task, lambda city_url, result: crawled.append(result))
+
+    assert len(crawled) == 24
+    assert CountingSpider.peak <= 4 and CountingSpider.open == 0
+
+    return None
+
+
+if __name__ == "__main__":
+    parse_browse_states_test()
+    transform_time_fields_test()
+    build_sitemap_test()
+    shared_browsers_test()
@@ -0,0 +1,159 @@
+"""Adaptive per-host rate limiting.
+
+Every host gets a token bucket whose rate follows AIMD (additive increase, multiplicative
+decrease): each healthy response raises the rate a little, and each 429, 503 or timeout cuts it
+by a factor and drains the bucket. A crawl therefore speeds up until the bank starts pushing
+back, then settles just under that limit instead of getting blocked. A `Retry-After` header
+pauses the host for as long as it asks.
+"""
+
+# standard library
+import datetime
+import email.utils
+import threading
+import time
+import urllib.parse
+
+
+throttle_statuses = (429, 503)
+
+
+class TokenBucket(object):
+    """Token bucket for one host whose refill rate adapts with AIMD.
+
+    Args:
+        rate: float starting requests per second
+        min_rate: float floor the rate is never cut below
+        max_rate: float ceiling the rate never grows past
+        increase: float requests per second added after each healthy response
+        decrease: float factor the rate is multiplied by when the host pushes back
+        cooldown: float seconds after a cut during which further pushback does not cut again, so
+            a burst of 429s from requests already in flight counts as one signal
+        burst: float most tokens the bucket holds, i.e. requests allowed back to back
+        clock: callable returning monotonic seconds, swappable in tests
+        sleep: callable sleeping for a number of seconds, swappable in tests
+    """
+
+    def __init__(self, rate=4.0, min_rate=0.25, max_rate=32.0, increase=0.1, decrease=0.5, cooldown=1.0, burst=4.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = min(burst, 1.0)
+        self.throttles = 0
+        self.waited = 0.0
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._last_cut = None
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+        return None
+
+    def acquire(self):
+        """Blocks until the host may be sent another request."""
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._refill(now)
+                if now >= self._paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return None
+                wait = max(self._paused_until - now, (1 - self.tokens) / self.rate)
+                self.waited += wait
+            self.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+        return None
+
+    def on_throttle(self, retry_after=None):
+        with self._lock:
+            now = self.clock()
+            self.throttles += 1
+            if self._last_cut is None or now - self._last_cut >= self.cooldown:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._last_cut = now
+            self.tokens = 0.0
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+        return None
+
+
+class RateLimiter(object):
+    """Hands out one adaptive `TokenBucket` per host.
+
+    Keyword arguments are passed to every new bucket, see `TokenBucket`.
+    """
+
+    def __init__(self, **bucket_kwargs):
+        self.bucket_kwargs = bucket_kwargs
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(**self.bucket_kwargs)
+
+            return self.buckets[host]
+
+    def acquire(self, url):
+        self.bucket(url).acquire()
+
+        return None
+
+    def record(self, url, status_code=None, timed_out=False, retry_after=None):
+        """Feeds the outcome of a request to `url` back into its host's rate.
+
+        Args:
+            url: str url that was requested
+            status_code: optional int http status of the response
+            timed_out: bool the request or page load timed out, or the connection was refused or reset
+            retry_after: optional `Retry-After` header value, seconds or an http date
+        """
+        bucket = self.bucket(url)
+        if timed_out or status_code in throttle_statuses:
+            bucket.on_throttle(retry_after=parse_retry_after(retry_after))
+        elif status_code is not None and status_code < 500:
+            bucket.on_success()
+
+        return None
+
+    def report(self, label="ratelimit"):
+        for host, bucket in sorted(self.buckets.items()):
+            print(
+                f"`{label}`: `{host}` settled at {bucket.rate:.2f} requests/sec after {bucket.throttles} throttles, "
+                f"{bucket.waited:.2f}s spent waiting"
+            )
+
+        return None
+
+
+def parse_retry_after(value):
+    """Returns the seconds a `Retry-After` header (delay seconds or an http date) asks to wait, or None."""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max((retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0.0)
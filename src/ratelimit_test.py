@@ -0,0 +1,114 @@
+import collections
+import http.server
+import threading
+import time
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class ThrottlingHandler(http.server.BaseHTTPRequestHandler):
+    """Answers 429 once more than `limit` requests arrived within the last second."""
+
+    lock = threading.Lock()
+    limit = 10
+    accepted = collections.deque()
+    statuses = []
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            now = time.monotonic()
+            while cls.accepted and now - cls.accepted[0] > 1.0:
+                cls.accepted.popleft()
+            status = 200 if len(cls.accepted) < cls.limit else 429
+            if status == 200:
+                cls.accepted.append(now)
+            cls.statuses.append(status)
+        body = b"<html></html>"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def token_bucket_test():
+    import ratelimit
+
+    clock = FakeClock()
+    bucket = ratelimit.TokenBucket(rate=2.0, min_rate=0.5, increase=0.5, burst=1.0, clock=clock, sleep=clock.sleep)
+    start = clock.now
+    for _ in range(5):
+        bucket.acquire()
+    # one token up front, then one every half second
+    assert abs(clock.now - start - 2.0) < 1e-9
+
+    bucket.on_success()
+    assert bucket.rate == 2.5
+    bucket.on_throttle()
+    bucket.on_throttle()
+    # requests already in flight push back too, only the first cut counts within the cooldown
+    assert bucket.rate == 1.25 and bucket.throttles == 2
+    clock.sleep(1.0)
+    bucket.on_throttle(retry_after=30)
+    assert bucket.rate == 0.625
+    start = clock.now
+    bucket.acquire()
+    assert clock.now - start >= 30
+
+    return None
+
+
+def parse_retry_after_test():
+    import ratelimit
+
+    assert ratelimit.parse_retry_after("120") == 120.0
+    assert ratelimit.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert ratelimit.parse_retry_after("soon") is None and ratelimit.parse_retry_after(None) is None
+
+    return None
+
+
+def throttling_server_test():
+    import fetch
+    import fetch_test
+    import ratelimit
+    import sessions
+
+    ThrottlingHandler.statuses = []
+    server = fetch_test.serve(ThrottlingHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    rate_limiter = ratelimit.RateLimiter(rate=40.0, min_rate=1.0, increase=0.2, cooldown=0.5, burst=2.0)
+    pool = sessions.SessionPool({}, size=8, prime=False, rate_limiter=rate_limiter)
+    fetcher = fetch.AsyncFetcher({}, max_concurrency=8, per_host=8, pool=pool)
+    try:
+        pages = fetcher.fetch_all(f"{base_url}/branch/{i}" for i in range(30))
+    finally:
+        server.shutdown()
+
+    bucket = rate_limiter.bucket(base_url)
+    statuses = [page.status_code for page in pages]
+    assert bucket.throttles >= 1 and bucket.rate < 20.0
+    # once the rate has come down the server stops pushing back
+    assert 429 in ThrottlingHandler.statuses[:20] and ThrottlingHandler.statuses[-10:].count(429) <= 2
+    assert len(pages) == 30 and statuses.count(200) >= 18
+
+    return None
+
+
+if __name__ == "__main__":
+    token_bucket_test()
+    parse_retry_after_test()
+    throttling_server_test()
@@ -0,0 +1,82 @@
+"""Branch record types shared by every ticker.
+
+`Record` holds one branch in fixed `__slots__` instead of a per-instance dict, and its `row`
+is the tuple the writers take. `RecordBuffer` collects many rows column by column, interning
+the heavily repeated hours strings, and hands the columns to pandas or arrow without building
+a tuple per record first.
+"""
+
+# standard library
+import operator
+import sys
+# python package index
+import pandas as pd
+
+
+class Record(object):
+
+    week = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+    columns = ["name", "type", "addr"]
+    columns.extend(week)
+    columns.append("tmp_closed")
+
+    __slots__ = tuple(columns)
+    _row = operator.attrgetter(*columns)
+
+    def __init__(self):
+        for col in Record.columns:
+            setattr(self, col, None)
+
+    def update(self, values):
+        for col, value in values.items():
+            setattr(self, col, value)
+
+        return None
+
+    @property
+    def row(self):
+        """The record as a tuple in `columns` order."""
+        return Record._row(self)
+
+
+class RecordBuffer(object):
+    """Column-oriented store of record rows.
+
+    Args:
+        columns: list of str column names, `Record.columns` by default
+    """
+
+    def __init__(self, columns=Record.columns):
+        self.columns = columns
+        self.data = {col: [] for col in columns}
+        self._lists = [(self.data[col], col in Record.week) for col in columns]
+
+    def __len__(self):
+        return len(self.data[self.columns[0]])
+
+    def append(self, row):
+        if len(row) != len(self.columns):
+            raise ValueError(f"Expected {len(self.columns)} fields, got {len(row)}: `{row}`")
+        for (values, interned), value in zip(self._lists, row):
+            # a few hundred distinct hours strings cover every branch, share one copy of each
+            values.append(sys.intern(value) if interned and value is not None else value)
+
+        return None
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+        return None
+
+    def rows(self):
+        return zip(*(self.data[col] for col in self.columns))
+
+    def clear(self):
+        for values in self.data.values():
+            values.clear()
+
+        return None
+
+    def to_frame(self):
+        return pd.DataFrame(self.data, columns=self.columns)
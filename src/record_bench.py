@@ -0,0 +1,89 @@
+"""Memory benchmark of the record types.
+
+Holds `n` synthetic branches as the old per-module dict-backed `Record` objects, as slotted
+`record.Record` objects and in a `record.RecordBuffer`, and prints the peak traced memory of
+each. Usage: `python src/record_bench.py [n]`.
+"""
+
+# standard library
+import sys
+import tracemalloc
+# local modules
+import record
+
+
+class DictRecord(object):
+    """The `Record` every ticker module used to define, kept here as the baseline."""
+
+    week = record.Record.week
+    columns = record.Record.columns
+
+    def __init__(self):
+        self.data = dict.fromkeys(DictRecord.columns)
+
+    @property
+    def pd_fmt(self):
+        return tuple(self.data[col] for col in self.data)
+
+
+def fake_values(i):
+    # hours come out of the html parser as fresh strings on every page, never shared
+    hours = ["".join(["9 am-", str(5 + i % 2), " pm"]) for _ in record.Record.week]
+    hours[-1] = "".join(["clo", "sed"])
+
+    return {"name": f"Branch {i}", "type": None, "addr": f"{i} Main St, Akron, OH, 44301", "tmp_closed": 0,
+            **dict(zip(record.Record.week, hours))}
+
+
+def build_dict_records(n):
+    records = []
+    for i in range(n):
+        branch = DictRecord()
+        branch.data.update(fake_values(i))
+        records.append(branch)
+
+    return records
+
+
+def build_records(n):
+    records = []
+    for i in range(n):
+        branch = record.Record()
+        branch.update(fake_values(i))
+        records.append(branch)
+
+    return records
+
+
+def build_buffer(n):
+    buffer = record.RecordBuffer()
+    for i in range(n):
+        branch = record.Record()
+        branch.update(fake_values(i))
+        buffer.append(branch.row)
+
+    return buffer
+
+
+def measure(build, n):
+    """Returns the peak traced memory in bytes while `build(n)` runs and its result is alive."""
+    tracemalloc.start()
+    result = build(n)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return peak
+
+
+def main(n=100000):
+    results = {}
+    for label, build in (("dict", build_dict_records), ("slots", build_records), ("buffer", build_buffer)):
+        results[label] = measure(build, n)
+        print(f"`{label}`: {n} records, peak {results[label] / 2 ** 20:.1f} MiB ({results[label] / n:.0f} bytes/record)")
+
+    return results
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
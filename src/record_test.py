@@ -0,0 +1,41 @@
+def record_test():
+    import record
+
+    branch = record.Record()
+    branch.update({"name": "Mather", "mon": "9 am-5 pm"})
+    branch.tmp_closed = 0
+
+    assert branch.row == ("Mather", None, None, "9 am-5 pm") + (None,) * 6 + (0,)
+    assert not hasattr(branch, "__dict__")
+    try:
+        branch.hours = "9 am-5 pm"
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("Expected unknown columns to be rejected")
+
+    return None
+
+
+def record_buffer_test():
+    import record
+
+    buffer = record.RecordBuffer()
+    rows = [(f"Branch {i}", None, "1 Main St") + ("".join(["9 am-", "5 pm"]),) * 7 + (0,) for i in range(3)]
+    buffer.extend(rows)
+
+    assert len(buffer) == 3
+    assert list(buffer.rows()) == rows
+    # equal hours strings from different pages share one object
+    assert buffer.data["mon"][0] is buffer.data["tue"][2]
+    df = buffer.to_frame()
+    assert list(df.columns) == record.Record.columns and df["name"][2] == "Branch 2"
+    buffer.clear()
+    assert len(buffer) == 0
+
+    return None
+
+
+if __name__ == "__main__":
+    record_test()
+    record_buffer_test()
@@ -0,0 +1,308 @@
+"""Retries with jittered exponential backoff, a retry budget and per-host circuit breakers.
+
+A `RetryPolicy` tries a failed request again (connection errors, timeouts and 408/429/5xx
+responses) after a full-jitter exponential backoff. Retries are capped by a budget, a fraction of
+all requests issued, so an outage cannot multiply the load on a bank. Each host has a
+`CircuitBreaker`: after `threshold` failures in a row every request to that host fails fast
+with `CircuitOpenError` until `reset_timeout` passes, while requests to other hosts carry on.
+Urls that still fail are kept in a `RetryQueue` that the tickers drain once the crawl is over.
+"""
+
+# standard library
+import json
+import logging
+import random
+import threading
+import time
+import urllib.parse
+# python package index
+import requests
+# local modules
+import metrics
+
+
+logger = logging.getLogger(__name__)
+
+retry_statuses = (408, 429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of sending a request to a host whose circuit is open."""
+
+
+def retryable(status_code=None, error=None):
+    """Returns True when a request that ended with `status_code` or raised `error` is worth trying again."""
+    if error is not None:
+        response = getattr(error, "response", None)
+        if response is not None:
+            return response.status_code in retry_statuses
+
+        return isinstance(error, (requests.ConnectionError, requests.Timeout, CircuitOpenError))
+
+    return status_code in retry_statuses
+
+
+class CircuitBreaker(object):
+    """Counts consecutive failures of one host and opens its circuit after `threshold` of them.
+
+    While open, `before` raises `CircuitOpenError`. Once `reset_timeout` has passed a single
+    request is let through as a probe and the circuit is held open for another period; a success
+    closes it, a failure keeps it open.
+
+    Args:
+        threshold: int failures in a row that open the circuit
+        reset_timeout: float seconds the circuit stays open before a probe is let through
+        clock: callable returning monotonic seconds, swappable in tests
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def remaining(self):
+        """Seconds until the circuit lets a request through, 0 when it would now."""
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+
+            return max(self.opened_at + self.reset_timeout - self.clock(), 0.0)
+
+    def before(self, url):
+        with self._lock:
+            if self.opened_at is None:
+                return None
+            now = self.clock()
+            if now - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(
+                    f"`{url}`: Circuit open for another {self.opened_at + self.reset_timeout - now:.1f}s"
+                )
+            # half open, this request probes the host while the rest wait out another period
+            self.opened_at = now
+
+        return None
+
+    def on_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+        return None
+
+    def on_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold and self.opened_at is None:
+                self.opened_at = self.clock()
+                self.trips += 1
+                logger.warning("Circuit opened after %d failures in a row", self.failures)
+
+        return None
+
+
+class RetryPolicy(object):
+    """Retries failed requests with backoff, within a budget, behind one `CircuitBreaker` per host.
+
+    Args:
+        attempts: int most tries per request, the first one included
+        base: float seconds the backoff window starts at, doubling with every retry
+        cap: float largest backoff window in seconds
+        budget: float retries allowed per request issued, on top of `min_retries`
+        min_retries: int retries always allowed, so a crawl that fails early still retries
+        threshold: int failures in a row that open a host's circuit
+        reset_timeout: float seconds an open circuit waits before probing its host again
+        clock: callable returning monotonic seconds, swappable in tests
+        sleep: callable sleeping for a number of seconds, swappable in tests
+        jitter: callable (low, high) -> float picking the backoff inside its window
+    """
+
+    def __init__(self, attempts=3, base=0.5, cap=30.0, budget=0.1, min_retries=10, threshold=5, reset_timeout=30.0,
+                 clock=time.monotonic, sleep=time.sleep, jitter=random.uniform):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+        self.budget = budget
+        self.min_retries = min_retries
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.sleep = sleep
+        self.jitter = jitter
+        self.requests = 0
+        self.retries = 0
+        self.denied = 0
+        self.breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(self.threshold, self.reset_timeout, clock=self.clock)
+
+            return self.breakers[host]
+
+    def backoff(self, attempt):
+        """Seconds to wait before retry number `attempt + 1`, drawn from the full jitter window."""
+        return self.jitter(0, min(self.cap, self.base * 2 ** attempt))
+
+    def allow_retry(self):
+        """Spends one retry from the budget, returns False once it is used up."""
+        with self._lock:
+            if self.retries >= self.min_retries + self.budget * self.requests:
+                self.denied += 1
+                return False
+            self.retries += 1
+        metrics.count("retries")
+
+        return True
+
+    def before(self, url, block=False):
+        """Counts a request to `url`, raising `CircuitOpenError` if its host's circuit is open.
+
+        With `block` the caller waits for the circuit instead, for workers that have nothing else to do.
+        """
+        breaker = self.breaker(url)
+        while True:
+            try:
+                breaker.before(url)
+                break
+            except CircuitOpenError:
+                if not block:
+                    raise
+                self.sleep(min(max(breaker.remaining(), 0.1), 1.0))
+        with self._lock:
+            self.requests += 1
+
+        return None
+
+    def wait(self, url):
+        """Sleeps until the circuit of `url`'s host would let a request through."""
+        breaker = self.breaker(url)
+        while breaker.remaining() > 0:
+            self.sleep(breaker.remaining())
+
+        return None
+
+    def call(self, url, request):
+        """Calls `request()` for `url` until it succeeds, fails for good or runs out of attempts or budget.
+
+        Returns the last response, even one with a retryable status, and raises the last error.
+        """
+        attempt = 0
+        while True:
+            self.before(url)
+            try:
+                response = request()
+            except requests.RequestException as e:
+                if not retryable(error=e):
+                    raise
+                self.breaker(url).on_failure()
+                if attempt + 1 >= self.attempts or not self.allow_retry():
+                    raise
+                reason = type(e).__name__
+            else:
+                if not retryable(response.status_code):
+                    self.breaker(url).on_success()
+                    return response
+                self.breaker(url).on_failure()
+                if attempt + 1 >= self.attempts or not self.allow_retry():
+                    return response
+                reason = response.status_code
+                response.close()
+            delay = self.backoff(attempt)
+            logger.debug("`%s`: Request failed (%s), retrying in %.2fs...", url, reason, delay)
+            self.sleep(delay)
+            attempt += 1
+
+    def report(self, label="retry"):
+        trips = sum(breaker.trips for breaker in self.breakers.values())
+        print(
+            f"`{label}`: {self.retries} retries over {self.requests} requests "
+            f"({self.denied} denied by the budget), circuits opened {trips} times"
+        )
+
+        return None
+
+
+class RetryQueue(object):
+    """Urls that failed during the crawl, kept to be tried again once it is over.
+
+    Args:
+        policy: optional RetryPolicy whose circuits are waited on before each round
+    """
+
+    def __init__(self, policy=None):
+        self.policy = policy
+        self.reasons = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.reasons)
+
+    @property
+    def urls(self):
+        with self._lock:
+            return list(self.reasons)
+
+    def add(self, url, reason):
+        with self._lock:
+            self.reasons[url] = str(reason)
+
+        return None
+
+    def failed(self, url, status_code=None, error=None):
+        """Queues `url` if its failure is worth retrying and returns True, otherwise logs that it was skipped."""
+        reason = status_code or error
+        if not retryable(status_code, error):
+            logger.warning("`%s`: Request failed (%s)! Skipping record...", url, reason)
+            return False
+        logger.info("`%s`: Request failed (%s), queued for a retry", url, reason)
+        self.add(url, reason)
+
+        return True
+
+    def drain(self, run, rounds=2):
+        """Hands the queued urls to `run(urls)` up to `rounds` times.
+
+        `run` puts whatever fails again back on the queue, through `add` or `failed`. Before each
+        round the drain waits until every queued host's circuit lets requests through again.
+
+        Returns:
+            list of str urls that were still failing after the last round
+        """
+        for i in range(rounds):
+            with self._lock:
+                urls = list(self.reasons)
+                self.reasons.clear()
+            if not urls:
+                break
+            print(f"`retry`: Round {i + 1}: trying {len(urls)} failed urls again...")
+            if self.policy is not None:
+                for url in {urllib.parse.urlsplit(url).netloc: url for url in urls}.values():
+                    self.policy.wait(url)
+            run(urls)
+
+        return self.urls
+
+    def report(self, label="retry"):
+        if self.reasons:
+            metrics.count_error("failed_urls", len(self.reasons))
+            print(f"ALERT: `{label}`: {len(self.reasons)} urls still failed after retrying: {self.urls}")
+
+        return None
+
+    def write(self, path):
+        with self._lock:
+            with open(path, "w") as f:
+                json.dump(self.reasons, f, indent=2)
+
+        return None
@@ -0,0 +1,173 @@
+import http.server
+import threading
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FlakyHandler(http.server.BaseHTTPRequestHandler):
+    """Answers 503 to the first two requests for every path, then 200; `/down` always fails."""
+
+    lock = threading.Lock()
+    hits = {}
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.hits[self.path] = cls.hits.get(self.path, 0) + 1
+            hits = cls.hits[self.path]
+        status = 200 if hits > 2 and self.path != "/down" else 503
+        body = b"<html></html>"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def backoff_test():
+    import retry
+
+    policy = retry.RetryPolicy(base=0.5, cap=3.0, jitter=lambda low, high: high)
+    assert [policy.backoff(attempt) for attempt in range(5)] == [0.5, 1.0, 2.0, 3.0, 3.0]
+
+    policy = retry.RetryPolicy(min_retries=1, budget=0.5)
+    assert policy.allow_retry() and not policy.allow_retry()
+    for _ in range(4):
+        policy.before("https://locator.chase.com/az")
+    # four requests earn two more retries
+    assert policy.allow_retry() and policy.allow_retry() and not policy.allow_retry()
+    assert policy.retries == 3 and policy.denied == 2
+
+    assert retry.retryable(503) and retry.retryable(429) and not retry.retryable(404)
+
+    return None
+
+
+def circuit_breaker_test():
+    import retry
+
+    clock = FakeClock()
+    breaker = retry.CircuitBreaker(threshold=3, reset_timeout=30.0, clock=clock)
+    for _ in range(3):
+        breaker.before("https://locator.chase.com/az")
+        breaker.on_failure()
+    assert breaker.is_open and breaker.trips == 1 and breaker.remaining() == 30.0
+    try:
+        breaker.before("https://locator.chase.com/az")
+    except retry.CircuitOpenError:
+        pass
+    else:
+        raise AssertionError("an open circuit let a request through")
+
+    clock.sleep(30.0)
+    # one probe goes through, everything else waits another period
+    breaker.before("https://locator.chase.com/az")
+    assert breaker.remaining() == 30.0
+    breaker.on_success()
+    assert not breaker.is_open and breaker.remaining() == 0.0
+
+    return None
+
+
+def session_pool_retry_test():
+    import fetch_test
+    import retry
+    import sessions
+
+    FlakyHandler.hits = {}
+    server = fetch_test.serve(FlakyHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    sleeps = []
+    policy = retry.RetryPolicy(attempts=3, threshold=3, sleep=sleeps.append)
+    pool = sessions.SessionPool({}, size=2, prime=False, retry_policy=policy)
+    queue = retry.RetryQueue()
+    try:
+        # two 503s then a 200, within three attempts
+        assert pool.get(f"{base_url}/az/1").status_code == 200
+        # three 503s in a row open the circuit and the next request fails fast
+        assert pool.get(f"{base_url}/down").status_code == 503
+        try:
+            pool.get(f"{base_url}/az/2")
+        except retry.CircuitOpenError as e:
+            assert queue.failed(f"{base_url}/az/2", error=e)
+        else:
+            raise AssertionError("an open circuit let a request through")
+    finally:
+        pool.close()
+        server.shutdown()
+
+    assert FlakyHandler.hits == {"/az/1": 3, "/down": 3}
+    assert len(sleeps) == 4 and policy.retries == 4
+    assert not queue.failed(f"{base_url}/missing", status_code=404)
+    assert queue.urls == [f"{base_url}/az/2"]
+
+    return None
+
+
+def retry_queue_test():
+    import retry
+
+    queue = retry.RetryQueue()
+    queue.add("https://locator.chase.com/az/1", 503)
+    queue.add("https://locator.chase.com/az/2", "ConnectionError")
+    rounds = []
+
+    def run(urls):
+        rounds.append(list(urls))
+        # the second url keeps failing
+        queue.add(urls[-1], 503)
+
+        return None
+
+    failed = queue.drain(run, rounds=2)
+
+    assert rounds == [["https://locator.chase.com/az/1", "https://locator.chase.com/az/2"],
+                      ["https://locator.chase.com/az/2"]]
+    assert failed == ["https://locator.chase.com/az/2"]
+
+    return None
+
+
+def caller_queue_test():
+    import socket
+    import crawl
+    import jpm
+    import retry
+    import sessions
+
+    # a port nobody listens on, every request fails with a ConnectionError
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    urls = [f"http://127.0.0.1:{port}/az/grand-canyon/{i}-branch" for i in range(3)]
+
+    # an empty queue is falsy, the urls that still fail must land in the caller's queue all the same
+    for args in ([], ["sequential"]):
+        retry_queue = retry.RetryQueue()
+        pool = sessions.SessionPool({}, size=2, prime=False)
+        crawl.run("jpm", iter(urls), {}, jpm.parse_branch_record, lambda url, record: None, pool, retry_queue,
+                  args=args, get_branch_record=jpm.get_branch_record, processes=1)
+        pool.close()
+        assert sorted(retry_queue.urls) == urls
+
+    return None
+
+
+if __name__ == "__main__":
+    backoff_test()
+    circuit_breaker_test()
+    session_pool_retry_test()
+    retry_queue_test()
+    caller_queue_test()
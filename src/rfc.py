@@ -5,136 +5,104 @@ Author: Adam Turner <turner.adch@gmail.com>
 # standard library
 import io
 import json
+import logging
 import re
-# python package index
-import lxml.html
-import pandas as pd
-import requests
 # local modules
-import path_helper
+import crawl
+import extractors
+import metrics
+from record import Record
+import sessions
+import sink
+import sitemap
 
 
-class Record(object):
+logger = logging.getLogger(__name__)
 
-    week = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
-    columns = ["name", "type", "addr"]
-    columns.extend(week)
-    columns.append("tmp_closed")
 
-    def __init__(self):
-        self.data = dict.fromkeys(Record.columns)
-
-    @property
-    def pd_fmt(self):
-        return tuple(self.data[col] for col in self.data)
-
-
-def get_branch_urls(project, headers):
+def get_branch_entries(project, headers, pool=None):
+    """Lazily yields the sitemap entries (url and lastmod) of branch pages."""
     with open(project.root / "cfg/sitemaps.json", "r") as f:
         sitemaps = json.load(f)
 
     print("Parsing sitemap...")
-    response = requests.get(url=sitemaps["rfc"], headers=headers)
-    sitemap_html = lxml.html.fromstring(response.text)
-    sitemap_urls = sitemap_html.xpath("//loc//text()")
+    pool = pool or sessions.SessionPool(headers, size=1, prime=False)
+    sitemap_entries = sitemap.iter_sitemap(sitemaps["rfc"], pool)
     branch_regex = re.compile(r"(?i)https://www.regions.com/Locator/Branch/bank-branch")
-    branch_urls = [url for url in sitemap_urls if branch_regex.search(url)]
+    branch_entries = (entry for entry in sitemap_entries if branch_regex.search(entry.loc))
+
+    return branch_entries
 
-    return branch_urls
 
+def get_branch_urls(project, headers, pool=None):
+    """Lazily yields branch urls while the sitemap is still streaming in."""
+    return (entry.loc for entry in get_branch_entries(project, headers, pool=pool))
 
-def transform_time_fields(record, lobby_hours):
+
+def transform_time_fields(lobby_hours):
+    if not lobby_hours:
+        return None
     clean_hrs = [val.strip() for val in lobby_hours if val.strip()]
 
-    try:
-        assert len(clean_hrs) % 2 == 0  # Expects a list: ['mon-fri', 'hours', 'sat', 'hours', 'sun', 'hours'
-    except AssertionError:
-        print("ASSERTION ERROR")
-        breakpoint()
-        print("UNKOWN BELOW")
+    # Expects a list: ['mon-fri', 'hours', 'sat', 'hours', 'sun', 'hours']
+    if len(clean_hrs) % 2 != 0:
+        logger.warning("Unexpected hours layout, leaving hours blank: %s", clean_hrs)
+        metrics.count("unparseable_hours")
+        return None
 
     # window slice such that we have ('Mon - Fri:', '9 a.m.-5 p.m.') pairs in the window as (day_range, branch_hours)
+    hours = {}
     for i in range(0, len(clean_hrs), 2):
         day_range = clean_hrs[i]
         start_day = day_range[:3].lower()
         branch_hours = clean_hrs[i+1]
-        if start_day in record.data:
-            record.data[start_day] = branch_hours
+        if start_day in Record.week:
+            hours[start_day] = branch_hours
 
     # fill in the empty days with previous data, rfc week starts on mon
-    mem = None
-    for day in record.week:
-        buffer = record.data[day]
-        if buffer is not None:
-            mem = buffer
-        else:
-            record.data[day] = mem
-
-    return record
-
-
-def get_branch_record(url, headers):
-    print(f"`{url}`: Constructing branch record...")
-    record = Record()
-
-    with requests.Session() as sesh:
-        # for some unknown reasons, the first request errors out?
-        # not sure why rfc would do this, but we can get past it...
-        for _ in range(2):
-            response = requests.get(url, headers=headers)
-    branch_html = lxml.html.fromstring(response.text)
-
-    branch_name = branch_html.xpath("//h1[contains(@class, 'location-title')]//text()")
-    if branch_name:
-        record.data["name"] = branch_name[0]
-
-    branch_type = branch_html.xpath("//*[contains(@class, 'location-type')]//text()")
-    if branch_type:
-        record.data["type"] = branch_type[0]
-
-    branch_addr = branch_html.xpath("(//*[contains(@class, 'location-address-line')])[1]//text()")
-    if branch_addr:
-        clean_addr = [val.strip() for val in branch_addr]
-        record.data["addr"] = ", ".join(clean_addr)
-
-    lobby_hours = branch_html.xpath("(//*[contains(@class, 'hours-block-list')])[1]//text()")
-    if lobby_hours:
-        record = transform_time_fields(record, lobby_hours)
-
-    print(f"`{url}`: Record: {record.pd_fmt}")
+    return extractors.fill_week(Record.week, hours)
+
+
+spec = extractors.Spec({
+    "name": ("//h1[contains(@class, 'location-title')]//text()", extractors.first),
+    "type": ("//*[contains(@class, 'location-type')]//text()", extractors.first),
+    "addr": ("(//*[contains(@class, 'location-address-line')])[1]//text()", extractors.joined(", ")),
+    "hours": ("(//*[contains(@class, 'hours-block-list')])[1]//text()", transform_time_fields),
+})
+
+
+def parse_branch_record(url, html_text):
+    logger.debug("`%s`: Constructing branch record...", url)
+    record = spec.extract(spec.parse(html_text), Record())
+
+    logger.debug("`%s`: Record: %s", url, record.row)
     
-    return record.pd_fmt
+    return record.row
 
 
-def load(records, project):
-    df = pd.DataFrame.from_records(records)
-    df.columns = Record.columns
-    csv_name = "rfc.csv"
-    csv_path = str(project.root / f"downloads/{csv_name}")
-    df.to_csv(csv_path)
-    print(f"Exporting to `{csv_path}`")
-    try:
-        df.to_csv(csv_path)
-    except FileNotFoundError:
-        print(f"WARNING: DUMPING CSV TO LOCAL PATH: `{csv_name}`!")
-        df.to_csv(csv_name)
-        raise FileNotFoundError(f"Could not export to `{csv_path}`. Did you forget to run `setup.sh`?")
+def get_branch_record(url, pool):
+    # a fresh rfc client has its first request rejected until cookies are set,
+    # the pool primes each session once so every branch after that is a single request
+    response = pool.get(url)
+    # an error page would parse into a blank record, raise so the caller can queue the url instead
+    response.raise_for_status()
 
-    return None
+    return parse_branch_record(url, response.text)
 
 
-def main():
-    project = path_helper.ProjectPath.from_src(__file__)
-    with open(project.root / "cfg/headers.json", "r") as f:
-        headers = json.load(f)
+def load(records, project):
+    with sink.RecordWriter.for_ticker(project, "rfc", Record.columns) as writer:
+        writer.write_many(records)
 
-    branch_urls = get_branch_urls(project, headers)
+    return None
 
-    records = []
-    for branch_url in branch_urls:
-        records.append(get_branch_record(branch_url, headers))
 
-    load(records, project)
+def main(args=None, request_slots=None, processes=None):
+    """Crawls every RFC branch, see `crawl.main` for the arguments and command line words."""
+    crawl.main("rfc", parse_branch_record, get_branch_record,
+               lambda headers, project, pool: get_branch_urls(project, headers, pool=pool),
+               get_entries=lambda headers, project, pool: get_branch_entries(project, headers, pool=pool),
+               args=args, request_slots=request_slots, processes=processes)
 
     return None
 
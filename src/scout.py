@@ -1,17 +1,32 @@
+"""Sitemap scout: counts the branch urls each http ticker would crawl, without fetching any branch page.
+
+Usage: `python src/scout.py [ticker ...]`.
+"""
+
+# standard library
+import json
+import sys
 # local modules
-import jpm
+import canon
+import path_helper
+import switch
 
 
-def main():
-    map_bucket = [
-        jpm,
-    ]
-    for map in map_bucket:
-        map.handle_sitemap()
+def main(tickers=None):
+    project = path_helper.ProjectPath.from_src(__file__)
+    with open(project.root / "cfg/headers.json", "r") as f:
+        headers = json.load(f)
 
+    counts = {}
+    for ticker in tickers or list(switch.http_tickers):
+        seen = canon.SeenIndex()
+        counts[ticker] = sum(1 for _ in seen.filter(switch.main(ticker, headers, project)))
+        print(f"`{ticker}`: {counts[ticker]} branch urls")
+        seen.report(ticker)
+        seen.close()
 
-    return None
+    return counts
 
 
 if __name__ == "__main__":
-    main()
+    main([arg.lower() for arg in sys.argv[1:]])
@@ -0,0 +1,159 @@
+"""Pool of cookie-primed, keep-alive `requests` sessions shared by the ticker modules."""
+
+# standard library
+import contextlib
+import queue
+import threading
+import urllib.parse
+# python package index
+import requests
+# local modules
+import metrics
+
+
+class SessionPool(object):
+    """Hands out `requests.Session` objects that are primed once per host and then reused.
+
+    Some locators (RFC) reject the first request of a fresh client until its cookies are
+    set. Each session visits `prime_urls[host]` (the host root by default) the first time it
+    talks to a host, after which every branch page costs a single request over a kept-alive
+    connection.
+
+    Args:
+        headers: dict of request headers sent with every request
+        size: int maximum number of sessions, one per concurrent caller
+        prime_urls: optional dict of host -> url used to prime cookies for that host
+        prime: bool, set False to skip cookie priming entirely
+        cache: optional cache.HttpCache every request is revalidated against
+        rate_limiter: optional ratelimit.RateLimiter every request waits on and reports back to
+        retry_policy: optional retry.RetryPolicy that retries failed requests and guards each host's circuit
+        request_slots: optional semaphore shared with the crawls of other tickers, held while a request is in flight
+    """
+
+    def __init__(self, headers, size=8, prime_urls=None, prime=True, cache=None, rate_limiter=None, retry_policy=None,
+                 request_slots=None):
+        self.headers = headers
+        self.size = size
+        self.prime_urls = prime_urls or {}
+        self.prime = prime
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.request_slots = request_slots
+        self.requests_issued = 0
+        self.records = 0
+        self._idle = queue.LifoQueue()
+        self._sessions = []
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(size)
+
+    def _new_session(self):
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.primed_hosts = set()
+        with self._lock:
+            self._sessions.append(session)
+
+        return session
+
+    def _count(self, n=1):
+        with self._lock:
+            self.requests_issued += n
+
+        return None
+
+    def _prime(self, session, url):
+        parts = urllib.parse.urlsplit(url)
+        host = parts.netloc
+        if not self.prime or host in session.primed_hosts:
+            return None
+        prime_url = self.prime_urls.get(host, f"{parts.scheme}://{host}/")
+        session.primed_hosts.add(host)
+        try:
+            # paced, slotted, retried and counted like any other request to the host
+            self._send(session, prime_url, timeout=30).close()
+        except requests.RequestException as e:
+            print(f"`{prime_url}`: WARNING: Could not prime session cookies: {e}")
+
+        return None
+
+    @contextlib.contextmanager
+    def session(self):
+        """Checks a session out of the pool for the duration of the `with` block."""
+        self._slots.acquire()
+        try:
+            session = self._idle.get_nowait()
+        except queue.Empty:
+            session = self._new_session()
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
+            self._slots.release()
+
+    def _request(self, session, url, **kwargs):
+        self._count()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(url)
+        # taken after the rate limiter, so a ticker waiting on its host does not hold a slot others could use
+        slot = self.request_slots if self.request_slots is not None else contextlib.nullcontext()
+        with slot, metrics.stage("fetch"):
+            try:
+                if self.cache is not None:
+                    response = self.cache.get(session, url, **kwargs)
+                else:
+                    response = session.get(url, **kwargs)
+            except requests.RequestException as e:
+                metrics.count_error(type(e).__name__)
+                if self.rate_limiter is not None:
+                    self.rate_limiter.record(url, timed_out=isinstance(e, (requests.Timeout, requests.ConnectionError)))
+                raise
+        if self.rate_limiter is not None:
+            self.rate_limiter.record(url, response.status_code, retry_after=response.headers.get("Retry-After"))
+        # a streamed body has not been read yet, count what the server announced
+        if kwargs.get("stream"):
+            num_bytes = int(response.headers.get("Content-Length") or 0)
+        else:
+            num_bytes = len(response.content)
+        metrics.count_response(response.status_code, num_bytes)
+
+        return response
+
+    def _send(self, session, url, **kwargs):
+        if self.retry_policy is None:
+            return self._request(session, url, **kwargs)
+
+        return self.retry_policy.call(url, lambda: self._request(session, url, **kwargs))
+
+    def get(self, url, **kwargs):
+        with self.session() as session:
+            self._prime(session, url)
+
+            return self._send(session, url, **kwargs)
+
+    def count_record(self, n=1):
+        with self._lock:
+            self.records += n
+
+        return None
+
+    @property
+    def requests_per_record(self):
+        if not self.records:
+            return 0.0
+
+        return self.requests_issued / self.records
+
+    def report(self, label="sessions"):
+        print(
+            f"`{label}`: {self.requests_issued} requests for {self.records} records "
+            f"({self.requests_per_record:.2f} requests/record, {len(self._sessions)} sessions)"
+        )
+
+        return None
+
+    def close(self):
+        for session in self._sessions:
+            session.close()
+
+        return None
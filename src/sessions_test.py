@@ -0,0 +1,105 @@
+import http.server
+
+
+class CookieGateHandler(http.server.BaseHTTPRequestHandler):
+    """Rejects branch pages until the client holds the cookie set by the site root."""
+
+    hits = 0
+
+    def do_GET(self):
+        type(self).hits += 1
+        if self.path == "/":
+            self.send_response(200)
+            self.send_header("Set-Cookie", "visitor=1; Path=/")
+            body = b"<html>home</html>"
+        elif "visitor=1" in self.headers.get("Cookie", ""):
+            self.send_response(200)
+            body = b"<html>branch</html>"
+        else:
+            self.send_response(403)
+            body = b"<html>denied</html>"
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FlakyRootHandler(CookieGateHandler):
+    """Answers the first request to the site root with a 503."""
+
+    hits = 0
+    root_hits = 0
+
+    def do_GET(self):
+        cls = type(self)
+        if self.path == "/":
+            cls.root_hits += 1
+            if cls.root_hits == 1:
+                cls.hits += 1
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        super().do_GET()
+
+
+def session_pool_test():
+    import fetch_test
+    import sessions
+
+    server = fetch_test.serve(CookieGateHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    pool = sessions.SessionPool(headers={}, size=1)
+    try:
+        for i in range(10):
+            response = pool.get(f"{base_url}/branch/{i}")
+            assert response.status_code == 200, response.status_code
+            pool.count_record()
+    finally:
+        pool.close()
+        server.shutdown()
+
+    # one priming request for the only session, then one request per record
+    assert pool.requests_issued == 11 == CookieGateHandler.hits
+    assert pool.requests_per_record == 1.1
+    pool.report("stub")
+
+    return None
+
+
+def prime_through_limits_test():
+    import threading
+    import fetch_test
+    import metrics
+    import ratelimit
+    import retry
+    import sessions
+
+    run = metrics.reset("rfc")
+    server = fetch_test.serve(FlakyRootHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    rate_limiter = ratelimit.RateLimiter(rate=100.0, max_rate=100.0)
+    retry_policy = retry.RetryPolicy(base=0.01, cap=0.01)
+    request_slots = threading.BoundedSemaphore(1)
+    pool = sessions.SessionPool({}, size=1, rate_limiter=rate_limiter, retry_policy=retry_policy,
+                                request_slots=request_slots)
+    try:
+        response = pool.get(f"{base_url}/branch/1")
+    finally:
+        pool.close()
+        server.shutdown()
+
+    # the 503 on the site root was retried, so the session still got its cookie
+    assert response.status_code == 200
+    assert FlakyRootHandler.root_hits == 2 and pool.requests_issued == 3 == FlakyRootHandler.hits
+    assert retry_policy.retries == 1
+    assert run.summary()["status_codes"] == {"200": 2, "503": 1}
+
+    return None
+
+
+if __name__ == "__main__":
+    session_pool_test()
+    prime_through_limits_test()
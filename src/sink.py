@@ -0,0 +1,207 @@
+"""Streaming CSV record sink.
+
+Records are written in batches while the crawl runs instead of being held in a list and
+turned into a DataFrame at the end, so memory stays flat and a crash keeps everything
+written so far. The file layout matches `DataFrame.to_csv` over `Record.columns`: an unnamed
+index column followed by one column per field.
+"""
+
+# standard library
+import csv
+import os
+import threading
+import time
+# local modules
+import metrics
+
+
+class RecordWriter(object):
+    """Batched, thread-safe csv writer for record tuples.
+
+    Rows go to `<path>.partial` and the file is renamed to `path` on `close`, so an
+    interrupted run never clobbers the last complete export. A background thread flushes the
+    buffer every `flush_seconds`, so rows reach the file even while a slow crawl writes nothing.
+
+    Args:
+        path: pathlib.Path of the final csv
+        columns: list of str column names, the `Record.columns` of the ticker
+        batch_size: int number of buffered records that triggers a flush
+        flush_seconds: float maximum seconds a record may sit in the buffer
+        partial_path: optional pathlib.Path rows are written to until `close`, defaults to `<path>.partial`
+    """
+
+    def __init__(self, path, columns, batch_size=500, flush_seconds=5.0, partial_path=None):
+        self.path = path
+        self.partial_path = partial_path or path.with_name(path.name + ".partial")
+        self.columns = columns
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.rows = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        try:
+            self._file = open(self.partial_path, "w", newline="")
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Could not export to `{path}`. Did you forget to run `setup.sh`?")
+        self._writer = csv.writer(self._file, lineterminator="\n")
+        self._writer.writerow([""] + list(columns))
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+
+    @classmethod
+    def for_ticker(cls, project, ticker, columns, **kwargs):
+        return cls(project.root / f"downloads/{ticker}.csv", columns, **kwargs)
+
+    @classmethod
+    def for_shard(cls, project, ticker, shard, columns, token=None, **kwargs):
+        """Writes one frontier shard, to a partial file named after the lease `token` if one is given.
+
+        Two workers holding the same shard one after the other, because the first one's lease ran
+        out, then never write to the same partial file.
+        """
+        path = shard_path(project, ticker, shard)
+        if token is not None:
+            kwargs["partial_path"] = path.with_name(f"{path.name}.{token}.partial")
+
+        return cls(path, columns, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # keep the partial file around for inspection, but do not promote it
+            self._stop_flusher()
+            self.flush()
+            self._file.close()
+
+        return False
+
+    def write(self, record):
+        if len(record) != len(self.columns):
+            raise ValueError(f"Expected {len(self.columns)} fields, got {len(record)}: `{record}`")
+        with self._lock:
+            self._buffer.append((self.rows,) + tuple(record))
+            self.rows += 1
+            due = len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+        return None
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+        return None
+
+    def flush(self):
+        with self._lock, metrics.stage("write"):
+            self._writer.writerows(self._buffer)
+            self._buffer.clear()
+            self._file.flush()
+            self._last_flush = time.monotonic()
+
+        return None
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_seconds):
+            with self._lock:
+                due = self._buffer and time.monotonic() - self._last_flush >= self.flush_seconds
+            if due:
+                self.flush()
+
+        return None
+
+    def _stop_flusher(self):
+        self._stop.set()
+        self._flusher.join()
+
+        return None
+
+    def close(self):
+        self._stop_flusher()
+        self.flush()
+        self._file.close()
+        os.replace(self.partial_path, self.path)
+        print(f"Exported {self.rows} records to `{self.path}`")
+
+        return None
+
+    def discard(self):
+        """Closes the partial file and deletes it, leaving `path` as it was."""
+        self._stop_flusher()
+        self._file.close()
+        os.remove(self.partial_path)
+
+        return None
+
+
+def shard_path(project, ticker, shard):
+    return project.root / f"downloads/{ticker}_shard_{shard:03d}.csv"
+
+
+def clear_shards(project, ticker):
+    """Deletes the shard csvs, partial files and failed url lists of `ticker` left by an earlier run.
+
+    Returns:
+        int number of files deleted
+    """
+    paths = list(project.root.glob(f"downloads/{ticker}_shard_[0-9][0-9][0-9].csv*"))
+    paths.extend(project.root.glob(f"downloads/{ticker}_shard_[0-9][0-9][0-9]_failed_urls.json"))
+    for path in paths:
+        os.remove(path)
+
+    return len(paths)
+
+
+def merge_shards(project, ticker, columns, shards):
+    """Concatenates the `downloads/<ticker>_shard_<n>.csv` of `shards` into `downloads/<ticker>.csv`.
+
+    Args:
+        shards: iterable of int shards to merge, the ones the frontier marks done
+    """
+    paths = [shard_path(project, ticker, shard) for shard in sorted(shards)]
+    with RecordWriter.for_ticker(project, ticker, columns) as writer:
+        for path in paths:
+            with open(path, "r", newline="") as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                # drop the per-shard index, the writer numbers the merged rows
+                writer.write_many(row[1:] for row in reader)
+    print(f"Merged {len(paths)} shards of `{ticker}`")
+
+    return writer.rows
+
+
+class Tee(object):
+    """Fans every record out to several writers, e.g. the csv and the columnar dataset."""
+
+    def __init__(self, *writers):
+        self.writers = writers
+
+    @property
+    def rows(self):
+        return self.writers[0].rows
+
+    def write(self, record):
+        for writer in self.writers:
+            writer.write(record)
+
+        return None
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+        return None
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+        return None
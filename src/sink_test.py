@@ -0,0 +1,56 @@
+import pathlib
+import tempfile
+import time
+
+
+def record_writer_test():
+    import jpm
+    import pandas as pd
+    import sink
+
+    records = [
+        ("Mather", None, "1 Mather Business Ctr", "9 am-5 pm", "9 am-5 pm", "9 am-5 pm", "9 am-5 pm", "9 am-5 pm", None, "closed", None),
+        ("Tusayan", "Branch", "2 Main St, Tusayan", "9 am-5 pm", None, None, None, None, None, None, 0),
+    ]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = pathlib.Path(tmp_dir) / "jpm.csv"
+        expected_path = pathlib.Path(tmp_dir) / "expected.csv"
+        df = pd.DataFrame.from_records(records)
+        df.columns = jpm.Record.columns
+        df.to_csv(expected_path)
+
+        with sink.RecordWriter(path, jpm.Record.columns, batch_size=1) as writer:
+            writer.write(records[0])
+            assert writer.partial_path.exists() and not path.exists()
+            assert len(writer.partial_path.read_text().splitlines()) == 2
+            writer.write(records[1])
+
+        # same layout as DataFrame.to_csv, pandas only differs by upcasting tmp_closed to float
+        assert path.read_text().splitlines()[0] == expected_path.read_text().splitlines()[0]
+        pd.testing.assert_frame_equal(pd.read_csv(path, index_col=0), pd.read_csv(expected_path, index_col=0))
+
+    return None
+
+
+def timed_flush_test():
+    import record
+    import sink
+
+    row = ("Tusayan", "Branch", "2 Main St, Tusayan", "9 am-5 pm", None, None, None, None, None, None, 0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = pathlib.Path(tmp_dir) / "jpm.csv"
+        with sink.RecordWriter(path, record.Record.columns, batch_size=100, flush_seconds=0.05) as writer:
+            writer.write(row)
+            # no write comes after the first one, the buffered row is flushed all the same
+            deadline = time.monotonic() + 5
+            while len(writer.partial_path.read_text().splitlines()) < 2:
+                assert time.monotonic() < deadline, "the buffered row was never flushed"
+                time.sleep(0.01)
+        assert len(path.read_text().splitlines()) == 2
+
+    return None
+
+
+if __name__ == "__main__":
+    record_writer_test()
+    timed_flush_test()
@@ -0,0 +1,83 @@
+"""Streaming sitemap reader.
+
+Sitemaps are parsed with `lxml.etree.iterparse` straight off the response stream and every
+element is cleared once it has been read, so memory stays flat for multi-MB sitemaps and
+urls reach the caller before the download has finished. Gzipped sitemaps (`.xml.gz`) and
+nested sitemap indexes are followed transparently.
+"""
+
+# standard library
+import collections
+import gzip
+import io
+# python package index
+from lxml import etree
+
+
+SitemapEntry = collections.namedtuple("SitemapEntry", ["loc", "lastmod"])
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def iter_entries(stream):
+    """Yields ("url" | "sitemap", SitemapEntry) pairs from a sitemap or sitemap index stream.
+
+    Args:
+        stream: binary file-like object holding the sitemap xml
+    """
+    context = etree.iterparse(stream, events=("end",), resolve_entities=False, no_network=True)
+    for _, element in context:
+        kind = etree.QName(element).localname
+        if kind not in ("url", "sitemap"):
+            continue
+        loc = lastmod = None
+        for child in element:
+            name = etree.QName(child).localname
+            if name == "loc" and child.text:
+                loc = child.text.strip()
+            elif name == "lastmod" and child.text:
+                lastmod = child.text.strip()
+        # free the element and every sibling already read so the tree never grows
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+        if loc:
+            yield kind, SitemapEntry(loc, lastmod)
+
+
+def open_stream(response):
+    """Wraps a streamed response body, gunzipping it when the payload itself is gzipped."""
+    # content-encoding gzip is undone by urllib3; a `.xml.gz` file still arrives compressed
+    response.raw.decode_content = True
+    # keep the raw stream readable at EOF, the buffered wrapper expects to see b"" there
+    response.raw.auto_close = False
+    stream = io.BufferedReader(response.raw)
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=stream)
+
+    return stream
+
+
+def iter_sitemap(url, pool, max_depth=3):
+    """Lazily yields SitemapEntry objects for every page url reachable from a sitemap.
+
+    Args:
+        url: str sitemap or sitemap index url
+        pool: sessions.SessionPool used to stream the download
+        max_depth: int limit on how many sitemap indexes deep to follow
+    """
+    print(f"`{url}`: Streaming sitemap...")
+    child_sitemaps = []
+    with pool.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        for kind, entry in iter_entries(open_stream(response)):
+            if kind == "sitemap":
+                child_sitemaps.append(entry.loc)
+            else:
+                yield entry
+
+    for child_url in child_sitemaps:
+        if max_depth <= 0:
+            print(f"`{child_url}`: WARNING: Sitemap index nested too deep! Skipping...")
+            continue
+        yield from iter_sitemap(child_url, pool, max_depth=max_depth - 1)
@@ -0,0 +1,67 @@
+import gzip
+import http.server
+
+
+URLSET = """<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+{}
+</urlset>"""
+
+URL = "<url><loc>https://locator.chase.com./az/grand-canyon/{0}-branch</loc><lastmod>2021-07-0{1}</lastmod></url>"
+
+
+class SitemapHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        if self.path == "/sitemap.xml":
+            body = (
+                '<?xml version="1.0" encoding="UTF-8"?>'
+                '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                f"<sitemap><loc>{base_url}/plain.xml</loc></sitemap>"
+                f"<sitemap><loc>{base_url}/packed.xml.gz</loc></sitemap>"
+                "</sitemapindex>"
+            ).encode()
+        elif self.path == "/plain.xml":
+            body = URLSET.format("\n".join(URL.format(i, i % 9 + 1) for i in range(3))).encode()
+        elif self.path == "/packed.xml.gz":
+            body = gzip.compress(URLSET.format("\n".join(URL.format(i, 1) for i in range(3, 1000))).encode())
+        else:
+            self.send_error(404)
+            return None
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        return None
+
+    def log_message(self, *args):
+        pass
+
+
+def iter_sitemap_test():
+    import fetch_test
+    import sessions
+    import sitemap
+
+    server = fetch_test.serve(SitemapHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    pool = sessions.SessionPool(headers={}, size=1, prime=False)
+    try:
+        entries = sitemap.iter_sitemap(f"{base_url}/sitemap.xml", pool)
+        first = next(entries)
+        entries = [first] + list(entries)
+    finally:
+        pool.close()
+        server.shutdown()
+
+    assert first == sitemap.SitemapEntry("https://locator.chase.com./az/grand-canyon/0-branch", "2021-07-01")
+    assert len(entries) == 1000
+    assert entries[-1].loc.endswith("/999-branch")
+
+    return None
+
+
+if __name__ == "__main__":
+    iter_sitemap_test()
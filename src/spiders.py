@@ -1,52 +1,388 @@
+# standard library
+import json
+import logging
+import queue
+import random
+import threading
+import time
+# python package index
 from selenium import webdriver
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.support import expected_conditions
+# local modules
+import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# evaluates every xpath in the page and returns their text (or attribute values) as one json string
+extract_script = """
+var fields = arguments[0];
+var out = {};
+for (var name in fields) {
+    var snapshot = document.evaluate(fields[name], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var values = [];
+    for (var i = 0; i < snapshot.snapshotLength; i++) {
+        var node = snapshot.snapshotItem(i);
+        values.push(node.nodeType === Node.ELEMENT_NODE ? node.textContent : node.nodeValue);
+    }
+    out[name] = values;
+}
+return JSON.stringify(out);
+"""
+
+# firefox prefs that stop images, media and web fonts from loading
+lean_prefs = {
+    "permissions.default.image": 2,
+    "media.autoplay.default": 5,
+    "media.autoplay.blocking_policy": 2,
+    "browser.display.use_document_fonts": 0,
+    "gfx.downloadable_fonts.enabled": False,
+}
 
 
 class SeleniumSpider(object):
 
-    def __init__(self, driver, user_agent, gecko_path):
+    def __init__(self, driver, user_agent, gecko_path, rate_limiter=None):
         self.driver = driver
         self.user_agent = user_agent
         self.gecko_path = gecko_path
+        self.rate_limiter = rate_limiter
         self.wait = webdriver.support.ui.WebDriverWait(self.driver, 15)
+        self.page_ready_times = []
+        self.last_url = None
+        self._nav_start = None
 
     @classmethod
-    def construct(cls, user_agent, gecko_path, headless=True):
+    def construct(cls, user_agent, gecko_path, headless=True, lean=False, blocked_hosts=(), rate_limiter=None):
+        """Starts a firefox spider.
+
+        Args:
+            user_agent: str user agent override
+            gecko_path: str path to the geckodriver executable
+            headless: bool run without a window
+            lean: bool use the `eager` page load strategy and skip images, media and fonts
+            blocked_hosts: iterable of str third-party hosts (analytics, ads) to resolve to
+                localhost so their requests fail immediately, only applied when `lean`
+            rate_limiter: optional ratelimit.RateLimiter, shared by every spider of a crawl, that
+                paces every page load (`navigate`, `execute_click_script` and `back`) per host
+        """
         opts = webdriver.firefox.options.Options()
         if headless:
             opts.add_argument("--headless")
         fp = webdriver.FirefoxProfile()
         fp.set_preference("general.useragent.override", user_agent)
+        capabilities = webdriver.DesiredCapabilities.FIREFOX.copy()
+        if lean:
+            # `eager` returns from driver.get at DOMContentLoaded instead of the full load event
+            capabilities["pageLoadStrategy"] = "eager"
+            for pref, value in lean_prefs.items():
+                fp.set_preference(pref, value)
+            if blocked_hosts:
+                fp.set_preference("network.dns.localDomains", ",".join(blocked_hosts))
 
         driver = webdriver.Firefox(
             firefox_profile=fp,
             firefox_binary="/usr/bin/firefox",
             executable_path=gecko_path,
-            options=opts
+            options=opts,
+            desired_capabilities=capabilities
         )
 
-        return cls(driver, user_agent, gecko_path)
+        return cls(driver, user_agent, gecko_path, rate_limiter=rate_limiter)
+
+    def _pace(self, url=None):
+        # clicks and history moves stay on the host of the page the spider is on
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(url or self.last_url or self.driver.current_url)
+
+        return None
+
+    def navigate(self, url):
+        """Loads a url and starts the page-ready clock, stopped by the next `wait_until_*`."""
+        self._pace(url)
+        self.last_url = url
+        self._nav_start = time.perf_counter()
+        self.driver.get(url)
+
+        return None
+
+    def _mark_ready(self):
+        if self._nav_start is not None:
+            ready = time.perf_counter() - self._nav_start
+            self.page_ready_times.append(ready)
+            metrics.add_time("fetch", ready)
+            self._nav_start = None
+            if self.rate_limiter is not None and self.last_url is not None:
+                self.rate_limiter.record(self.last_url, 200)
+
+        return None
+
+    @property
+    def avg_page_ready(self):
+        if not self.page_ready_times:
+            return 0.0
+
+        return sum(self.page_ready_times) / len(self.page_ready_times)
 
     def wait_until_clickable(self, xpath):
         self.wait.until(expected_conditions.element_to_be_clickable((webdriver.common.by.By.XPATH, xpath)))
+        self._mark_ready()
 
         return None
 
     def wait_until_invisible(self, xpath):
         self.wait.until(expected_conditions.invisibility_of_element_located((webdriver.common.by.By.XPATH, xpath)))
+        self._mark_ready()
 
         return None
 
     def wait_until_visible(self, xpath):
         self.wait.until(expected_conditions.visibility_of_element_located((webdriver.common.by.By.XPATH, xpath)))
+        self._mark_ready()
 
         return None
 
+    def extract(self, fields):
+        """Runs one script in the page and returns only the requested values.
+
+        Saves pulling the whole `page_source` over the WebDriver wire and re-parsing it.
+
+        Args:
+            fields: dict of name -> xpath selecting text nodes (`//text()`), attributes (`/@href`)
+                or elements (their text content)
+
+        Returns:
+            dict of name -> list of str, like `lxml` `xpath()` results for the same expressions
+        """
+        with metrics.stage("parse"):
+            return json.loads(self.driver.execute_script(extract_script, fields))
+
     def execute_click_script(self, xpath):
-        self.driver.execute_script(
-            "arguments[0].click();", 
-            self.wait.until(expected_conditions.element_to_be_clickable((webdriver.common.by.By.XPATH, xpath)))
+        element = self.wait.until(expected_conditions.element_to_be_clickable((webdriver.common.by.By.XPATH, xpath)))
+        # clicks on pnc links route to a new page, so pace and time it like a navigation
+        self._pace()
+        self._nav_start = time.perf_counter()
+        self.driver.execute_script("arguments[0].click();", element)
+
+        return None
+
+    def back(self):
+        """Goes back a page, paced like a navigation."""
+        self._pace()
+        self.driver.back()
+
+        return None
+
+
+class SpiderPool(object):
+    """Runs a task over many urls with a pool of spiders pulling from a shared queue.
+
+    Each worker thread owns one spider. When a task raises TimeoutException the worker quits
+    its browser, builds a fresh spider and tries the url once more; a url that fails twice is
+    recorded in `failed`, a dict of url to the reason it failed, and the worker moves on. Spiders with a `rate_limiter` report the
+    timeout to it, which slows every spider's navigation to that host; spiders without one sleep
+    a random `retry_sleep` before rebuilding instead.
+
+    With a `retry_policy` the pool makes up to `retry_policy.attempts` tries per url within its
+    retry budget, backs off with jittered exponential delays between them and waits on the
+    host's circuit breaker, which opens after repeated timeouts, before every try.
+
+    With `browser_slots`, a semaphore shared with other pools, a worker only starts its browser
+    once it has a url and a free slot, and gives the slot back when it exits.
+
+    Args:
+        factory: callable returning a new SeleniumSpider (or any object with a `driver`)
+        size: int number of spiders, one browser each
+        retry_sleep: (int, int) bounds of the random pause before rebuilding a spider
+        retry_policy: optional retry.RetryPolicy
+        browser_slots: optional threading.Semaphore capping the browsers open across pools
+    """
+
+    def __init__(self, factory, size=4, retry_sleep=(10, 15), retry_policy=None, browser_slots=None):
+        self.factory = factory
+        self.size = size
+        self.retry_sleep = retry_sleep
+        self.retry_policy = retry_policy
+        self.browser_slots = browser_slots
+        self.failed = {}
+        self.restarts = 0
+        self.page_ready_times = []
+        self._errors = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def _retire(self, bot):
+        # a browser is quit once, even when starting its replacement fails and the worker unwinds
+        if getattr(bot, "retired", False):
+            return None
+        bot.retired = True
+        with self._lock:
+            self.page_ready_times.extend(getattr(bot, "page_ready_times", []))
+        bot.driver.quit()
+
+        return None
+
+    def _restart(self, bot, attempt=0):
+        print("SERVER TIMEOUT: Exiting browsing context...")
+        self._retire(bot)
+        rate_limiter = getattr(bot, "rate_limiter", None)
+        limited = rate_limiter is not None and getattr(bot, "last_url", None) is not None
+        if limited:
+            # back the host off for every spider rather than parking this one
+            rate_limiter.record(bot.last_url, timed_out=True)
+        if self.retry_policy is not None:
+            delay = self.retry_policy.backoff(attempt)
+            print(f"Backing off for {delay:.1f} seconds...")
+            self.retry_policy.sleep(delay)
+        elif not limited:
+            random_sleep = random.randint(*self.retry_sleep)
+            print(f"Sleeping for {random_sleep} seconds...")
+            time.sleep(random_sleep)
+        print("Constructing a new bot...")
+        with self._lock:
+            self.restarts += 1
+
+        return self.factory()
+
+    def _attempt(self, bot, url, task):
+        """Runs `task` on `url` until it succeeds or runs out of tries.
+
+        Returns:
+            (bot, result, reason), where bot is a fresh spider whenever a try timed out and reason is
+            None on success, otherwise a str saying why the url failed
+        """
+        attempts = self.retry_policy.attempts if self.retry_policy is not None else 2
+        attempt = 0
+        while True:
+            if self.retry_policy is not None:
+                # spiders have nothing else to crawl, so they wait out an open circuit rather than fail fast
+                self.retry_policy.before(url, block=True)
+            try:
+                result = task(bot, url)
+            except TimeoutException:
+                if self.retry_policy is not None:
+                    self.retry_policy.breaker(url).on_failure()
+                bot = self._restart(bot, attempt)
+                attempt += 1
+                if attempt >= attempts or (self.retry_policy is not None and not self.retry_policy.allow_retry()):
+                    print(f"`{url}`: ALERT: Timed out {attempt} times! Skipping...")
+                    return bot, None, f"timed out {attempt} times"
+                print(f"`{url}`: Trying again...")
+                continue
+            except Exception as e:
+                # a page that breaks the extraction fails on its own, the worker moves on to the next url
+                logger.exception("`%s`: Crawl failed! Skipping...", url)
+                metrics.count_error(type(e).__name__)
+                if isinstance(e, WebDriverException):
+                    # the browser may be gone, start a new one for the next url
+                    self._retire(bot)
+                    with self._lock:
+                        self.restarts += 1
+                    bot = self.factory()
+                return bot, None, f"{type(e).__name__}: {e}"
+            if self.retry_policy is not None:
+                self.retry_policy.breaker(url).on_success()
+
+            return bot, result, None
+
+    def _acquire_slot(self):
+        while not self._stop.is_set():
+            if self.browser_slots.acquire(timeout=0.5):
+                return True
+
+        return False
+
+    def _work(self, tasks, task, on_result):
+        bot = None
+        holds_slot = False
+        try:
+            if self.browser_slots is None:
+                bot = self.factory()
+            while not self._stop.is_set():
+                try:
+                    url = tasks.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if url is None:
+                    break
+                if bot is None:
+                    # the slot is held until the worker exits, restarts replace the browser within it
+                    holds_slot = self._acquire_slot()
+                    if not holds_slot:
+                        break
+                    bot = self.factory()
+                bot, result, reason = self._attempt(bot, url, task)
+                with self._lock:
+                    if reason is None:
+                        on_result(url, result)
+                    else:
+                        self.failed[url] = reason
+        except Exception as e:
+            # a browser that will not start, or a failing `on_result`, stops the whole run
+            logger.exception("Spider worker failed! Stopping the crawl...")
+            with self._lock:
+                self._errors.append(e)
+            self._stop.set()
+        finally:
+            if bot is not None:
+                self._retire(bot)
+            if holds_slot:
+                self.browser_slots.release()
+
+        return None
+
+    def _put(self, tasks, url):
+        # waits for a free worker, giving up once the run is stopped
+        while not self._stop.is_set():
+            try:
+                tasks.put(url, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+
+        return False
+
+    @property
+    def avg_page_ready(self):
+        if not self.page_ready_times:
+            return 0.0
+
+        return sum(self.page_ready_times) / len(self.page_ready_times)
+
+    def report(self, label="spiders"):
+        print(
+            f"`{label}`: {len(self.page_ready_times)} pages, average page-ready time {self.avg_page_ready:.2f}s, "
+            f"{self.restarts} restarts, {len(self.failed)} failed urls"
         )
 
         return None
+
+    def run(self, urls, task, on_result):
+        """Calls `task(spider, url)` for every url and `on_result(url, result)` as each one finishes.
+
+        Urls are fed to the workers as they are produced, so `urls` may be a generator that is
+        still discovering work. `on_result` calls are serialized, so it may write to a shared sink.
+        A url whose task raises is logged and added to `failed`. A spider that fails to start, or an
+        `on_result` that raises, stops the run and the error is raised again here.
+        """
+        self._stop.clear()
+        self._errors.clear()
+        tasks = queue.Queue(maxsize=self.size * 2)
+        workers = [
+            threading.Thread(target=self._work, args=(tasks, task, on_result), daemon=True)
+            for _ in range(self.size)
+        ]
+        for worker in workers:
+            worker.start()
+        for url in urls:
+            if not self._put(tasks, url):
+                break
+        for _ in workers:
+            self._put(tasks, None)
+        for worker in workers:
+            worker.join()
+        if self._errors:
+            raise self._errors[0]
+
+        return None
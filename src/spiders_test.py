@@ -0,0 +1,184 @@
+import threading
+
+
+class FakeElement(object):
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+
+class FakeDriver(object):
+
+    def __init__(self):
+        self.quit_calls = 0
+        self.visited = []
+
+    def get(self, url):
+        self.visited.append(url)
+
+    def execute_script(self, script, *args):
+        self.visited.append("click")
+
+    def back(self):
+        self.visited.append("back")
+
+    def find_element(self, by, xpath):
+        return FakeElement()
+
+    def quit(self):
+        self.quit_calls += 1
+
+
+class FakeSpider(object):
+
+    built = []
+
+    def __init__(self):
+        self.driver = FakeDriver()
+        FakeSpider.built.append(self)
+
+
+def spider_pool_test():
+    from selenium.common.exceptions import TimeoutException
+    import spiders
+
+    attempts = {}
+    lock = threading.Lock()
+
+    def get_city_records(bot, city_url):
+        with lock:
+            attempts[city_url] = attempts.get(city_url, 0) + 1
+            attempt = attempts[city_url]
+        if city_url.endswith("flaky") and attempt == 1:
+            raise TimeoutException("first visit times out")
+        if city_url.endswith("dead"):
+            raise TimeoutException("always times out")
+        return [(city_url.split("/")[-1], None, "addr")]
+
+    city_urls = [f"https://apps.pnc.com/locator/browse/ohio/city-{i}" for i in range(20)]
+    city_urls += ["https://apps.pnc.com/locator/browse/ohio/flaky", "https://apps.pnc.com/locator/browse/ohio/dead"]
+    results = {}
+    pool = spiders.SpiderPool(FakeSpider, size=3, retry_sleep=(0, 0))
+    pool.run(iter(city_urls), get_city_records, results.__setitem__)
+
+    assert len(results) == 21
+    assert results["https://apps.pnc.com/locator/browse/ohio/flaky"] == [("flaky", None, "addr")]
+    assert pool.failed == {"https://apps.pnc.com/locator/browse/ohio/dead": "timed out 2 times"}
+    # three workers, one restart for the flaky city and two for the dead one
+    assert pool.restarts == 3 and len(FakeSpider.built) == 6
+    assert all(spider.driver.quit_calls == 1 for spider in FakeSpider.built)
+
+    return None
+
+
+def spider_pool_errors_test():
+    from selenium.common.exceptions import WebDriverException
+    import spiders
+
+    built = []
+
+    def factory():
+        spider = FakeSpider()
+        built.append(spider)
+        return spider
+
+    def get_city_records(bot, city_url):
+        name = city_url.split("/")[-1]
+        if name == "bad-hours":
+            assert len([]) == 7, "ASSERTION ERROR"
+        if name == "no-count":
+            int([][0])
+        if name == "browser-gone":
+            raise WebDriverException("browser crashed")
+        return [(name, None, "addr")]
+
+    city_urls = [f"https://apps.pnc.com/locator/browse/ohio/city-{i}" for i in range(12)]
+    broken = [f"https://apps.pnc.com/locator/browse/ohio/{name}" for name in ("bad-hours", "no-count", "browser-gone")]
+    results = {}
+    pool = spiders.SpiderPool(factory, size=2, retry_sleep=(0, 0))
+    pool.run(iter(city_urls + broken), get_city_records, results.__setitem__)
+
+    # every broken city is skipped on its own and the rest of the crawl goes on
+    assert sorted(results) == sorted(city_urls)
+    assert sorted(pool.failed) == sorted(broken)
+    # each city keeps the error it failed with
+    assert pool.failed["https://apps.pnc.com/locator/browse/ohio/bad-hours"] == "AssertionError: ASSERTION ERROR"
+    assert pool.failed["https://apps.pnc.com/locator/browse/ohio/no-count"].startswith("IndexError: ")
+    assert pool.failed["https://apps.pnc.com/locator/browse/ohio/browser-gone"].startswith("WebDriverException: ")
+    # only the crashed browser is replaced
+    assert pool.restarts == 1 and len(built) == 3
+    assert all(spider.driver.quit_calls == 1 for spider in built)
+
+    def failing_factory():
+        raise WebDriverException("geckodriver not found")
+
+    pool = spiders.SpiderPool(failing_factory, size=2, retry_sleep=(0, 0))
+    errors = []
+
+    def run():
+        try:
+            pool.run(iter(city_urls * 10), get_city_records, results.__setitem__)
+        except WebDriverException as e:
+            errors.append(e)
+
+    # a pool whose browsers never start raises instead of blocking on its task queue
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive() and len(errors) == 1
+
+    return None
+
+
+def page_ready_test():
+    import spiders
+
+    bot = spiders.SeleniumSpider(FakeDriver(), user_agent="test", gecko_path="geckodriver")
+    bot.navigate("https://apps.pnc.com/locator/browse/ohio/akron")
+    bot.wait_until_visible("//*[@data-ng-bind='browseBranchCtrl.locationCount']")
+    # waits that do not follow a navigation are not page loads
+    bot.wait_until_visible("(//service-hour)[1]")
+
+    assert bot.driver.visited == ["https://apps.pnc.com/locator/browse/ohio/akron"]
+    assert len(bot.page_ready_times) == 1 and bot.avg_page_ready >= 0
+
+    return None
+
+
+class CountingLimiter(object):
+
+    def __init__(self):
+        self.acquired = []
+
+    def acquire(self, url):
+        self.acquired.append(url)
+
+    def record(self, url, status_code=None, timed_out=False, retry_after=None):
+        return None
+
+
+def paced_page_loads_test():
+    import spiders
+
+    rate_limiter = CountingLimiter()
+    bot = spiders.SeleniumSpider(FakeDriver(), user_agent="test", gecko_path="geckodriver", rate_limiter=rate_limiter)
+    city_url = "https://apps.pnc.com/locator/browse/ohio/akron"
+    bot.navigate(city_url)
+    # click-through to a branch and back to the city, as pnc does without `direct`
+    bot.execute_click_script("(//a[@class='ng-binding'])[1]")
+    bot.back()
+
+    assert bot.driver.visited == [city_url, "click", "back"]
+    assert rate_limiter.acquired == [city_url] * 3
+
+    return None
+
+
+if __name__ == "__main__":
+    spider_pool_test()
+    spider_pool_errors_test()
+    page_ready_test()
+    paced_page_loads_test()
@@ -0,0 +1,344 @@
+"""Producer/consumer crawl pipeline with bounded queues between stages.
+
+Sitemap discovery, fetching, parsing and writing run at the same time, each stage on its own
+worker threads, connected by bounded queues. A full queue blocks the stage feeding it, so a
+slow stage holds back the ones upstream instead of letting pages pile up in memory.
+
+Every stage keeps its own counters: items handled, seconds busy in the stage function, seconds
+starved waiting for input, seconds blocked on a full queue downstream, and the depth of its
+input queue as each item was taken. Utilization is busy time over `workers` times the wall-clock
+time of the run, and the stage with the highest utilization is reported as the bottleneck.
+Worker counts are tuned from the command line with `<stage>=<n>` words, e.g. `fetch=2 parse=4`.
+Fetch workers still share the fetcher's per-host limit, so more of them than `per_host` only
+help when the urls span several hosts.
+"""
+
+# standard library
+import json
+import logging
+import queue
+import threading
+import time
+# local modules
+import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# the write stage keeps a single worker, writers and state stores are not thread-safe
+default_workers = {"fetch": 4, "parse": 2}
+
+# marks the end of a stage's input, passed on once every worker of the stage upstream is done
+_done = object()
+
+
+def workers_from_args(args, defaults=None):
+    """Returns the stage worker counts, with `<stage>=<n>` words from `args` over `defaults`."""
+    workers = dict(default_workers if defaults is None else defaults)
+    for arg in args:
+        name, _, value = arg.partition("=")
+        if name in workers and value.isdigit() and int(value) > 0:
+            workers[name] = int(value)
+
+    return workers
+
+
+class Stage(object):
+    """One step of a Pipeline.
+
+    Args:
+        name: str name of the stage in reports
+        func: callable run on every item, returning the item handed to the next stage, or None
+            to drop it
+        workers: int number of threads running `func`
+        maxsize: int capacity of the stage's input queue, defaults to four items per worker
+    """
+
+    def __init__(self, name, func, workers=1, maxsize=None):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.maxsize = maxsize or 4 * workers
+
+
+class StageStats(object):
+    """Thread-safe counters of one stage, summed over its workers and over every run."""
+
+    def __init__(self, name, workers, maxsize=None):
+        self.name = name
+        self.workers = workers
+        self.maxsize = maxsize
+        self.items = 0
+        self.emitted = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.depth_total = 0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def add_item(self, busy, depth=None, emitted=True):
+        with self._lock:
+            self.items += 1
+            self.emitted += emitted
+            self.busy += busy
+            if depth is not None:
+                self.depth_total += depth
+                self.max_depth = max(self.max_depth, depth)
+
+        return None
+
+    def add_wait(self, starved=0.0, blocked=0.0):
+        with self._lock:
+            self.starved += starved
+            self.blocked += blocked
+
+        return None
+
+    def summary(self, elapsed):
+        with self._lock:
+            capacity = self.workers * elapsed
+            return {
+                "workers": self.workers,
+                "items": self.items,
+                "emitted": self.emitted,
+                "busy": round(self.busy, 3),
+                "starved": round(self.starved, 3),
+                "blocked": round(self.blocked, 3),
+                "utilization": round(self.busy / capacity, 3) if capacity else 0.0,
+                "queue_size": self.maxsize,
+                "mean_depth": round(self.depth_total / self.items, 2) if self.maxsize and self.items else None,
+                "max_depth": self.max_depth if self.maxsize else None,
+            }
+
+
+class Pipeline(object):
+    """Runs items from a source through `stages` concurrently.
+
+    The source iterable is consumed on its own thread, reported under the name `source`, so a
+    streaming sitemap keeps producing urls while earlier ones are fetched. Items come out of
+    the stages in no particular order. The first error raised by the source or by any stage
+    stops the run and is raised again from `run`; a stage that should move on past a bad item
+    catches the error in its own `func`.
+
+    Args:
+        stages: list of Stage objects, in order
+        source: str name the source is reported under
+    """
+
+    def __init__(self, stages, source="sitemap"):
+        self.stages = stages
+        self.source = source
+        self.stats = [StageStats(source, 1)]
+        self.stats.extend(StageStats(stage.name, stage.workers, stage.maxsize) for stage in stages)
+        self.elapsed = 0.0
+        self._running_since = None
+        self._stop = threading.Event()
+        self._errors = []
+        self._lock = threading.Lock()
+
+    def _fail(self, error):
+        with self._lock:
+            self._errors.append(error)
+        self._stop.set()
+
+        return None
+
+    def _put(self, outbox, item):
+        # waits out a full queue, giving up once the run is stopped
+        while not self._stop.is_set():
+            try:
+                outbox.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+
+        return False
+
+    def _get(self, inbox):
+        while not self._stop.is_set():
+            try:
+                return inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+        return _done
+
+    def _feed(self, items, outbox):
+        stats = self.stats[0]
+        iterator = iter(items)
+        try:
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                stats.add_item(time.perf_counter() - start)
+                start = time.perf_counter()
+                self._put(outbox, item)
+                stats.add_wait(blocked=time.perf_counter() - start)
+        except Exception as e:
+            logger.exception("`%s`: Source failed!", self.source)
+            self._fail(e)
+        finally:
+            self._put(outbox, _done)
+
+        return None
+
+    def _work(self, index, inbox, outbox, remaining):
+        stage = self.stages[index]
+        stats = self.stats[index + 1]
+        try:
+            while True:
+                start = time.perf_counter()
+                item = self._get(inbox)
+                stats.add_wait(starved=time.perf_counter() - start)
+                if item is _done:
+                    # hand the marker on to the next worker of this stage
+                    self._put(inbox, _done)
+                    break
+                depth = inbox.qsize()
+                start = time.perf_counter()
+                result = stage.func(item)
+                stats.add_item(time.perf_counter() - start, depth=depth, emitted=result is not None)
+                if result is not None and outbox is not None:
+                    start = time.perf_counter()
+                    self._put(outbox, result)
+                    stats.add_wait(blocked=time.perf_counter() - start)
+        except Exception as e:
+            logger.exception("`%s`: Stage failed!", stage.name)
+            self._fail(e)
+        finally:
+            with self._lock:
+                remaining[index] -= 1
+                last = remaining[index] == 0
+            if last and outbox is not None:
+                self._put(outbox, _done)
+
+        return None
+
+    def run(self, items):
+        """Runs every item through the stages and returns once all of them are through."""
+        self._stop.clear()
+        self._errors.clear()
+        inboxes = [queue.Queue(stage.maxsize) for stage in self.stages]
+        remaining = [stage.workers for stage in self.stages]
+        threads = [threading.Thread(target=self._feed, args=(items, inboxes[0]), name=self.source, daemon=True)]
+        for index, stage in enumerate(self.stages):
+            outbox = inboxes[index + 1] if index + 1 < len(inboxes) else None
+            threads.extend(
+                threading.Thread(target=self._work, args=(index, inboxes[index], outbox, remaining),
+                                 name=f"{stage.name}-{i}", daemon=True)
+                for i in range(stage.workers)
+            )
+
+        self._running_since = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.elapsed += time.perf_counter() - self._running_since
+        self._running_since = None
+        if self._errors:
+            raise self._errors[0]
+
+        return None
+
+    def summary(self):
+        """Returns the counters of every stage so far, safe to call while the pipeline runs."""
+        elapsed = self.elapsed
+        running_since = self._running_since
+        if running_since is not None:
+            elapsed += time.perf_counter() - running_since
+        stages = {stats.name: stats.summary(elapsed) for stats in self.stats}
+        bottleneck = max(stages, key=lambda name: stages[name]["utilization"]) if elapsed else None
+
+        return {"elapsed": round(elapsed, 3), "bottleneck": bottleneck, "stages": stages}
+
+    def report(self, label="pipeline"):
+        summary = self.summary()
+        print(f"`{label}`: Pipeline ran {summary['elapsed']:.2f}s, bottleneck `{summary['bottleneck']}`")
+        for name, stage in summary["stages"].items():
+            depth = "-"
+            if stage["queue_size"]:
+                depth = f"{stage['mean_depth'] or 0:.1f} mean, {stage['max_depth']} max of {stage['queue_size']}"
+            print(
+                f"`{label}`: {name:<8} {stage['workers']:>3} workers {stage['items']:>7} items "
+                f"{stage['utilization']:>6.0%} busy, {stage['starved']:.2f}s starved, "
+                f"{stage['blocked']:.2f}s blocked, queue {depth}"
+            )
+
+        return None
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+        return None
+
+
+def parse_in_process(parse, url, html_text):
+    """Runs `parse(url, html_text)` inside a worker process, returning the record and the process's metrics."""
+    page_metrics = metrics.reset("parse")
+
+    return parse(url, html_text), page_metrics.summary()
+
+
+def branch_pipeline(fetcher, parse, add_record, retry_queue, workers=None, executor=None):
+    """Builds the fetch -> parse -> write pipeline of an http ticker.
+
+    A page that fails to fetch or parse is logged, counted as an error and skipped, the crawl
+    moves on to the next url. Only an error in the sitemap source or in `add_record` stops it.
+
+    Args:
+        fetcher: fetch.AsyncFetcher whose `get` the fetch workers call, within its per-host limit and
+            counted in its `stats`; at most `max_concurrency` fetch workers are started
+        parse: callable taking (url, html_text) and returning a record tuple, or None to skip the page
+        add_record: callable taking (url, record), only ever called from the single write worker
+        retry_queue: retry.RetryQueue failed pages are put on
+        workers: optional dict of worker counts per stage, see `workers_from_args`
+        executor: optional concurrent.futures.ProcessPoolExecutor the parse workers hand their pages
+            to, so the lxml parse runs on every cpu; `parse` then has to be a module-level function
+    """
+    workers = dict(default_workers, **(workers or {}))
+    workers["fetch"] = min(workers["fetch"], fetcher.max_concurrency)
+
+    def fetch_page(url):
+        try:
+            page = fetcher.get(url)
+        except Exception as e:
+            logger.exception("`%s`: Fetch failed! Skipping...", url)
+            metrics.count_error(type(e).__name__)
+            return None
+        if not page.ok:
+            retry_queue.failed(page.url, page.status_code, page.error)
+            return None
+
+        return page
+
+    def parse_page(page):
+        try:
+            if executor is None:
+                record = parse(page.url, page.text)
+            else:
+                record, summary = executor.submit(parse_in_process, parse, page.url, page.text).result()
+                metrics.current.merge(summary)
+        except Exception as e:
+            # a page that breaks the extractor fails on its own, fetching it again would not help
+            logger.exception("`%s`: Parse failed! Skipping...", page.url)
+            metrics.count_error(type(e).__name__)
+            return None
+
+        return None if record is None else (page.url, record)
+
+    def write_record(pair):
+        add_record(*pair)
+
+        return None
+
+    return Pipeline([
+        Stage("fetch", fetch_page, workers["fetch"]),
+        Stage("parse", parse_page, workers["parse"]),
+        Stage("write", write_record),
+    ])
@@ -0,0 +1,252 @@
+import http.server
+import pathlib
+import tempfile
+import threading
+import time
+
+
+class BranchHandler(http.server.BaseHTTPRequestHandler):
+    """Serves a branch page per path, a 404 for `/missing/...` and a 503 for `/busy/...`."""
+
+    def do_GET(self):
+        status = 404 if self.path.startswith("/missing/") else 503 if self.path.startswith("/busy/") else 200
+        body = f"<html><body><h1 id='location-name'>{self.path}</h1></body></html>".encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SlowBranchHandler(BranchHandler):
+    """Holds every request for a moment and records how many were in flight at once."""
+
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.peak = max(cls.peak, cls.in_flight)
+        time.sleep(0.02)
+        with cls.lock:
+            cls.in_flight -= 1
+        super().do_GET()
+
+
+def pipeline_test():
+    import stages
+
+    results = []
+    lock = threading.Lock()
+
+    def collect(item):
+        with lock:
+            results.append(item)
+
+        return None
+
+    crawl = stages.Pipeline([
+        stages.Stage("double", lambda n: n * 2, workers=3),
+        # odd tens are dropped
+        stages.Stage("filter", lambda n: n if n // 20 % 2 == 0 else None, workers=2),
+        stages.Stage("write", collect),
+    ])
+    crawl.run(range(100))
+    # a second run, e.g. a retry round, adds to the same counters
+    crawl.run(range(100, 110))
+
+    assert sorted(results) == [n * 2 for n in range(110) if n // 10 % 2 == 0]
+    summary = crawl.summary()
+    assert list(summary["stages"]) == ["sitemap", "double", "filter", "write"]
+    assert summary["stages"]["sitemap"]["items"] == summary["stages"]["double"]["items"] == 110
+    assert summary["stages"]["filter"]["emitted"] == summary["stages"]["write"]["items"] == 60
+    assert summary["stages"]["double"]["max_depth"] <= summary["stages"]["double"]["queue_size"] == 12
+
+    assert stages.workers_from_args(["jpm", "fetch=16", "parse=0", "write=4"]) == {"fetch": 16, "parse": 2}
+
+    return None
+
+
+def backpressure_test():
+    import stages
+
+    produced = 0
+    written = 0
+    peak_in_flight = 0
+
+    def source():
+        nonlocal produced
+        for n in range(200):
+            produced += 1
+            yield n
+
+    def write(n):
+        nonlocal written, peak_in_flight
+        peak_in_flight = max(peak_in_flight, produced - written)
+        time.sleep(0.002)
+        written += 1
+
+        return None
+
+    crawl = stages.Pipeline([
+        stages.Stage("parse", lambda n: n, workers=2, maxsize=4),
+        stages.Stage("write", write, maxsize=4),
+    ])
+    crawl.run(source())
+    summary = crawl.summary()
+
+    assert written == 200
+    # the slow writer holds the source back, at most both queues and the workers hold items
+    assert peak_in_flight <= 4 + 4 + 2 + 1 + 1
+    assert summary["bottleneck"] == "write"
+    assert summary["stages"]["sitemap"]["blocked"] > summary["stages"]["sitemap"]["busy"]
+    assert summary["stages"]["write"]["mean_depth"] > 2 and summary["stages"]["write"]["max_depth"] <= 4
+    assert summary["stages"]["write"]["utilization"] > summary["stages"]["parse"]["utilization"]
+
+    return None
+
+
+class FakeFetcher(object):
+    """Stands in for a fetch.AsyncFetcher, raising on `/broken/...` urls."""
+
+    max_concurrency = 4
+
+    def get(self, url):
+        import fetch
+
+        if url.startswith("/broken/"):
+            raise RuntimeError("bad fetch")
+
+        return fetch.Page(url, 200, url, url.encode())
+
+
+def error_test():
+    import metrics
+    import retry
+    import stages
+
+    def parse(url, text):
+        if url.endswith("/50"):
+            # e.g. a spec lambda indexing into a field the page does not have
+            return [][0]
+        time.sleep(0.001)
+
+        return url
+
+    # a page that fails to fetch or parse is skipped, the crawl goes on
+    metrics.reset("stages")
+    records = []
+    crawl = stages.branch_pipeline(FakeFetcher(), parse, lambda url, record: records.append(record),
+                                   retry.RetryQueue())
+    crawl.run([f"/az/phoenix/{i}" for i in range(100)] + ["/broken/1"])
+    assert len(records) == 99 and "/az/phoenix/50" not in records
+    assert metrics.current.summary()["errors"] == {"IndexError": 1, "RuntimeError": 1}
+
+    def write(url, record):
+        if url.endswith("/50"):
+            raise ValueError("disk full")
+
+        return None
+
+    def source():
+        yield from (f"/az/phoenix/{i}" for i in range(60))
+        raise ValueError("bad sitemap")
+
+    # a failing writer or sitemap stops the run early
+    for add_record, items in [(write, (f"/az/phoenix/{i}" for i in range(10000))), (lambda url, record: None, source())]:
+        crawl = stages.branch_pipeline(FakeFetcher(), lambda url, text: url, add_record, retry.RetryQueue())
+        start = time.perf_counter()
+        try:
+            crawl.run(items)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("a failing writer or sitemap did not stop the pipeline")
+        # the source stopped early instead of feeding all 10000 items
+        assert time.perf_counter() - start < 5
+        assert crawl.summary()["stages"]["sitemap"]["items"] < 10000
+
+    return None
+
+
+def branch_pipeline_test():
+    import fetch
+    import fetch_test
+    import jpm
+    import retry
+    import sessions
+    import sitemap
+    import stages
+    import state
+
+    server = fetch_test.serve(BranchHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base_url}/az/phoenix/{i}" for i in range(30)] + [f"{base_url}/missing/1", f"{base_url}/busy/1"]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        crawl_state = state.CrawlState(pathlib.Path(tmp_dir) / "jpm_state.sqlite")
+        pool = sessions.SessionPool({}, size=4, prime=False)
+        retry_queue = retry.RetryQueue()
+        fetcher = fetch.AsyncFetcher({}, pool=pool)
+        crawl = stages.branch_pipeline(fetcher, jpm.parse_branch_record, crawl_state.update, retry_queue,
+                                       workers={"fetch": 4, "parse": 2})
+        try:
+            # the state store is read by the source thread and written by the write stage
+            crawl.run(crawl_state.select(sitemap.SitemapEntry(url, "2021-07-01") for url in urls))
+        finally:
+            server.shutdown()
+            pool.close()
+        records = sorted(crawl_state.records())
+        crawl.write(pathlib.Path(tmp_dir) / "jpm_pipeline.json")
+        crawl_state.close()
+
+    assert len(records) == 30 and records[0][0] == "/az/phoenix/0"
+    assert retry_queue.urls == [f"{base_url}/busy/1"]
+    summary = crawl.summary()
+    assert summary["stages"]["fetch"]["items"] == 32 and summary["stages"]["fetch"]["emitted"] == 30
+    assert summary["stages"]["write"]["items"] == 30
+    assert fetcher.stats.pages == 32 and fetcher.stats.errors == 2
+
+    return None
+
+
+def fetch_per_host_test():
+    import fetch
+    import fetch_test
+    import retry
+    import sessions
+    import stages
+
+    server = fetch_test.serve(SlowBranchHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    pool = sessions.SessionPool({}, size=16, prime=False)
+    fetcher = fetch.AsyncFetcher({}, max_concurrency=8, per_host=3, pool=pool)
+    records = []
+    crawl = stages.branch_pipeline(fetcher, lambda url, text: url, lambda url, record: records.append(record),
+                                   retry.RetryQueue(), workers={"fetch": 16})
+    try:
+        crawl.run(f"{base_url}/az/phoenix/{i}" for i in range(40))
+    finally:
+        server.shutdown()
+        pool.close()
+
+    assert len(records) == 40
+    # sixteen fetch workers asked for, no more than `max_concurrency` started and `per_host` sending at once
+    assert crawl.summary()["stages"]["fetch"]["workers"] == 8
+    assert SlowBranchHandler.peak <= 3
+    assert fetcher.stats.pages == 40
+
+    return None
+
+
+if __name__ == "__main__":
+    pipeline_test()
+    backpressure_test()
+    error_test()
+    branch_pipeline_test()
+    fetch_per_host_test()
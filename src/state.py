@@ -0,0 +1,115 @@
+"""SQLite crawl state for incremental recrawls.
+
+For every branch url the store keeps the sitemap `lastmod` it was fetched under, a hash of
+the extracted record, when it was last fetched, and the record itself. An incremental run
+only fetches branches that are new, whose `lastmod` moved, or that have gone stale, and
+rebuilds the full output from the stored records.
+"""
+
+# standard library
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+class CrawlState(object):
+    """Url -> lastmod -> record hash -> last fetched store for one ticker.
+
+    Args:
+        path: pathlib.Path of the sqlite database
+        max_age: float seconds after which a branch is refetched even if its lastmod held
+    """
+
+    def __init__(self, path, max_age=30 * 24 * 3600):
+        self.path = path
+        self.max_age = max_age
+        self.run_started = time.time()
+        self.fresh = 0
+        self.skipped = 0
+        self.changed = 0
+        self._lastmods = {}
+        # `select` feeds a pipeline from one thread while `update` is called from its write stage
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, lastmod TEXT, record_hash TEXT, fetched_at REAL, seen_at REAL, record TEXT)"
+        )
+        self.conn.commit()
+
+    @classmethod
+    def from_project(cls, project, ticker, **kwargs):
+        return cls(project.root / f"downloads/{ticker}_state.sqlite", **kwargs)
+
+    def is_stale(self, url, lastmod):
+        row = self.conn.execute("SELECT lastmod, fetched_at FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return True
+        stored_lastmod, fetched_at = row
+        if lastmod is not None and lastmod != stored_lastmod:
+            return True
+
+        return self.run_started - fetched_at > self.max_age
+
+    def select(self, entries):
+        """Yields the urls of the sitemap entries that need fetching, marking every entry as seen.
+
+        Args:
+            entries: iterable of sitemap.SitemapEntry objects
+        """
+        for i, entry in enumerate(entries):
+            with self._lock:
+                self.conn.execute("UPDATE pages SET seen_at = ? WHERE url = ?", (self.run_started, entry.loc))
+                if i % 1000 == 0:
+                    self.conn.commit()
+                stale = self.is_stale(entry.loc, entry.lastmod)
+                if stale:
+                    self._lastmods[entry.loc] = entry.lastmod
+            if stale:
+                self.fresh += 1
+                yield entry.loc
+            else:
+                self.skipped += 1
+        with self._lock:
+            self.conn.commit()
+
+    def update(self, url, record):
+        """Stores a freshly extracted record for a url handed out by `select`."""
+        record_json = json.dumps(record)
+        record_hash = hashlib.sha1(record_json.encode()).hexdigest()
+        with self._lock:
+            row = self.conn.execute("SELECT record_hash FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is None or row[0] != record_hash:
+                self.changed += 1
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (url, lastmod, record_hash, fetched_at, seen_at, record) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, self._lastmods.pop(url, None), record_hash, time.time(), self.run_started, record_json)
+            )
+
+        return None
+
+    def records(self):
+        """Lazily yields every stored record whose url was in this run's sitemap."""
+        self.conn.commit()
+        rows = self.conn.execute(
+            "SELECT record FROM pages WHERE seen_at = ? AND record IS NOT NULL ORDER BY url", (self.run_started,)
+        )
+        for record_json, in rows:
+            yield tuple(json.loads(record_json))
+
+    def report(self, label="state"):
+        print(
+            f"`{label}`: {self.fresh} urls fetched ({self.changed} records changed), "
+            f"{self.skipped} unchanged urls reused from `{self.path}`"
+        )
+
+        return None
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+        return None
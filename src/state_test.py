@@ -0,0 +1,44 @@
+import pathlib
+import tempfile
+
+
+def incremental_test():
+    import sitemap
+    import state
+
+    first_run = [sitemap.SitemapEntry(f"https://example.com/branch/{i}", "2021-07-01") for i in range(5)]
+    # a week later: branch 0 changed, branch 4 closed, branch 5 opened
+    second_run = [sitemap.SitemapEntry("https://example.com/branch/0", "2021-07-08")]
+    second_run += first_run[1:4]
+    second_run += [sitemap.SitemapEntry("https://example.com/branch/5", "2021-07-08")]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = pathlib.Path(tmp_dir) / "jpm_state.sqlite"
+        crawl_state = state.CrawlState(path)
+        for url in crawl_state.select(first_run):
+            crawl_state.update(url, (url.split("/")[-1], "9 am-5 pm"))
+        assert crawl_state.fresh == 5 and crawl_state.skipped == 0
+        crawl_state.close()
+
+        crawl_state = state.CrawlState(path)
+        fetched = list(crawl_state.select(second_run))
+        assert fetched == ["https://example.com/branch/0", "https://example.com/branch/5"]
+        for url in fetched:
+            crawl_state.update(url, (url.split("/")[-1], "9 am-6 pm"))
+        records = list(crawl_state.records())
+        crawl_state.close()
+
+    assert crawl_state.skipped == 3
+    assert records == [
+        ("0", "9 am-6 pm"),
+        ("1", "9 am-5 pm"),
+        ("2", "9 am-5 pm"),
+        ("3", "9 am-5 pm"),
+        ("5", "9 am-6 pm"),
+    ]
+
+    return None
+
+
+if __name__ == "__main__":
+    incremental_test()
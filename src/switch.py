@@ -3,12 +3,42 @@
 Author: Adam Turner <turner.adch@gmail.com>
 """
 
+# standard library
+import functools
 # local modules
 import jpm
+import pnc
+import rfc
+import wfc
 
 
-def main(ticker):
+# tickers whose branch pages are plain HTTP fetches, pnc needs a browser
+http_tickers = {
+    "jpm": jpm,
+    "rfc": rfc,
+    "wfc": wfc,
+}
+
+
+def module(ticker):
+    if ticker in http_tickers:
+        return http_tickers[ticker]
+    elif ticker == "pnc":
+        return pnc
+
+    raise ValueError(f"Unknown ticker: `{ticker}`!")
+
+
+def main(ticker, headers, project, pool=None):
     if ticker == "jpm":
-        return jpm.get_branch_urls()
+        return jpm.get_branch_urls(headers, project, pool=pool)
+    elif ticker == "rfc":
+        return rfc.get_branch_urls(project, headers, pool=pool)
+    elif ticker == "wfc":
+        branch_urls, _, _ = wfc.get_branch_urls(pool=pool)
+        return branch_urls
+    elif ticker == "pnc":
+        # pnc lists cities rather than branches, each one crawled in a browser
+        return pnc.get_city_urls(project, functools.partial(pnc.build_spider, project, headers))
 
     raise ValueError(f"Unknown ticker: `{ticker}`!")